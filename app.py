@@ -32,11 +32,17 @@ def create_app(config=None):
     if config:
         app.config.update(config)
     
+    # Courier location history can live in its own database
+    if os.environ.get('LOCATIONS_DATABASE_URL'):
+        app.config.setdefault('SQLALCHEMY_BINDS', {})['locations'] = os.environ['LOCATIONS_DATABASE_URL']
+    
     # Initialize extensions
     db.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    from utils.location_store import location_store
+    location_store.init_app(app)
     # Configure CORS
     CORS(app, resources={
         r"/api/*": {
@@ -56,6 +62,7 @@ def create_app(config=None):
     from routes.orders import orders_bp
     from routes.courier import courier_bp
     from routes.admin import admin_bp
+    from routes.notifications import notifications_bp
     
     @app.route('/')
     def index():
@@ -65,9 +72,19 @@ def create_app(config=None):
     app.register_blueprint(orders_bp, url_prefix='/api')
     app.register_blueprint(courier_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/api')
+    app.register_blueprint(notifications_bp, url_prefix='/api')
     
     from routes.payments import payments_bp
     app.register_blueprint(payments_bp, url_prefix='/api/payments')
+    
+    from services.email_service import email_cli
+    app.cli.add_command(email_cli)
+    
+    from utils.pubsub import pubsub_cli
+    app.cli.add_command(pubsub_cli)
+    
+    from utils.location_store import locations_cli
+    app.cli.add_command(locations_cli)
 
     # Debug logging
     @app.before_request
@@ -117,6 +134,10 @@ def create_app(config=None):
     with app.app_context():
         db.create_all()
     
+    # Memory-map the self-hosted road graph up front if one is configured
+    from utils.road_graph import get_road_graph
+    get_road_graph()
+    
     return app
 
 
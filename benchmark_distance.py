@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark the offline road-distance estimator against stored Mapbox distances.
+Fits circuity factors on a training split of historical orders and reports the
+estimate error on the held-out orders.
+Run: python benchmark_distance.py [--holdout 0.2] [--seed 42]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app import create_app
+from extensions import db
+from models import ParcelOrder
+from utils.geo import CircuityEstimator, haversine_km
+
+
+def load_samples():
+    rows = db.session.query(
+        ParcelOrder.pickup_lat, ParcelOrder.pickup_lng,
+        ParcelOrder.destination_lat, ParcelOrder.destination_lng,
+        ParcelOrder.distance
+    ).filter(
+        ParcelOrder.pickup_lat.isnot(None),
+        ParcelOrder.pickup_lng.isnot(None),
+        ParcelOrder.destination_lat.isnot(None),
+        ParcelOrder.destination_lng.isnot(None),
+        ParcelOrder.distance_source == 'mapbox',
+        ParcelOrder.distance > 0
+    ).all()
+    return [((r[0], r[1]), (r[2], r[3]), r[4]) for r in rows]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_benchmark(holdout, seed):
+    app = create_app()
+
+    with app.app_context():
+        samples = load_samples()
+        # Same filter the estimator applies when fitting (drops the old 5 km default etc.)
+        samples = [
+            s for s in samples
+            if haversine_km(s[0], s[1]) >= 0.05
+            and CircuityEstimator.MIN_RATIO <= s[2] / haversine_km(s[0], s[1]) <= CircuityEstimator.MAX_RATIO
+        ]
+
+        if len(samples) < 10:
+            print(f"Only {len(samples)} usable orders with coordinates and distance - nothing to benchmark.")
+            return
+
+        random.Random(seed).shuffle(samples)
+        split = max(1, int(len(samples) * holdout))
+        test, train = samples[:split], samples[split:]
+
+        estimator = CircuityEstimator().fit(train)
+
+        abs_errors = []
+        pct_errors = []
+        started = time.perf_counter()
+        for origin, destination, road_km in test:
+            estimate_km = estimator.estimate(origin, destination)[0] / 1000.0
+            abs_errors.append(abs(estimate_km - road_km))
+            pct_errors.append(abs(estimate_km - road_km) / road_km * 100)
+        elapsed = time.perf_counter() - started
+
+        print("=" * 50)
+        print("Offline distance estimator vs stored Mapbox distances")
+        print("=" * 50)
+        print(f"  Train / test orders:  {len(train)} / {len(test)}")
+        print(f"  Global factor:        {estimator.global_factor:.3f}")
+        print(f"  Fitted regions:       {len(estimator.region_factors)}")
+        print(f"  MAE:                  {statistics.mean(abs_errors):.3f} km")
+        print(f"  MAPE:                 {statistics.mean(pct_errors):.1f} %")
+        print(f"  P50 / P90 / P95 err:  {percentile(pct_errors, 50):.1f} / "
+              f"{percentile(pct_errors, 90):.1f} / {percentile(pct_errors, 95):.1f} %")
+        print(f"  Time per estimate:    {elapsed / len(test) * 1e6:.1f} us")
+        print("=" * 50)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of orders held out for testing")
+    parser.add_argument("--seed", type=int, default=42, help="Shuffle seed for the train/test split")
+    args = parser.parse_args()
+    run_benchmark(args.holdout, args.seed)
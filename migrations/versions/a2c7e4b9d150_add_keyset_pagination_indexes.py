@@ -0,0 +1,34 @@
+"""add keyset pagination indexes
+
+Revision ID: a2c7e4b9d150
+Revises: f4b8d2c6a913
+Create Date: 2026-10-17 20:41:16.228530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2c7e4b9d150'
+down_revision = 'f4b8d2c6a913'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_parcel_orders_created_at_id', 'parcel_orders', ['created_at', 'id']),
+    ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+]
+
+
+def upgrade():
+    # Built concurrently on PostgreSQL, outside a transaction, as in f4b8d2c6a913
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
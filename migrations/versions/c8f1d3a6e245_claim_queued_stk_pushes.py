@@ -0,0 +1,57 @@
+"""claim queued stk pushes
+
+Revision ID: c8f1d3a6e245
+Revises: a2c7e4b9d150
+Create Date: 2026-10-18 09:12:37.614520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1d3a6e245'
+down_revision = 'a2c7e4b9d150'
+branch_labels = None
+depends_on = None
+
+PENDING = sa.text("status IN ('queued', 'sending')")
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # A new enum value must be committed before the index below can use it
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE stk_push_status ADD VALUE IF NOT EXISTS 'sending' AFTER 'queued'")
+    else:
+        with op.batch_alter_table('stk_push_queue', schema=None) as batch_op:
+            batch_op.alter_column('status',
+                   existing_type=sa.Enum('queued', 'sent', 'failed', name='stk_push_status'),
+                   type_=sa.Enum('queued', 'sending', 'sent', 'failed', name='stk_push_status'),
+                   existing_nullable=False)
+
+    # create_app() runs db.create_all(), so a new table may already have the index
+    indexes = [index['name'] for index in sa.inspect(bind).get_indexes('stk_push_queue')]
+    if 'uq_stk_push_queue_pending_order' not in indexes:
+        # Keep the oldest waiting push of each order; the others were duplicates
+        op.execute("""
+            UPDATE stk_push_queue SET status = 'failed', last_error = 'Duplicate of an earlier queued push'
+            WHERE status = 'queued' AND id NOT IN (
+                SELECT MIN(id) FROM stk_push_queue WHERE status = 'queued' GROUP BY order_id
+            )
+        """)
+        op.create_index('uq_stk_push_queue_pending_order', 'stk_push_queue', ['order_id'], unique=True,
+                        postgresql_where=PENDING, sqlite_where=PENDING)
+
+
+def downgrade():
+    op.drop_index('uq_stk_push_queue_pending_order', table_name='stk_push_queue')
+    op.execute("UPDATE stk_push_queue SET status = 'queued' WHERE status = 'sending'")
+    # PostgreSQL can't drop an enum value; 'sending' stays in the type, unused
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('stk_push_queue', schema=None) as batch_op:
+            batch_op.alter_column('status',
+                   existing_type=sa.Enum('queued', 'sending', 'sent', 'failed', name='stk_push_status'),
+                   type_=sa.Enum('queued', 'sent', 'failed', name='stk_push_status'),
+                   existing_nullable=False)
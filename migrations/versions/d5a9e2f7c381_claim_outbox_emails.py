@@ -0,0 +1,46 @@
+"""claim outbox emails
+
+Revision ID: d5a9e2f7c381
+Revises: c8f1d3a6e245
+Create Date: 2026-10-18 10:04:51.377062
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9e2f7c381'
+down_revision = 'c8f1d3a6e245'
+branch_labels = None
+depends_on = None
+
+OLD_STATUSES = ('pending', 'sent', 'dead')
+NEW_STATUSES = ('pending', 'sending', 'sent', 'unknown', 'dead')
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # ADD VALUE can't run inside a transaction block on older PostgreSQL
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE email_status ADD VALUE IF NOT EXISTS 'sending' AFTER 'pending'")
+            op.execute("ALTER TYPE email_status ADD VALUE IF NOT EXISTS 'unknown' AFTER 'sent'")
+    else:
+        with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+            batch_op.alter_column('status',
+                   existing_type=sa.Enum(*OLD_STATUSES, name='email_status'),
+                   type_=sa.Enum(*NEW_STATUSES, name='email_status'),
+                   existing_nullable=False)
+
+
+def downgrade():
+    # Nothing is retried from 'unknown'; keep those rows out of the drain as dead letters
+    op.execute("UPDATE email_outbox SET status = 'dead' WHERE status = 'unknown'")
+    op.execute("UPDATE email_outbox SET status = 'pending' WHERE status = 'sending'")
+    # PostgreSQL can't drop enum values; they stay in the type, unused
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+            batch_op.alter_column('status',
+                   existing_type=sa.Enum(*NEW_STATUSES, name='email_status'),
+                   type_=sa.Enum(*OLD_STATUSES, name='email_status'),
+                   existing_nullable=False)
@@ -0,0 +1,37 @@
+"""add order and payment indexes
+
+Revision ID: f4b8d2c6a913
+Revises: e7a3c5f91b02
+Create Date: 2026-10-17 20:05:48.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8d2c6a913'
+down_revision = 'e7a3c5f91b02'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_parcel_orders_customer_id_created_at', 'parcel_orders', ['customer_id', 'created_at']),
+    ('ix_parcel_orders_courier_id_status', 'parcel_orders', ['courier_id', 'status']),
+    ('ix_parcel_orders_status_created_at', 'parcel_orders', ['status', 'created_at']),
+    ('ix_payments_order_id_status', 'payments', ['order_id', 'status']),
+]
+
+
+def upgrade():
+    # Built concurrently on PostgreSQL so orders and payments stay writable meanwhile;
+    # that can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
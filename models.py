@@ -3,6 +3,7 @@ from sqlalchemy.orm import validates
 from sqlalchemy import CheckConstraint
 import phonenumbers
 from datetime import datetime
+import os
 
 
 class User(db.Model):
@@ -13,17 +14,20 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20), unique=True, nullable=True)
     password_hash = db.Column(db.String(128), nullable=False)
-    role = db.Column(
+    # active_history: stats counters need the old value even if it wasn't loaded
+    role = db.column_property(db.Column(
         db.Enum("courier", "customer", "admin", name="user_roles"),
         default="customer",
         nullable=False,
-    )
+    ), active_history=True)
 
     __table_args__ = (
         CheckConstraint(
             "(role != 'courier') OR (vehicle_type IS NOT NULL AND plate_number IS NOT NULL)",
             name="ck_courier_vehicle_required",
         ),
+        # Keyset pages of the admin user listing: ORDER BY created_at DESC, id DESC
+        db.Index("ix_users_created_at_id", "created_at", "id"),
     )
 
     vehicle_type = db.Column(db.String(50), nullable=True)
@@ -31,7 +35,10 @@ class User(db.Model):
     plate_number = db.Column(db.String(20), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Maintained alongside notification inserts and mark-read, so reading it is O(1)
+    unread_notifications = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # Set by the app as well so every row has the same precision, which the admin listing's (created_at, id) cursor relies on
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
 
     @validates("plate_number")
     def validate_plate_number(self, key, number):
@@ -116,26 +123,36 @@ class ParcelOrder(db.Model):
     
     # Pricing
     distance = db.Column(db.Float, nullable=True)
-    price = db.Column(db.Float, nullable=False)
+    # Where distance came from: mapbox | road_graph | estimate | default; only
+    # mapbox distances train the offline estimator
+    distance_source = db.Column(db.String(20), nullable=True)
+    price = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
     
     # Status
-    status = db.Column(
+    status = db.column_property(db.Column(
         db.Enum("pending", "assigned", "picked_up", "in_transit", "delivered", "cancelled", name="order_status"),
         default="pending",
         nullable=False,
-    )
+    ), active_history=True)
+    
+    # "completed" once any payment completes, otherwise the latest payment's status; see apply_payment
+    payment_status = db.Column(db.String(20), default="pending", server_default="pending", nullable=False)
     
     # Courier location updates
     current_lat = db.Column(db.Float, nullable=True)
     current_lng = db.Column(db.Float, nullable=True)
+    # When the courier recorded current_lat/lng, so late uploads can't move it backwards
+    location_updated_at = db.Column(db.DateTime, nullable=True)
     
     # Verification & Media
     parcel_image_url = db.Column(db.String(500), nullable=True)
     delivery_code = db.Column(db.String(10), nullable=True) # OTP for delivery confirmation
     
     # Timestamps
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    # Set by the app as well so every row has the same precision, which the listings' (created_at, id) cursor relies on
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
+    # Indexed for the daily rollup refresh, which looks for orders changed since its last run
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), index=True)
     picked_up_at = db.Column(db.DateTime, nullable=True)
     delivered_at = db.Column(db.DateTime, nullable=True)
     
@@ -145,6 +162,19 @@ class ParcelOrder(db.Model):
     payments = db.relationship("Payment", backref="order", lazy=True)
     notifications = db.relationship("Notification", backref="order", lazy=True)
 
+    __table_args__ = (
+        # Customer's orders, newest first
+        db.Index("ix_parcel_orders_customer_id_created_at", "customer_id", "created_at"),
+        # Courier's orders, and their active ones for load and location updates
+        db.Index("ix_parcel_orders_courier_id_status", "courier_id", "status"),
+        # Orders in a status, oldest or newest first (dispatch, admin listing)
+        db.Index("ix_parcel_orders_status_created_at", "status", "created_at"),
+        # Listings filtered by payment status, newest first
+        db.Index("ix_parcel_orders_payment_status_created_at", "payment_status", "created_at"),
+        # Keyset pages of the unfiltered admin listing: ORDER BY created_at DESC, id DESC
+        db.Index("ix_parcel_orders_created_at_id", "created_at", "id"),
+    )
+
     @staticmethod
     def calculate_price(weight, distance):
         """Calculate price based on distance (1 KSH per km, min 10 KSH)"""
@@ -156,6 +186,17 @@ class ParcelOrder(db.Model):
         price = distance * 1.0
         return max(round(price, 2), 10.00)
 
+    def apply_payment(self, payment):
+        """Update payment_status after `payment` for this order is added or changes status"""
+        if self.payment_status == "completed":
+            return
+        if payment.status != "completed":
+            # An older payment failing late doesn't override a newer attempt
+            latest_id = db.session.query(db.func.max(Payment.id)).filter(Payment.order_id == self.id).scalar()
+            if latest_id is not None and payment.id is not None and payment.id < latest_id:
+                return
+        self.payment_status = payment.status
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -177,7 +218,7 @@ class ParcelOrder(db.Model):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "picked_up_at": self.picked_up_at.isoformat() if self.picked_up_at else None,
             "delivered_at": self.delivered_at.isoformat() if self.delivered_at else None,
-            "payment_status": "completed" if any(p.status == "completed" for p in self.payments) else (self.payments[-1].status if self.payments else "pending"),
+            "payment_status": self.payment_status,
             "parcel_image_url": self.parcel_image_url
             # delivery_code is intentionally NOT included here for security, sent via email only or specific endpoint
         }
@@ -199,6 +240,11 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
+    __table_args__ = (
+        # An order's payments, and whether any completed
+        db.Index("ix_payments_order_id_status", "order_id", "status"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -220,10 +266,17 @@ class Notification(db.Model):
     message = db.Column(db.Text, nullable=False)
     type = db.Column(db.String(50), nullable=False)
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Set by the app as well so every row has the same precision, which the feed's (created_at, id) cursor relies on
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now())
 
     user = db.relationship("User", backref="notifications")
 
+    __table_args__ = (
+        # Feed pages: WHERE user_id = ? [AND is_read = ?] ORDER BY created_at DESC, id DESC
+        db.Index("ix_notifications_user_id_is_read_created_at", "user_id", "is_read", "created_at"),
+        db.Index("ix_notifications_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -234,3 +287,167 @@ class Notification(db.Model):
             "is_read": self.is_read,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
+
+
+class GeocodeCacheEntry(db.Model):
+    __tablename__ = "geocode_cache"
+
+    id = db.Column(db.Integer, primary_key=True)
+    address_key = db.Column(db.String(500), unique=True, nullable=False)
+    # Both NULL for addresses the provider could not resolve (negative cache)
+    lat = db.Column(db.Float, nullable=True)
+    lng = db.Column(db.Float, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+
+class DistanceCacheEntry(db.Model):
+    __tablename__ = "distance_cache"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Grid-snapped origin/destination cells, see utils.cache.DistanceCache
+    pair_key = db.Column(db.String(100), unique=True, nullable=False)
+    distance_m = db.Column(db.Float, nullable=True)
+    duration_s = db.Column(db.Float, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+
+class QueuedStkPush(db.Model):
+    """STK push requests held back while M-Pesa is unavailable, retried by `flask payments retry-queued`"""
+    __tablename__ = "stk_push_queue"
+    __table_args__ = (
+        # At most one push waiting or in flight per order
+        db.Index(
+            "uq_stk_push_queue_pending_order", "order_id", unique=True,
+            postgresql_where=db.text("status IN ('queued', 'sending')"),
+            sqlite_where=db.text("status IN ('queued', 'sending')"),
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey("parcel_orders.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    phone_number = db.Column(db.String(20), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    status = db.Column(
+        db.Enum("queued", "sending", "sent", "failed", name="stk_push_status"),
+        default="queued",
+        nullable=False,
+    )
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = db.Column(db.String(255), nullable=True)
+    checkout_request_id = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "order_id": self.order_id,
+            "amount": self.amount,
+            "status": self.status,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class EmailOutbox(db.Model):
+    """Emails queued with the business change that triggered them, delivered by `flask email drain`"""
+    __tablename__ = "email_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    # JSON list of {"filename", "content" (base64)}
+    attachments = db.Column(db.Text, nullable=True)
+    status = db.Column(
+        # sending: claimed by a drain; unknown: Resend's answer didn't say whether it went out
+        db.Enum("pending", "sending", "sent", "unknown", "dead", name="email_status"),
+        default="pending",
+        nullable=False,
+    )
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.String(500), nullable=True)
+    provider_id = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "to_email": self.to_email,
+            "subject": self.subject,
+            "status": self.status,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "sent_at": self.sent_at.isoformat() if self.sent_at else None
+        }
+
+
+class StatsCounter(db.Model):
+    """Running totals for the admin dashboard, kept in step with orders and users by utils.stats"""
+    __tablename__ = "stats_counters"
+
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Float, default=0, server_default="0", nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DailyOrderRollup(db.Model):
+    """Orders per creation day and current status, refreshed by utils.rollups for the days that changed"""
+    __tablename__ = "daily_order_rollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    order_count = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0, nullable=False)
+    distance_km = db.Column(db.Float, default=0, nullable=False)
+    courier_count = db.Column(db.Integer, default=0, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+class LocationPing(db.Model):
+    """
+    Courier positions as reported, append-only.
+    Kept on the `locations` bind when LOCATIONS_DATABASE_URL is set, so the
+    write volume doesn't share a database with orders; there are no foreign
+    keys for that reason.
+    """
+    __tablename__ = "location_pings"
+    __bind_key__ = "locations" if os.environ.get("LOCATIONS_DATABASE_URL") else None
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    courier_id = db.Column(db.Integer, nullable=False)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    # Metres, as reported by the device
+    accuracy = db.Column(db.Float, nullable=True)
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    received_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    __table_args__ = (
+        db.Index("ix_location_pings_order_id_recorded_at", "order_id", "recorded_at"),
+    )
+
+    def to_dict(self):
+        return {
+            "order_id": self.order_id,
+            "courier_id": self.courier_id,
+            "lat": self.lat,
+            "lng": self.lng,
+            "accuracy": self.accuracy,
+            "recorded_at": self.recorded_at.isoformat() if self.recorded_at else None
+        }
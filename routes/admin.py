@@ -1,9 +1,18 @@
+import os
+from datetime import datetime, timedelta
+
+import click
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import ParcelOrder, User, Payment
+from models import DailyOrderRollup, ParcelOrder, User, Payment
 from extensions import db
-from sqlalchemy import func
+from sqlalchemy import case, func
 from utils import create_notification
+from utils.order_queries import order_listing
+from utils.pagination import cursor_page
+from utils.pubsub import publish_order_update
+from utils.rollups import BACKFILL_CHUNK_DAYS, backfill_rollups, refresh_rollups
+from utils.stats import ORDER_STATUSES, read_stats, rebuild_stats
 from services.email_service import send_order_status_email
 
 admin_bp = Blueprint('admin', __name__)
@@ -28,11 +37,25 @@ def get_users():
     if role_filter:
         query = query.filter_by(role=role_filter)
     
-    query = query.order_by(User.created_at.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # ?cursor= opts into keyset pages, which stay fast however deep they go
+    if 'cursor' in request.args:
+        try:
+            items, page_info = cursor_page(query, User, request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        query = query.order_by(User.created_at.desc())
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        items = pagination.items
+        page_info = {
+            "total": pagination.total,
+            "page": pagination.page,
+            "per_page": pagination.per_page,
+            "pages": pagination.pages
+        }
     
     users = []
-    for u in pagination.items:
+    for u in items:
         users.append({
             "id": u.id,
             "full_name": u.full_name,
@@ -45,10 +68,7 @@ def get_users():
     
     return jsonify({
         "users": users,
-        "total": pagination.total,
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "pages": pagination.pages
+        **page_info
     }), 200
 
 
@@ -63,22 +83,39 @@ def get_all_orders():
     
     # Get query parameters
     status_filter = request.args.get('status')
+    payment_status = request.args.get('payment_status')
     courier_id = request.args.get('courier_id')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    query = ParcelOrder.query
+    query = order_listing(customer=True, courier=True)
     
     if status_filter:
         query = query.filter_by(status=status_filter)
+    if payment_status:
+        query = query.filter_by(payment_status=payment_status)
     if courier_id:
         query = query.filter_by(courier_id=courier_id)
     
-    query = query.order_by(ParcelOrder.created_at.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # ?cursor= opts into keyset pages, which stay fast however deep they go
+    if 'cursor' in request.args:
+        try:
+            items, page_info = cursor_page(query, ParcelOrder, request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        query = query.order_by(ParcelOrder.created_at.desc())
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        items = pagination.items
+        page_info = {
+            "total": pagination.total,
+            "page": pagination.page,
+            "per_page": pagination.per_page,
+            "pages": pagination.pages
+        }
     
     orders = []
-    for order in pagination.items:
+    for order in items:
         orders.append({
             "id": order.id,
             "parcel_name": order.parcel_name,
@@ -89,6 +126,7 @@ def get_all_orders():
             "distance": order.distance,
             "price": order.price,
             "status": order.status,
+            "payment_status": order.payment_status,
             "created_at": order.created_at.isoformat() if order.created_at else None,
             "parcel_image_url": order.parcel_image_url,
             "customer": {
@@ -105,10 +143,7 @@ def get_all_orders():
     
     return jsonify({
         "orders": orders,
-        "total": pagination.total,
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "pages": pagination.pages
+        **page_info
     }), 200
 
 
@@ -144,26 +179,26 @@ def assign_courier(order_id):
     order.status = 'assigned'
     
     try:
-        db.session.commit()
+        # Queued in the same transaction as the assignment
+        if order.customer:
+            send_order_status_email(order.customer.email, order.id, 'assigned', order.parcel_name)
         
-        # Notify courier
+        # Notify courier and customer
         create_notification(
             user_id=courier_id,
             order_id=order.id,
             message=f"You have been assigned order #{order.id}",
-            type="assignment"
+            type_="assignment"
         )
-        
-        # Notify customer
         create_notification(
             user_id=order.customer_id,
             order_id=order.id,
             message=f"Courier assigned to your order #{order.id}",
-            type="assignment"
+            type_="assignment"
         )
         
-        if order.customer:
-            send_order_status_email(order.customer.email, order.id, 'assigned', order.parcel_name)
+        db.session.commit()
+        publish_order_update(order, "status")
         
     except Exception as e:
         db.session.rollback()
@@ -182,6 +217,108 @@ def assign_courier(order_id):
     }), 200
 
 
+@admin_bp.route('/admin/orders/<int:order_id>/courier-suggestions', methods=['GET'])
+@jwt_required()
+def suggest_couriers(order_id):
+    current_user_id = get_jwt_identity()
+    
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({"error": "Access denied. Admin only."}), 403
+    
+    order = ParcelOrder.query.get(order_id)
+    
+    if not order:
+        return jsonify({"error": "Order not found"}), 404
+    
+    if order.pickup_lat is None or order.pickup_lng is None:
+        return jsonify({"error": "Order has no pickup coordinates"}), 400
+    
+    try:
+        k = min(max(int(request.args.get('k', 5)), 1), 50)
+        max_km = float(request.args.get('max_km', 50))
+    except ValueError:
+        return jsonify({"error": "k and max_km must be numbers"}), 400
+    
+    from utils.location_store import location_store, TRACKED_STATUSES
+    
+    # Over-fetch: some nearby couriers may be deactivated
+    nearby = location_store.nearest_couriers(
+        order.pickup_lat, order.pickup_lng, k=k * 2, max_km=max_km,
+        max_age=timedelta(seconds=int(os.environ.get('COURIER_POSITION_MAX_AGE', 600)))
+    )
+    courier_ids = [courier_id for _, courier_id, _ in nearby]
+    
+    couriers = {
+        courier.id: courier
+        for courier in User.query.filter(
+            User.id.in_(courier_ids), User.role == 'courier', User.is_active.is_(True)
+        )
+    }
+    loads = dict(
+        db.session.query(ParcelOrder.courier_id, func.count(ParcelOrder.id))
+        .filter(ParcelOrder.courier_id.in_(list(couriers)), ParcelOrder.status.in_(TRACKED_STATUSES))
+        .group_by(ParcelOrder.courier_id)
+        .all()
+    ) if couriers else {}
+    
+    suggestions = []
+    for distance, courier_id, seen_at in nearby:
+        courier = couriers.get(courier_id)
+        if courier is None:
+            continue
+        suggestions.append({
+            "id": courier.id,
+            "full_name": courier.full_name,
+            "phone": courier.phone,
+            "vehicle_type": courier.vehicle_type,
+            "distance_km": round(distance, 2),
+            "active_orders": loads.get(courier.id, 0),
+            "last_seen_at": seen_at.isoformat()
+        })
+        if len(suggestions) == k:
+            break
+    
+    return jsonify({
+        "order_id": order.id,
+        "suggestions": suggestions
+    }), 200
+
+
+@admin_bp.route('/admin/dispatch', methods=['POST'])
+@jwt_required()
+def dispatch_orders():
+    current_user_id = get_jwt_identity()
+    
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({"error": "Access denied. Admin only."}), 403
+    
+    data = request.get_json(silent=True) or {}
+    
+    from utils.dispatch import dispatch_pending
+    
+    try:
+        result = dispatch_pending(dry_run=bool(data.get('dry_run')))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(result), 200
+
+
+@admin_bp.cli.command('dispatch')
+@click.option('--dry-run', is_flag=True, help='Plan assignments without saving them')
+def dispatch_command(dry_run):
+    """Assign pending orders to nearby couriers; run from a cron job"""
+    from utils.dispatch import dispatch_pending
+    
+    result = dispatch_pending(dry_run=dry_run)
+    click.echo(
+        f"Pending: {result['pending_orders']}, couriers: {result['available_couriers']}, "
+        f"planned: {len(result['planned'])}, assigned: {result['assigned']} ({result['planning_ms']} ms)"
+    )
+
+
 @admin_bp.route('/admin/orders/<int:order_id>/status', methods=['PATCH'])
 @jwt_required()
 def update_order_status(order_id):
@@ -211,23 +348,25 @@ def update_order_status(order_id):
     order.status = new_status
     
     try:
-        db.session.commit()
+        if order.customer:
+            send_order_status_email(order.customer.email, order.id, new_status, order.parcel_name)
         
         # Notify customer
         create_notification(
             user_id=order.customer_id,
             order_id=order.id,
             message=f"Your order #{order.id} status changed to {new_status}",
-            type="status_update"
+            type_="status_update"
         )
         
-        if order.customer:
-            send_order_status_email(order.customer.email, order.id, new_status, order.parcel_name)
+        db.session.commit()
         
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
     
+    publish_order_update(order, "status")
+    
     return jsonify({
         "message": "Status updated successfully",
         "order": {
@@ -246,26 +385,19 @@ def get_dashboard():
     if user.role != 'admin':
         return jsonify({"error": "Access denied. Admin only."}), 403
     
-    # Get statistics
-    total_users = User.query.count()
-    total_customers = User.query.filter_by(role='customer').count()
-    total_couriers = User.query.filter_by(role='courier').count()
-    total_orders = ParcelOrder.query.count()
-    
-    # Orders by status
-    pending_orders = ParcelOrder.query.filter_by(status='pending').count()
-    assigned_orders = ParcelOrder.query.filter_by(status='assigned').count()
-    in_transit_orders = ParcelOrder.query.filter_by(status='in_transit').count()
-    delivered_orders = ParcelOrder.query.filter_by(status='delivered').count()
-    cancelled_orders = ParcelOrder.query.filter_by(status='cancelled').count()
-    
-    # Revenue
-    total_revenue = db.session.query(func.sum(ParcelOrder.price)).filter(
-        ParcelOrder.status.in_(['delivered', 'in_transit'])
-    ).scalar() or 0
-    
-    # Recent orders
-    recent_orders = ParcelOrder.query.order_by(
+    # Maintained counters instead of a COUNT per figure
+    stats = read_stats()
+    
+    # Recent orders, with customer and courier in the same query
+    recent_orders = order_listing(customer=True, courier=True, columns=(
+        ParcelOrder.parcel_name,
+        ParcelOrder.status,
+        ParcelOrder.price,
+        ParcelOrder.parcel_image_url,
+        ParcelOrder.created_at,
+        ParcelOrder.customer_id,
+        ParcelOrder.courier_id
+    )).order_by(
         ParcelOrder.created_at.desc()
     ).limit(10).all()
     
@@ -284,21 +416,28 @@ def get_dashboard():
     
     return jsonify({
         "stats": {
-            "total_users": total_users,
-            "total_customers": total_customers,
-            "total_couriers": total_couriers,
-            "total_orders": total_orders,
-            "pending_orders": pending_orders,
-            "assigned_orders": assigned_orders,
-            "in_transit_orders": in_transit_orders,
-            "delivered_orders": delivered_orders,
-            "cancelled_orders": cancelled_orders,
-            "total_revenue": total_revenue
+            "total_users": int(stats.get("users", 0)),
+            "total_customers": int(stats.get("users.customer", 0)),
+            "total_couriers": int(stats.get("users.courier", 0)),
+            "total_orders": int(stats.get("orders", 0)),
+            "pending_orders": int(stats.get("orders.pending", 0)),
+            "assigned_orders": int(stats.get("orders.assigned", 0)),
+            "in_transit_orders": int(stats.get("orders.in_transit", 0)),
+            "delivered_orders": int(stats.get("orders.delivered", 0)),
+            "cancelled_orders": int(stats.get("orders.cancelled", 0)),
+            "total_revenue": stats.get("revenue", 0)
         },
         "recent_orders": recent_orders_data
     }), 200
 
 
+@admin_bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the dashboard counters from orders and users"""
+    values = rebuild_stats()
+    click.echo(f"Rebuilt {len(values)} counters: {int(values['orders'])} orders, {int(values['users'])} users")
+
+
 @admin_bp.route('/admin/users/<int:user_id>/toggle-active', methods=['PATCH'])
 @jwt_required()
 def toggle_user_active(user_id):
@@ -327,6 +466,16 @@ def toggle_user_active(user_id):
     }), 200
 
 
+# Aggregates per courier; any of these can be the ?sort= key
+COURIER_AGGREGATES = {
+    "total_deliveries": func.count(case((ParcelOrder.status == 'delivered', ParcelOrder.id))),
+    "active_orders": func.count(case((ParcelOrder.status.in_(['assigned', 'picked_up', 'in_transit']), ParcelOrder.id))),
+    "earnings": func.coalesce(func.sum(case((ParcelOrder.status == 'delivered', ParcelOrder.price))), 0),
+    "last_delivery_at": func.max(case((ParcelOrder.status == 'delivered', ParcelOrder.delivered_at)))
+}
+COURIER_SORT_KEYS = sorted(COURIER_AGGREGATES) + ["created_at", "full_name"]
+
+
 @admin_bp.route('/admin/couriers', methods=['GET'])
 @jwt_required()
 def get_couriers():
@@ -336,22 +485,44 @@ def get_couriers():
     if user.role != 'admin':
         return jsonify({"error": "Access denied. Admin only."}), 403
     
-    couriers = User.query.filter_by(role='courier').all()
+    # Get query parameters
+    vehicle_type = request.args.get('vehicle_type')
+    is_active = request.args.get('is_active')
+    sort = request.args.get('sort', 'created_at')
+    direction = request.args.get('order', 'desc')
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    
+    if sort not in COURIER_SORT_KEYS:
+        return jsonify({"error": f"sort must be one of: {', '.join(COURIER_SORT_KEYS)}"}), 400
+    if direction not in ('asc', 'desc'):
+        return jsonify({"error": "order must be asc or desc"}), 400
+    if is_active is not None and is_active.lower() not in ('true', 'false'):
+        return jsonify({"error": "is_active must be true or false"}), 400
+    page = max(page, 1)
+    per_page = max(1, min(per_page, 100))
+    
+    filters = [User.role == 'courier']
+    if vehicle_type:
+        filters.append(func.lower(User.vehicle_type) == vehicle_type.strip().lower())
+    if is_active is not None:
+        filters.append(User.is_active.is_(is_active.lower() == 'true'))
+    
+    total = db.session.query(func.count(User.id)).filter(*filters).scalar()
+    
+    # One grouped query for the page, however many couriers or orders there are
+    aggregates = {name: expression.label(name) for name, expression in COURIER_AGGREGATES.items()}
+    sort_column = aggregates[sort] if sort in aggregates else getattr(User, sort)
+    sort_column = sort_column.asc() if direction == 'asc' else sort_column.desc()
+    rows = db.session.query(User, *aggregates.values()).outerjoin(
+        ParcelOrder, ParcelOrder.courier_id == User.id
+    ).filter(*filters).group_by(User.id).order_by(
+        sort_column.nulls_last(),
+        User.id.asc() if direction == 'asc' else User.id.desc()
+    ).limit(per_page).offset((page - 1) * per_page).all()
     
     result = []
-    for courier in couriers:
-        # Get courier stats
-        total_deliveries = ParcelOrder.query.filter_by(
-            courier_id=courier.id, 
-            status='delivered'
-        ).count()
-        
-        active_orders = ParcelOrder.query.filter_by(
-            courier_id=courier.id
-        ).filter(
-            ParcelOrder.status.in_(['assigned', 'picked_up', 'in_transit'])
-        ).count()
-        
+    for courier, total_deliveries, active_orders, earnings, last_delivery_at in rows:
         result.append({
             "id": courier.id,
             "full_name": courier.full_name,
@@ -362,12 +533,17 @@ def get_couriers():
             "is_active": courier.is_active,
             "total_deliveries": total_deliveries,
             "active_orders": active_orders,
+            "earnings": float(earnings),
+            "last_delivery_at": last_delivery_at.isoformat() if last_delivery_at else None,
             "created_at": courier.created_at.isoformat() if courier.created_at else None
         })
 
     return jsonify({
         "couriers": result,
-        "total": len(result)
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page
     }), 200
 
 @admin_bp.route('/admin/reports', methods=['GET'])
@@ -379,52 +555,72 @@ def get_reports():
     if not user or user.role != 'admin':
         return jsonify({"error": "Access denied. Admin only."}), 403
         
-    from sqlalchemy import func
-    from datetime import datetime, timedelta
-    
-    # 1. Revenue last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    # Only count delivered orders for revenue
-    daily_revenue = db.session.query(
-        func.date(ParcelOrder.created_at).label('date'),
-        func.sum(ParcelOrder.price).label('revenue')
-    ).filter(
-        ParcelOrder.created_at >= thirty_days_ago,
-        ParcelOrder.status == 'delivered'
-    ).group_by(
-        func.date(ParcelOrder.created_at)
+    # Range of creation days, inclusive; the last 30 days by default
+    try:
+        last_day = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else datetime.utcnow().date()
+        first_day = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else last_day - timedelta(days=29)
+    except ValueError:
+        return jsonify({"error": "from and to must be dates as YYYY-MM-DD"}), 400
+    if first_day > last_day:
+        return jsonify({"error": "from must not be after to"}), 400
+    
+    # Read-only: `flask admin refresh-rollups` keeps the rollups current from cron
+    rollups = DailyOrderRollup.query.filter(
+        DailyOrderRollup.day >= first_day,
+        DailyOrderRollup.day <= last_day
     ).all()
     
+    # 1. Revenue per day; only delivered orders count
+    revenue_by_day = {}
+    status_counts = {}
+    summary = {"orders": 0, "revenue": 0.0, "distance_km": 0.0}
+    for rollup in rollups:
+        status_counts[rollup.status] = status_counts.get(rollup.status, 0) + rollup.order_count
+        summary["orders"] += rollup.order_count
+        summary["distance_km"] += rollup.distance_km
+        if rollup.status == 'delivered':
+            revenue_by_day[rollup.day] = rollup.revenue
+            summary["revenue"] += rollup.revenue
+    
     revenue_chart_data = []
-    # Fill in missing days? For simplicity, just sending what we have
-    for day in daily_revenue:
+    for offset in range((last_day - first_day).days + 1):
+        day = first_day + timedelta(days=offset)
         revenue_chart_data.append({
-            "date": str(day.date),
-            "revenue": float(day.revenue) if day.revenue else 0
+            "date": day.isoformat(),
+            "revenue": float(revenue_by_day.get(day, 0))
         })
         
-    # 2. Status Distribution
-    status_counts = db.session.query(
-        ParcelOrder.status,
-        func.count(ParcelOrder.id)
-    ).group_by(ParcelOrder.status).all()
-    
+    # 2. Status Distribution: all orders, from the dashboard counters;
+    # the requested range is in range_status_distribution
+    stats = read_stats()
     status_chart_data = []
-    for s in status_counts:
-        status_chart_data.append({
-            "name": s[0],
-            "value": s[1]
+    for status in sorted(ORDER_STATUSES):
+        count = int(stats.get(f"orders.{status}", 0))
+        if count:
+            status_chart_data.append({
+                "name": status,
+                "value": count
+            })
+    
+    range_status_data = []
+    for status, count in sorted(status_counts.items()):
+        range_status_data.append({
+            "name": status,
+            "value": count
         })
         
-    # 3. Top Couriers (by completed deliveries)
-    # Using join to get courier names
+    # 3. Top Couriers (by completed deliveries in the range)
+    # Bounded by ix_parcel_orders_status_created_at, so only the range's deliveries are grouped
+    range_start = datetime.combine(first_day, datetime.min.time())
+    range_end = datetime.combine(last_day + timedelta(days=1), datetime.min.time())
     top_couriers = db.session.query(
         User.full_name,
         func.count(ParcelOrder.id).label('deliveries')
     ).join(ParcelOrder, ParcelOrder.courier_id == User.id).filter(
         User.role == 'courier',
-        ParcelOrder.status == 'delivered'
+        ParcelOrder.status == 'delivered',
+        ParcelOrder.created_at >= range_start,
+        ParcelOrder.created_at < range_end
     ).group_by(User.id, User.full_name).order_by(func.count(ParcelOrder.id).desc()).limit(5).all()
     
     top_couriers_data = []
@@ -435,12 +631,35 @@ def get_reports():
         })
         
     return jsonify({
+        "from": first_day.isoformat(),
+        "to": last_day.isoformat(),
+        "summary": {
+            "orders": summary["orders"],
+            "revenue": round(summary["revenue"], 2),
+            "distance_km": round(summary["distance_km"], 2)
+        },
         "revenue_trends": revenue_chart_data,
         "status_distribution": status_chart_data,
+        "range_status_distribution": range_status_data,
         "top_couriers": top_couriers_data
     }), 200
 
 
+@admin_bp.cli.command('refresh-rollups')
+def refresh_rollups_command():
+    """Recompute the report rollups for days with orders changed since the last run"""
+    days = refresh_rollups()
+    click.echo(f"Refreshed {len(days)} days of rollups")
+
+
+@admin_bp.cli.command('backfill-rollups')
+@click.option('--chunk-days', default=BACKFILL_CHUNK_DAYS, show_default=True, help='Days per transaction')
+def backfill_rollups_command(chunk_days):
+    """Rebuild the report rollups for the whole order history"""
+    days = backfill_rollups(chunk_days=chunk_days)
+    click.echo(f"Backfilled {len(days)} days of rollups")
+
+
 @admin_bp.route('/admin/users/<int:user_id>/role', methods=['PATCH'])
 @jwt_required()
 def change_user_role(user_id):
@@ -485,3 +704,159 @@ def change_user_role(user_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
+
+
+@admin_bp.route('/admin/cache', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    current_user_id = get_jwt_identity()
+    
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({"error": "Access denied. Admin only."}), 403
+    
+    from utils.cache import geocode_cache, distance_cache
+    
+    return jsonify({
+        "geocode": geocode_cache.stats(),
+        "distance": distance_cache.stats()
+    }), 200
+
+
+@admin_bp.route('/admin/cache', methods=['DELETE'])
+@jwt_required()
+def purge_cache():
+    current_user_id = get_jwt_identity()
+    
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({"error": "Access denied. Admin only."}), 403
+    
+    from utils.cache import geocode_cache, distance_cache
+    
+    caches = {
+        "geocode": geocode_cache,
+        "distance": distance_cache
+    }
+    
+    # ?cache=geocode|distance (default: both), ?expired_only=true to keep live entries
+    name = request.args.get('cache')
+    if name and name not in caches:
+        return jsonify({"error": f"Unknown cache. Use one of: {', '.join(caches)}"}), 400
+    expired_only = request.args.get('expired_only', 'false').lower() == 'true'
+    
+    purged = {}
+    for key, cache in caches.items():
+        if name and key != name:
+            continue
+        purged[key] = cache.purge(expired_only=expired_only)
+    
+    return jsonify({
+        "message": "Cache purged successfully",
+        "purged": purged
+    }), 200
+
+
+# Upper bound on origin x destination pairs per distance-matrix request
+MAX_MATRIX_PAIRS = 10000
+
+
+@admin_bp.route('/admin/distance-matrix', methods=['POST'])
+@jwt_required()
+def distance_matrix():
+    current_user_id = get_jwt_identity()
+    
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({"error": "Access denied. Admin only."}), 403
+    
+    from utils import get_distance_matrix_batch
+    
+    data = request.get_json() or {}
+    origins = data.get('origins')
+    destinations = data.get('destinations')
+    
+    if not isinstance(origins, list) or not isinstance(destinations, list) or not origins or not destinations:
+        return jsonify({"error": "origins and destinations must be non-empty lists of [lat, lng]"}), 400
+    
+    try:
+        origins = [(float(lat), float(lng)) for lat, lng in origins]
+        destinations = [(float(lat), float(lng)) for lat, lng in destinations]
+    except (TypeError, ValueError):
+        return jsonify({"error": "origins and destinations must be non-empty lists of [lat, lng]"}), 400
+    
+    if len(origins) * len(destinations) > MAX_MATRIX_PAIRS:
+        return jsonify({"error": f"At most {MAX_MATRIX_PAIRS} origin/destination pairs per request"}), 400
+    
+    provider = data.get('provider')
+    if provider and provider not in ('mapbox', 'local', 'fallback', 'offline'):
+        return jsonify({"error": "Invalid provider. Use mapbox, local, fallback or offline"}), 400
+    
+    distances, durations = get_distance_matrix_batch(origins, destinations, provider=provider)
+    
+    # NaN (no route) becomes null
+    return jsonify({
+        "distances_km": [
+            [round(value, 2) if value == value else None for value in row]
+            for row in distances.tolist()
+        ],
+        "durations_s": [
+            [round(value) if value == value else None for value in row]
+            for row in durations.tolist()
+        ]
+    }), 200
+
+
+@admin_bp.route('/admin/upstreams', methods=['GET'])
+@jwt_required()
+def get_upstream_stats():
+    current_user_id = get_jwt_identity()
+    
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({"error": "Access denied. Admin only."}), 403
+    
+    from services.http_client import http_client
+    
+    # Latency/error stats per external API since this worker started
+    return jsonify(http_client.stats()), 200
+
+
+@admin_bp.route('/admin/notifications', methods=['POST'])
+@jwt_required()
+def broadcast_notification():
+    current_user_id = get_jwt_identity()
+    
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({"error": "Access denied. Admin only."}), 403
+    
+    from sqlalchemy import select
+    from utils import notify_users
+    
+    data = request.get_json() or {}
+    message = (data.get('message') or '').strip()
+    role = data.get('role', 'all')
+    
+    if not message:
+        return jsonify({"error": "Message is required"}), 400
+    
+    if role not in ['customer', 'courier', 'admin', 'all']:
+        return jsonify({"error": "Invalid role. Must be customer, courier, admin or all"}), 400
+    
+    recipients = select(User.id).where(User.is_active == True)
+    if role != 'all':
+        recipients = recipients.where(User.role == role)
+    
+    try:
+        # One INSERT ... SELECT however many users match
+        sent = notify_users(recipients, message, data.get('type', 'announcement'))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "message": "Notification sent",
+        "recipients": sent
+    }), 201
@@ -60,9 +60,10 @@ def register():
     
     try:
         db.session.add(user)
-        db.session.commit()
+        # Flush for the user id; the verification email commits with the user
+        db.session.flush()
         
-        # Send verification email
+        # Queue verification email
         try:
             from services.email_service import send_magic_link, send_email
             import os
@@ -89,6 +90,8 @@ def register():
             logger = logging.getLogger(__name__)
             logger.error(f"Failed to send email: {e}")
             # Consider rollback if email critical? For now log error.
+        
+        db.session.commit()
             
     except Exception as e:
         db.session.rollback()
@@ -194,6 +197,7 @@ def forgot_password():
             </div>
             """
         )
+        db.session.commit()
     except Exception as e:
         print(f"Failed to send email: {e}")
         return jsonify({"error": "Failed to send email"}), 500
@@ -1,10 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import ParcelOrder, User, Notification
+from models import ParcelOrder, User, Notification, LocationPing
 from extensions import db
+from sqlalchemy import insert, select
 from utils import create_notification
+from utils.order_queries import order_listing
+from utils.pubsub import publish_order_update, publish_position
+from utils.location_store import location_store, TRACKED_STATUSES
 from services.email_service import send_order_status_email
-from datetime import datetime
+from datetime import datetime, timedelta
 
 courier_bp = Blueprint('courier', __name__)
 
@@ -23,9 +27,10 @@ def get_assigned_orders():
         return jsonify({"error": "Access denied. Courier only."}), 403
     
     # Get assigned orders
-    orders = ParcelOrder.query.filter_by(courier_id=current_user_id).order_by(
+    orders = order_listing(customer=True).filter_by(courier_id=current_user_id).order_by(
         ParcelOrder.created_at.desc()
     ).all()
+    location_store.apply_many(orders)
     
     result = []
     for order in orders:
@@ -61,6 +66,46 @@ def get_assigned_orders():
     }), 200
 
 
+@courier_bp.route('/courier/route', methods=['GET'])
+@jwt_required()
+def get_route():
+    """Best order to visit the pickups and drop-offs of the courier's active orders"""
+    current_user_id = get_jwt_identity()
+    try:
+        current_user_id = int(current_user_id)
+    except ValueError:
+        return jsonify({"error": "Invalid user identity"}), 401
+    
+    user = User.query.get(current_user_id)
+    if user.role != 'courier':
+        return jsonify({"error": "Access denied. Courier only."}), 403
+    
+    # Start from ?lat=&lng= if given, else the courier's last ping
+    if request.args.get('lat') is not None and request.args.get('lng') is not None:
+        try:
+            start = (float(request.args['lat']), float(request.args['lng']))
+        except ValueError:
+            return jsonify({"error": "Invalid coordinate format"}), 400
+    else:
+        start = location_store.courier_position(current_user_id)
+    
+    orders = ParcelOrder.query.filter(
+        ParcelOrder.courier_id == current_user_id,
+        ParcelOrder.status.in_(TRACKED_STATUSES)
+    ).order_by(ParcelOrder.id).all()
+    
+    from utils.route_planner import plan_courier_route
+    stops, unrouted = plan_courier_route(orders, start=start)
+    
+    return jsonify({
+        "start": {"lat": start[0], "lng": start[1]} if start else None,
+        "stops": stops,
+        "total_distance_km": stops[-1]["distance_km"] if stops else 0,
+        "total_duration_s": stops[-1]["eta_seconds"] if stops else 0,
+        "unrouted_order_ids": unrouted
+    }), 200
+
+
 @courier_bp.route('/courier/orders/<int:order_id>/location', methods=['PATCH'])
 @jwt_required()
 def update_location(order_id):
@@ -96,22 +141,178 @@ def update_location(order_id):
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid coordinate format"}), 400
     
-    order.current_lat = lat
-    order.current_lng = lng
+    # Held in memory and written to parcel_orders by the flusher
+    location_store.record(order.id, current_user_id, [
+        {"lat": lat, "lng": lng, "accuracy": None, "recorded_at": datetime.utcnow()}
+    ])
+    publish_order_update(location_store.apply(order), "location")
     
+    return jsonify({
+        "message": "Location updated successfully",
+        "current_lat": lat,
+        "current_lng": lng
+    }), 200
+
+
+@courier_bp.route('/courier/location', methods=['PATCH'])
+@jwt_required()
+def update_courier_location():
+    """
+    One ping for everything the courier is carrying.
+    Nothing is loaded through the ORM: the role and the courier's active
+    orders are read with one query each, and the position goes to the
+    location store.
+    """
+    current_user_id = get_jwt_identity()
     try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"error": str(e)}), 400
+        current_user_id = int(current_user_id)
+    except ValueError:
+        return jsonify({"error": "Invalid user identity"}), 401
+    
+    role = db.session.execute(select(User.role).where(User.id == current_user_id)).scalar()
+    if role != 'courier':
+        return jsonify({"error": "Access denied. Courier only."}), 403
+    
+    data = request.get_json() or {}
+    
+    if data.get('lat') is None or data.get('lng') is None:
+        return jsonify({"error": "Latitude and longitude are required"}), 400
+    
+    try:
+        lat = float(data['lat'])
+        lng = float(data['lng'])
+        
+        if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+            return jsonify({"error": "Invalid coordinates"}), 400
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid coordinate format"}), 400
+    
+    orders = db.session.execute(
+        select(ParcelOrder.id, ParcelOrder.status)
+        .where(ParcelOrder.courier_id == current_user_id, ParcelOrder.status.in_(TRACKED_STATUSES))
+    ).all()
+    
+    point = {"lat": lat, "lng": lng, "accuracy": None, "recorded_at": datetime.utcnow()}
+    # Idle couriers have no orders to update but still show up for dispatch
+    location_store.update_courier(current_user_id, lat, lng, point['recorded_at'])
+    for order_id, status in orders:
+        location_store.record(order_id, current_user_id, [point])
+        publish_position(order_id, status, lat, lng)
     
     return jsonify({
         "message": "Location updated successfully",
+        "order_ids": [order_id for order_id, _ in orders],
         "current_lat": lat,
         "current_lng": lng
     }), 200
 
 
+# Largest batch a client may upload at once
+MAX_POINTS_PER_UPLOAD = 500
+# Allowed clock skew for points stamped in the future
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+def parse_location_point(point):
+    """
+    One uploaded point as a location_pings row (without order/courier ids).
+    `recorded_at` is ISO 8601 or epoch seconds, in UTC. Raises ValueError.
+    """
+    if not isinstance(point, dict):
+        raise ValueError("Each point must be an object")
+    if point.get('lat') is None or point.get('lng') is None:
+        raise ValueError("Latitude and longitude are required")
+    try:
+        lat = float(point['lat'])
+        lng = float(point['lng'])
+        accuracy = float(point['accuracy']) if point.get('accuracy') is not None else None
+    except (ValueError, TypeError):
+        raise ValueError("Invalid coordinate format")
+    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        raise ValueError("Invalid coordinates")
+    
+    recorded_at = point.get('recorded_at')
+    try:
+        if isinstance(recorded_at, (int, float)) and not isinstance(recorded_at, bool):
+            recorded_at = datetime.utcfromtimestamp(recorded_at)
+        elif isinstance(recorded_at, str):
+            recorded_at = datetime.fromisoformat(recorded_at.replace('Z', '+00:00'))
+            if recorded_at.tzinfo is not None:
+                recorded_at = (recorded_at - recorded_at.utcoffset()).replace(tzinfo=None)
+        else:
+            raise ValueError
+    except (ValueError, OverflowError, OSError):
+        raise ValueError("recorded_at must be an ISO 8601 timestamp or epoch seconds")
+    if recorded_at > datetime.utcnow() + MAX_CLOCK_SKEW:
+        raise ValueError("recorded_at is in the future")
+    
+    return {"lat": lat, "lng": lng, "accuracy": accuracy, "recorded_at": recorded_at}
+
+
+@courier_bp.route('/courier/orders/<int:order_id>/locations', methods=['POST'])
+@jwt_required()
+def upload_locations(order_id):
+    """
+    Store a batch of buffered points with one multi-row INSERT and move the
+    order's current position to the newest of them.
+    """
+    current_user_id = get_jwt_identity()
+    try:
+        current_user_id = int(current_user_id)
+    except ValueError:
+        return jsonify({"error": "Invalid user identity"}), 401
+    
+    user = User.query.get(current_user_id)
+    if user.role != 'courier':
+        return jsonify({"error": "Access denied. Courier only."}), 403
+    
+    order = ParcelOrder.query.get(order_id)
+    
+    if not order:
+        return jsonify({"error": "Order not found"}), 404
+    
+    if order.courier_id != current_user_id:
+        return jsonify({"error": "Access denied. This order is not assigned to you."}), 403
+    
+    data = request.get_json() or {}
+    points = data.get('points')
+    
+    if not isinstance(points, list) or not points:
+        return jsonify({"error": "points must be a non-empty list"}), 400
+    if len(points) > MAX_POINTS_PER_UPLOAD:
+        return jsonify({"error": f"At most {MAX_POINTS_PER_UPLOAD} points per upload"}), 400
+    
+    rows = []
+    for index, point in enumerate(points):
+        try:
+            row = parse_location_point(point)
+        except ValueError as e:
+            return jsonify({"error": f"Point {index}: {e}"}), 400
+        row.update(order_id=order.id, courier_id=current_user_id)
+        rows.append(row)
+    
+    try:
+        db.session.execute(insert(LocationPing).values(rows))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    
+    # History is already written; the position goes through the store like single pings
+    moved = location_store.record(order.id, current_user_id, rows, keep_history=False)
+    location_store.apply(order)
+    if moved:
+        publish_order_update(order, "location")
+    
+    return jsonify({
+        "message": "Locations recorded",
+        "accepted": len(rows),
+        "current_lat": order.current_lat,
+        "current_lng": order.current_lng,
+        "position_updated": bool(moved)
+    }), 201
+
+
 @courier_bp.route('/courier/orders/<int:order_id>/status', methods=['PATCH'])
 @jwt_required()
 def update_order_status(order_id):
@@ -182,28 +383,25 @@ def update_order_status(order_id):
     elif new_status == "delivered":
         order.delivered_at = datetime.utcnow()
     
+    # Queue the email in the same transaction as the status change
+    try:
+        if order.customer:
+            send_order_status_email(order.customer.email, order.id, new_status, order.parcel_name)
+            logger.info(f"Status email queued for {order.customer.email}")
+    except Exception as e:
+        logger.error(f"Failed to queue status email: {e}")
+    
+    create_notification(
+        user_id=order.customer_id,
+        order_id=order.id,
+        message=f"Your order #{order.id} status changed to {new_status}",
+        type_="status_update"
+    )
+    
     try:
         db.session.commit()
         logger.info(f"Order {order_id} status updated to {new_status}")
-        
-        # Send notification and email
-        try:
-            create_notification(
-                user_id=order.customer_id,
-                order_id=order.id,
-                message=f"Your order #{order.id} status changed to {new_status}",
-                type="status_update"
-            )
-            
-            if order.customer:
-                email_sent = send_order_status_email(order.customer.email, order.id, new_status, order.parcel_name)
-                if email_sent:
-                    logger.info(f"Status email sent to {order.customer.email}")
-                else:
-                    logger.error(f"Failed to send status email to {order.customer.email}")
-        except Exception as e:
-            logger.error(f"Notification/Email error in update_order_status: {e}")
-            # Don't fail the request
+        publish_order_update(order, "status")
         
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,99 @@
+import click
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func, select, update
+from models import Notification, User
+from extensions import db
+from utils import mark_notifications_read
+from utils.pagination import keyset_page, page_size
+
+notifications_bp = Blueprint('notifications', __name__)
+
+
+@notifications_bp.route('/notifications', methods=['GET'])
+@jwt_required()
+def get_notifications():
+    current_user_id = int(get_jwt_identity())
+    
+    user = User.query.get(current_user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    query = Notification.query.filter_by(user_id=current_user_id)
+    if request.args.get('unread_only', 'false').lower() == 'true':
+        query = query.filter_by(is_read=False)
+    
+    try:
+        notifications, next_cursor = keyset_page(
+            query, Notification, request.args.get('cursor'), page_size(request.args.get('limit'))
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "notifications": [n.to_dict() for n in notifications],
+        "next_cursor": next_cursor,
+        "unread_count": user.unread_notifications
+    }), 200
+
+
+@notifications_bp.route('/notifications/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    current_user_id = int(get_jwt_identity())
+    
+    # Primary-key lookup of the maintained counter, no COUNT(*)
+    unread = db.session.execute(
+        select(User.unread_notifications).where(User.id == current_user_id)
+    ).scalar()
+    if unread is None:
+        return jsonify({"error": "User not found"}), 404
+    
+    return jsonify({"unread_count": unread}), 200
+
+
+@notifications_bp.route('/notifications/read', methods=['POST'])
+@jwt_required()
+def mark_read():
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    
+    ids = data.get('ids')
+    if data.get('all'):
+        ids = None
+    elif not isinstance(ids, list) or not ids:
+        return jsonify({"error": "Provide a list of notification ids or \"all\": true"}), 400
+    else:
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            return jsonify({"error": "Notification ids must be integers"}), 400
+    
+    try:
+        updated = mark_notifications_read(current_user_id, ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    
+    unread = db.session.execute(
+        select(User.unread_notifications).where(User.id == current_user_id)
+    ).scalar()
+    
+    return jsonify({
+        "message": "Notifications marked as read",
+        "updated": updated,
+        "unread_count": unread
+    }), 200
+
+
+@notifications_bp.cli.command('rebuild-unread')
+def rebuild_unread():
+    """Recompute every user's unread counter from the notifications table"""
+    unread = select(func.count(Notification.id)).where(
+        Notification.user_id == User.id,
+        Notification.is_read == False
+    ).scalar_subquery()
+    result = db.session.execute(update(User.__table__).values(unread_notifications=unread))
+    db.session.commit()
+    click.echo(f"Rebuilt unread counters for {result.rowcount} users")
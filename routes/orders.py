@@ -1,8 +1,15 @@
-from flask import Blueprint, request, jsonify
+import os
+import threading
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import ParcelOrder, User, Payment, Notification
 from extensions import db
-from utils import get_distance_matrix, get_geocode, create_notification, send_order_status_email, role_required
+from utils import resolve_distance, get_geocode, create_notification, send_order_status_email, role_required, DEFAULT_DISTANCE_KM
+from utils.concurrency import Deadline, submit, wait_for
+from utils.location_store import location_store
+from utils.order_queries import order_listing
+from utils.pagination import cursor_page
+from utils.pubsub import get_broker, order_channel, publish_order_update
 
 orders_bp = Blueprint('orders', __name__)
 
@@ -67,46 +74,65 @@ def create_order():
         else:
             weight_category = "xlarge"
         
-        # Geocode addresses
+        # Geocoding both addresses and the image upload don't depend on each
+        # other, so they run concurrently within one time budget
+        deadline = Deadline(float(os.environ.get('ORDER_RESOLVE_TIMEOUT', 10)))
+        
+        image_future = None
+        if request.files and 'parcel_image' in request.files:
+            file = request.files['parcel_image']
+            if file and file.filename != '':
+                logger.info("Processing image upload...")
+                from services.cloudinary_service import upload_image
+                # Read here: the request's stream isn't safe to use from another thread
+                image_future = submit(upload_image, file.read(), filename=file.filename)
+        
         logger.info("Geocoding addresses...")
-        pickup_lat, pickup_lng = None, None
-        destination_lat, destination_lng = None, None
+        pickup_future = None
+        destination_future = None
+        if not (data.get('pickup_lat') and data.get('pickup_lng')):
+            pickup_future = submit(get_geocode, data['pickup_address'])
+        if not (data.get('destination_lat') and data.get('destination_lng')):
+            destination_future = submit(get_geocode, data['destination_address'])
         
-        if data.get('pickup_lat') and data.get('pickup_lng'):
-            pickup_lat = data['pickup_lat']
-            pickup_lng = data['pickup_lng']
+        if pickup_future:
+            pickup_lat, pickup_lng = wait_for(pickup_future, deadline, (None, None), "Pickup geocode")
         else:
-            pickup_lat, pickup_lng = get_geocode(data['pickup_address'])
+            pickup_lat, pickup_lng = data['pickup_lat'], data['pickup_lng']
         logger.info(f"Pickup geocode result: {pickup_lat}, {pickup_lng}")
         
-        if data.get('destination_lat') and data.get('destination_lng'):
-            destination_lat = data['destination_lat']
-            destination_lng = data['destination_lng']
+        if destination_future:
+            destination_lat, destination_lng = wait_for(destination_future, deadline, (None, None), "Destination geocode")
         else:
-            destination_lat, destination_lng = get_geocode(data['destination_address'])
+            destination_lat, destination_lng = data['destination_lat'], data['destination_lng']
         logger.info(f"Destination geocode result: {destination_lat}, {destination_lng}")
         
-        # Get distance if both coordinates are available
+        # Get distance if both coordinates are available (the upload keeps going meanwhile)
         distance = None
+        distance_source = None
         if pickup_lat and pickup_lng and destination_lat and destination_lng:
             # Check for same location
             if (pickup_lat == destination_lat) and (pickup_lng == destination_lng):
                  distance = 0
             else:
-                 try:
-                    distance, _ = get_distance_matrix(
-                        (pickup_lat, pickup_lng),
-                        (destination_lat, destination_lng)
-                    )
-                 except Exception as e:
-                     logger.error(f"Distance matrix error: {e}")
-                     # proceed with default
+                 # Falls back to the offline road estimate if Mapbox can't answer in time
+                 distance_future = submit(
+                     resolve_distance,
+                     (pickup_lat, pickup_lng),
+                     (destination_lat, destination_lng)
+                 )
+                 distance, _, distance_source = wait_for(distance_future, deadline, (None, None, None), "Distance matrix")
             
-            # Default distance if API fails
-            if not distance:
-                distance = 5.0
+            if distance is None:
+                distance, _, distance_source = resolve_distance(
+                    (pickup_lat, pickup_lng),
+                    (destination_lat, destination_lng),
+                    provider='offline'
+                )
         else:
-             distance = 5.0 # Default if geocoding fails
+             logger.warning("Geocoding failed, pricing with the default distance")
+             distance = DEFAULT_DISTANCE_KM
+             distance_source = 'default'
         logger.info(f"Calculated distance: {distance}")
         
         # Calculate price
@@ -117,15 +143,13 @@ def create_order():
         import random
         delivery_code = str(random.randint(100000, 999999))
         
-        # Handle Image Upload
         parcel_image_url = None
-        if request.files and 'parcel_image' in request.files:
-            logger.info("Processing image upload...")
-            file = request.files['parcel_image']
-            if file and file.filename != '':
-                from services.cloudinary_service import upload_image
-                parcel_image_url = upload_image(file)
+        if image_future:
+            parcel_image_url = wait_for(image_future, deadline, None, "Image upload")
+            if parcel_image_url:
                 logger.info(f"Image uploaded to: {parcel_image_url}")
+            else:
+                logger.warning("Image upload failed, creating the order without an image")
         
         # Create order
         logger.info("Creating order object...")
@@ -142,6 +166,7 @@ def create_order():
             destination_lat=destination_lat,
             destination_lng=destination_lng,
             distance=distance,
+            distance_source=distance_source,
             price=price,
             status="pending",
             parcel_image_url=parcel_image_url,
@@ -150,11 +175,10 @@ def create_order():
         
         logger.info("Adding to DB session...")
         db.session.add(order)
-        logger.info("Committing to DB...")
-        db.session.commit()
-        logger.info(f"Order committed with ID: {order.id}")
+        # Flush for the order id; the email is queued in the same transaction
+        db.session.flush()
         
-        # Send email with delivery code
+        # Queue email with delivery code
         try:
             from services.email_service import send_order_created_email
             # Get user email
@@ -165,19 +189,19 @@ def create_order():
             
             send_order_created_email(user_email, order_data)
         except Exception as e:
-            print(f"Failed to send email: {e}")
+            print(f"Failed to queue email: {e}")
         
-        # Create notification
-        try:
-            create_notification(
-                user_id=current_user_id,
-                order_id=order.id,
-                message=f"Order #{order.id} created successfully",
-                type_="order_created"
-            )
-        except Exception as e:
-            print(f"Notification error: {e}")
-            # Don't fail request if notification fails
+        # Written by the commit below
+        create_notification(
+            user_id=current_user_id,
+            order_id=order.id,
+            message=f"Order #{order.id} created successfully",
+            type_="order_created"
+        )
+        
+        logger.info("Committing to DB...")
+        db.session.commit()
+        logger.info(f"Order committed with ID: {order.id}")
         
         return jsonify({
             "message": "Order created successfully",
@@ -217,10 +241,11 @@ def get_orders():
     
     # Get query parameters
     status_filter = request.args.get('status')
+    payment_status = request.args.get('payment_status')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    query = ParcelOrder.query
+    query = order_listing(customer=True, courier=True)
     
     if user.role == 'customer':
         query = query.filter_by(customer_id=current_user_id)
@@ -229,15 +254,33 @@ def get_orders():
     
     if status_filter:
         query = query.filter_by(status=status_filter)
+    if payment_status:
+        query = query.filter_by(payment_status=payment_status)
     
-    # Order by created_at desc
-    query = query.order_by(ParcelOrder.created_at.desc())
-    
-    # Paginate
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # ?cursor= opts into keyset pages, which stay fast however deep they go
+    if 'cursor' in request.args:
+        try:
+            items, page_info = cursor_page(query, ParcelOrder, request.args, default=10)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        # Order by created_at desc
+        query = query.order_by(ParcelOrder.created_at.desc())
+        
+        # Paginate
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        items = pagination.items
+        page_info = {
+            "total": pagination.total,
+            "page": pagination.page,
+            "per_page": pagination.per_page,
+            "pages": pagination.pages
+        }
     
+    # Live positions for the whole page in one lookup
+    location_store.apply_many(items)
     orders = []
-    for order in pagination.items:
+    for order in items:
         order_data = {
             "id": order.id,
             "parcel_name": order.parcel_name,
@@ -255,7 +298,7 @@ def get_orders():
             "current_lat": order.current_lat,
             "current_lng": order.current_lng,
             "created_at": order.created_at.isoformat() if order.created_at else None,
-            "payment_status": "completed" if any(p.status == "completed" for p in order.payments) else (order.payments[-1].status if order.payments else "pending"),
+            "payment_status": order.payment_status,
             "parcel_image_url": order.parcel_image_url,
             "customer": {
                 "id": order.customer.id,
@@ -274,10 +317,7 @@ def get_orders():
     
     return jsonify({
         "orders": orders,
-        "total": pagination.total,
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "pages": pagination.pages
+        **page_info
     }), 200
 
 
@@ -303,6 +343,8 @@ def get_order_detail(order_id):
     if user.role == 'courier' and order.courier_id != current_user_id:
         return jsonify({"error": "Access denied"}), 403
     
+    location_store.apply_many([order])
+    
     return jsonify({
         "id": order.id,
         "parcel_name": order.parcel_name,
@@ -323,7 +365,7 @@ def get_order_detail(order_id):
         "created_at": order.created_at.isoformat() if order.created_at else None,
         "picked_up_at": order.picked_up_at.isoformat() if order.picked_up_at else None,
         "delivered_at": order.delivered_at.isoformat() if order.delivered_at else None,
-        "payment_status": "completed" if any(p.status == "completed" for p in order.payments) else (order.payments[-1].status if order.payments else "pending"),
+        "payment_status": order.payment_status,
         "parcel_image_url": order.parcel_image_url,
         "delivery_code": order.delivery_code,
         "customer": {
@@ -342,6 +384,99 @@ def get_order_detail(order_id):
     }), 200
 
 
+# Statuses after which a tracking stream has nothing more to send
+FINAL_STATUSES = ('delivered', 'cancelled')
+# Each open stream holds a worker thread, so only some of them may be streams;
+# the rest stay free for ordinary requests
+stream_slots = threading.BoundedSemaphore(int(os.environ.get('SSE_MAX_STREAMS', 6)))
+
+
+@orders_bp.route('/orders/<int:order_id>/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_order(order_id):
+    """
+    Server-Sent Events with the order's status and courier position.
+    EventSource can't set headers, so the token may also be passed as ?jwt=.
+    """
+    current_user_id = get_jwt_identity()
+    try:
+        current_user_id = int(current_user_id)
+    except ValueError:
+        return jsonify({"error": "Invalid user identity"}), 401
+
+    user = User.query.get(current_user_id)
+    
+    order = ParcelOrder.query.get(order_id)
+    
+    if not order:
+        return jsonify({"error": "Order not found"}), 404
+    
+    # Check access
+    if user.role == 'customer' and order.customer_id != current_user_id:
+        return jsonify({"error": "Access denied"}), 403
+    if user.role == 'courier' and order.courier_id != current_user_id:
+        return jsonify({"error": "Access denied"}), 403
+    
+    if not stream_slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many open tracking streams, try again shortly"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    # Subscribe before reading the snapshot so no update can fall in between
+    subscription = get_broker().subscribe(order_channel(order.id))
+    location_store.apply_many([order])
+    snapshot = {
+        "event": "snapshot",
+        "id": order.id,
+        "status": order.status,
+        "current_lat": order.current_lat,
+        "current_lng": order.current_lng
+    }
+    # Don't hold a database connection for the life of the stream
+    db.session.remove()
+    
+    keepalive = float(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+    max_duration = float(os.environ.get('SSE_MAX_SECONDS', 300))
+    closed = []
+    
+    def close():
+        # Runs from the generator and again when the response closes, in case it never started
+        if not closed:
+            closed.append(True)
+            subscription.close()
+            stream_slots.release()
+    
+    def events():
+        import json
+        import time
+        
+        started = time.monotonic()
+        try:
+            # Clients reconnect by themselves after the stream ends
+            yield "retry: 3000\n\n"
+            message = snapshot
+            while True:
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {message['event']}\ndata: {json.dumps(message)}\n\n"
+                    if message.get('status') in FINAL_STATUSES:
+                        return
+                if time.monotonic() - started >= max_duration:
+                    return
+                message = subscription.get(timeout=keepalive)
+        finally:
+            close()
+    
+    response = Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        # Stop nginx-style proxies from buffering the stream
+        "X-Accel-Buffering": "no"
+    })
+    response.call_on_close(close)
+    return response
+
+
 @orders_bp.route('/orders/<int:order_id>/destination', methods=['PATCH'])
 @jwt_required()
 def update_destination(order_id):
@@ -375,40 +510,47 @@ def update_destination(order_id):
     else:
         destination_lat, destination_lng = get_geocode(data['destination_address'])
     
-    # Recalculate distance
+    # Recalculate distance (falls back to the offline road estimate if Mapbox can't answer)
     distance = None
+    distance_source = None
     if order.pickup_lat and order.pickup_lng and destination_lat and destination_lng:
-        distance, _ = get_distance_matrix(
+        distance, _, distance_source = resolve_distance(
             (order.pickup_lat, order.pickup_lng),
             (destination_lat, destination_lng)
         )
-        if not distance:
-            distance = 5.0
+        if distance is None:
+            distance, _, distance_source = resolve_distance(
+                (order.pickup_lat, order.pickup_lng),
+                (destination_lat, destination_lng),
+                provider='offline'
+            )
     
     # Recalculate price
-    new_price = ParcelOrder.calculate_price(order.weight, distance or order.distance or 5.0)
+    new_price = ParcelOrder.calculate_price(order.weight, distance or order.distance or DEFAULT_DISTANCE_KM)
     
     order.destination_address = data['destination_address']
     order.destination_lat = destination_lat
     order.destination_lng = destination_lng
-    order.distance = distance or order.distance
+    if distance:
+        order.distance = distance
+        order.distance_source = distance_source
     order.price = new_price
     
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"error": str(e)}), 400
-    
     # Notify courier if assigned
     if order.courier_id:
         create_notification(
             user_id=order.courier_id,
             order_id=order.id,
             message=f"Destination changed for order #{order.id}",
-            type="destination_changed"
+            type_="destination_changed"
         )
     
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    
     return jsonify({
         "message": "Destination updated successfully",
         "order": {
@@ -448,6 +590,8 @@ def cancel_order(order_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
     
+    publish_order_update(order, "status")
+    
     return jsonify({
         "message": "Order cancelled successfully"
     }), 200
@@ -488,49 +632,40 @@ def complete_delivery(order_id):
     order.status = 'delivered'
     order.delivered_at = db.func.now()
     
+    # Queue email with the status change
     try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"error": str(e)}), 400
-    
-    # Notify customer
-    try:
-        create_notification(
-            user_id=order.customer_id,
-            order_id=order.id,
-            message=f"Order #{order.id} has been delivered successfully!",
-            type_="order_delivered"
-        )
-        
-        # Send email
-        try:
-            from services.email_service import send_order_delivered_email
-            # Get customer email
-            customer = User.query.get(order.customer_id)
-            if customer and customer.email:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.info(f"Sending delivery email to {customer.email}")
-                
-                email_sent = send_order_delivered_email(customer.email, {
-                    "id": order.id,
-                    "parcel_name": order.parcel_name
-                })
-                
-                if email_sent:
-                    logger.info("Delivery email sent successfully")
-                else:
-                    logger.error("Failed to send delivery email")
-        except Exception as e:
+        from services.email_service import send_order_delivered_email
+        # Get customer email
+        customer = User.query.get(order.customer_id)
+        if customer and customer.email:
             import logging
             logger = logging.getLogger(__name__)
-            logger.error(f"Email error in complete_delivery: {e}")
-        
+            logger.info(f"Queueing delivery email to {customer.email}")
+            
+            send_order_delivered_email(customer.email, {
+                "id": order.id,
+                "parcel_name": order.parcel_name
+            })
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Notification error in complete_delivery: {e}")
+        logger.error(f"Email error in complete_delivery: {e}")
+    
+    # Notify customer
+    create_notification(
+        user_id=order.customer_id,
+        order_id=order.id,
+        message=f"Order #{order.id} has been delivered successfully!",
+        type_="order_delivered"
+    )
+    
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    
+    publish_order_update(order, "status")
 
     return jsonify({
         "message": "Order delivered successfully",
@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Payment, ParcelOrder, User, Notification
 from extensions import db
-from services.mpesa_service import initiate_stk_push
+import click
+from services.mpesa_service import initiate_stk_push, pending_stk_push, queue_stk_push, retry_queued_stk_pushes
 
 from services.email_service import send_payment_success_email
 from utils.pdf import generate_receipt_pdf
@@ -38,11 +39,27 @@ def pay():
     if not phone_number:
         return jsonify({"error": "Phone number is required"}), 400
         
+    # A push already waiting for M-Pesa will prompt the customer; don't send another
+    queued = pending_stk_push(order.id)
+    if queued:
+        return jsonify({
+            "message": "Your payment request is already queued and will be sent shortly.",
+            "queued_id": queued.id
+        }), 202
+    
     # Initiate STK Push
     response = initiate_stk_push(phone_number, int(order.price), order.id)
     
     print(f"STK Push Response in Route: {response}")
     
+    if response.get("unavailable"):
+        # M-Pesa is down or saturated: nothing was sent, so queue it instead of failing
+        queued = queue_stk_push(order, current_user_id, phone_number)
+        return jsonify({
+            "message": "M-Pesa is busy. Your payment request has been queued and will be sent shortly.",
+            "queued_id": queued.id
+        }), 202
+    
     if "error" in response:
         return jsonify({"error": response["error"]}), 500
         
@@ -69,6 +86,8 @@ def pay():
         transaction_id=checkout_request_id # Store CheckoutRequestID temporarily to match callback
     )
     db.session.add(payment)
+    db.session.flush()
+    order.apply_payment(payment)
     db.session.commit()
     
     return jsonify({
@@ -102,6 +121,8 @@ def callback():
             # Update Order
             order = ParcelOrder.query.get(payment.order_id)
             if order:
+                order.apply_payment(payment)
+                
                 # order.status = "assigned" # Or keep pending until courier accepts?
                 # Requirement: "money is sent... notification of payment successful"
                 # Let's keep status as pending but maybe add a paid flag? 
@@ -142,6 +163,7 @@ def callback():
             
             order = ParcelOrder.query.get(payment.order_id)
             if order:
+                 order.apply_payment(payment)
                  create_notification(
                     user_id=order.customer_id,
                     order_id=order.id,
@@ -157,3 +179,12 @@ def callback():
          traceback.print_exc()
          print(f"Error processing callback: {e}")
          return jsonify({"error": "Processing failed"}), 500
+
+
+@payments_bp.cli.command('retry-queued')
+@click.option('--limit', default=50, help='Maximum queued pushes to send in this run')
+@click.option('--max-attempts', default=5, help='Attempts before a queued push is failed')
+def retry_queued(limit, max_attempts):
+    """Send STK pushes queued while M-Pesa was unavailable (run from cron)"""
+    counts = retry_queued_stk_pushes(limit=limit, max_attempts=max_attempts)
+    click.echo(f"Sent: {counts['sent']}, retrying: {counts['retrying']}, failed: {counts['failed']}")
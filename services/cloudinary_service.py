@@ -1,23 +1,46 @@
-import cloudinary
-import cloudinary.uploader
+import hashlib
 import os
+import time
+from services.http_client import http_client
 
-def configure_cloudinary():
-    cloudinary.config(
-        cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME'),
-        api_key = os.environ.get('CLOUDINARY_API_KEY'),
-        api_secret = os.environ.get('CLOUDINARY_API_SECRET')
-    )
+def sign_params(params, api_secret):
+    """Cloudinary request signature: SHA-1 of the sorted params followed by the API secret"""
+    to_sign = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+    return hashlib.sha1(f"{to_sign}{api_secret}".encode()).hexdigest()
 
-def upload_image(file_path_or_buffer):
+def upload_image(file_path_or_buffer, filename=None):
     """
-    Uploads an image to Cloudinary.
+    Uploads an image to Cloudinary from a path, raw bytes or a file-like object.
     Returns the secure_url of the uploaded image or None if failed.
     """
-    configure_cloudinary()
+    cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME')
+    api_key = os.environ.get('CLOUDINARY_API_KEY')
+    api_secret = os.environ.get('CLOUDINARY_API_SECRET')
     try:
-        upload_result = cloudinary.uploader.upload(file_path_or_buffer)
-        return upload_result.get("secure_url")
+        params = {"timestamp": int(time.time())}
+        data = dict(params, api_key=api_key, signature=sign_params(params, api_secret))
+
+        if isinstance(file_path_or_buffer, str):
+            with open(file_path_or_buffer, "rb") as f:
+                files = {"file": (os.path.basename(file_path_or_buffer), f.read())}
+        elif isinstance(file_path_or_buffer, bytes):
+            files = {"file": (filename or "upload", file_path_or_buffer)}
+        else:
+            # Werkzeug FileStorage or any file-like object
+            stream = getattr(file_path_or_buffer, "stream", file_path_or_buffer)
+            filename = getattr(file_path_or_buffer, "filename", None) or "upload"
+            files = {"file": (filename, stream.read())}
+
+        response = http_client.post(
+            "cloudinary",
+            f"https://api.cloudinary.com/v1_1/{cloud_name}/image/upload",
+            data=data,
+            files=files,
+            # Uploads can be large; allow longer than the default read timeout
+            timeout=(http_client.connect_timeout, 60)
+        )
+        response.raise_for_status()
+        return response.json().get("secure_url")
     except Exception as e:
         print(f"Cloudinary upload error: {e}")
         return None
@@ -1,40 +1,262 @@
+import base64
+import hashlib
+import json
+import logging
 import os
-import resend
+import random
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from services.http_client import http_client
 from flask import current_app
 
+logger = logging.getLogger(__name__)
+
+RESEND_URL = "https://api.resend.com/emails"
+# Resend's batch endpoint takes up to 100 emails and no attachments
+RESEND_BATCH_SIZE = 100
+# A claim older than this belongs to a drain that died mid-send
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class DeliveryUnknown(Exception):
+    """Resend answered, but not in a way that says whether this email was sent"""
+
+
 def send_email(to_email, subject, html_content, attachments=None):
     """
-    Sends an email using Resend API.
+    Queues an email in the outbox on the current session.
+    It is committed with the caller's transaction and delivered by
+    `flask email drain`, so callers should queue before they commit.
     """
+    from extensions import db
+    from models import EmailOutbox
+
+    if attachments:
+        attachments = json.dumps([
+            {
+                "filename": attachment["filename"],
+                "content": attachment["content"] if isinstance(attachment["content"], str)
+                else base64.b64encode(bytes(attachment["content"])).decode()
+            }
+            for attachment in attachments
+        ])
+
+    db.session.add(EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        html=html_content,
+        attachments=attachments or None,
+        next_attempt_at=datetime.utcnow()
+    ))
+    return True
+
+
+def _resend_payload(entry):
+    payload = {
+        "from": os.environ.get("EMAIL_SENDER", "Deliveroo <onboarding@resend.dev>"),
+        "to": [entry.to_email],
+        "subject": entry.subject,
+        "html": entry.html,
+    }
+    if entry.attachments:
+        payload["attachments"] = json.loads(entry.attachments)
+    return payload
+
+
+def _post_to_resend(url, payload, idempotency_key):
+    api_key = os.environ.get("RESEND_API_KEY")
+    if not api_key:
+        raise RuntimeError("RESEND_API_KEY not found in environment variables.")
+
+    return http_client.post(
+        "resend",
+        url,
+        json=payload,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            # Same key for every attempt at the same outbox rows, so a retry
+            # after a lost response doesn't send the email twice
+            "Idempotency-Key": idempotency_key
+        },
+        idempotent=True
+    )
+
+
+def _deliver_one(entry):
+    """Send one outbox email; returns the Resend id or raises"""
+    response = _post_to_resend(RESEND_URL, _resend_payload(entry), f"email-outbox-{entry.id}")
+    response.raise_for_status()
+    return response.json().get("id")
+
+
+def _deliver_batch(entries):
+    """
+    Send outbox emails without attachments through the batch endpoint.
+    Returns {entry.id: resend id or exception}.
+    """
+    ids = ",".join(str(entry.id) for entry in entries)
+    key = "email-outbox-batch-" + hashlib.sha1(ids.encode()).hexdigest()
     try:
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        api_key = os.environ.get("RESEND_API_KEY")
-        if not api_key:
-            logger.error("RESEND_API_KEY not found in environment variables.")
-            return False
-            
-        resend.api_key = api_key
-
-        sender = os.environ.get("EMAIL_SENDER", "Deliveroo <onboarding@resend.dev>")
-
-        params = {
-            "from": sender, 
-            "to": [to_email],
-            "subject": subject,
-            "html": html_content,
-        }
-        
-        if attachments:
-            params["attachments"] = attachments
+        response = _post_to_resend(f"{RESEND_URL}/batch", [_resend_payload(entry) for entry in entries], key)
+    except Exception as e:
+        return {entry.id: e for entry in entries}
 
-        email = resend.Emails.send(params)
-        logger.info(f"Email sent successfully to {to_email}: {email}")
-        return True
+    if response.status_code in (400, 422):
+        # One bad address rejects the whole batch; send individually so it doesn't hold up the rest
+        results = {}
+        for entry in entries:
+            try:
+                results[entry.id] = _deliver_one(entry)
+            except Exception as e:
+                results[entry.id] = e
+        return results
+
+    try:
+        response.raise_for_status()
+        sent = response.json().get("data", [])
     except Exception as e:
-        logger.error(f"Failed to send email: {e}")
-        return False
+        return {entry.id: e for entry in entries}
+    # Results come back in request order; any other shape can't be matched to entries
+    if not isinstance(sent, list) or len(sent) != len(entries):
+        error = DeliveryUnknown(f"Batch response had {len(sent) if isinstance(sent, list) else 'no'} results for {len(entries)} emails")
+        return {entry.id: error for entry in entries}
+    results = {}
+    for entry, item in zip(entries, sent):
+        provider_id = item.get("id") if isinstance(item, dict) else None
+        results[entry.id] = provider_id or DeliveryUnknown("Batch response had no id for this email")
+    return results
+
+
+def drain_outbox(batch_size=RESEND_BATCH_SIZE, max_attempts=8, base_delay=30, max_delay=3600):
+    """
+    Deliver due outbox emails. Failures are retried with jittered exponential
+    backoff; after `max_attempts` they are marked "dead" for inspection.
+    Emails Resend may or may not have sent are marked "unknown" rather than
+    sent again.
+    Rows are claimed (pending -> sending) and committed first, so no lock or
+    transaction is held while Resend is called.
+    Returns counts of {"sent", "retrying", "dead", "unknown"}.
+    """
+    from sqlalchemy import update
+    from extensions import db
+    from models import EmailOutbox
+
+    counts = {"sent": 0, "retrying": 0, "dead": 0, "unknown": 0}
+    now = datetime.utcnow()
+
+    # The drain that claimed these died; whether they went out is unknown
+    counts["unknown"] += EmailOutbox.query.filter(
+        EmailOutbox.status == "sending",
+        EmailOutbox.next_attempt_at <= now
+    ).update({"status": "unknown", "last_error": "Interrupted while sending"}, synchronize_session=False)
+
+    # SKIP LOCKED lets several workers claim at once on PostgreSQL; other databases ignore it
+    due_ids = db.session.execute(
+        db.select(EmailOutbox.id).filter(
+            EmailOutbox.status == "pending",
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(batch_size).with_for_update(skip_locked=True)
+    ).scalars().all()
+    # Only rows still pending are ours; RETURNING says which those are
+    claimed = db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(due_ids), EmailOutbox.status == "pending")
+        .values(status="sending", next_attempt_at=now + CLAIM_TIMEOUT)
+        .returning(EmailOutbox.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all() if due_ids else []
+    db.session.commit()
+    if not claimed:
+        return counts
+
+    due = EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all()
+    # Send from detached copies, outside any transaction
+    for entry in due:
+        db.session.expunge(entry)
+    db.session.commit()
+
+    results = {}
+    plain = [entry for entry in due if not entry.attachments]
+    for start in range(0, len(plain), RESEND_BATCH_SIZE):
+        results.update(_deliver_batch(plain[start:start + RESEND_BATCH_SIZE]))
+    for entry in due:
+        if entry.attachments:
+            try:
+                results[entry.id] = _deliver_one(entry)
+            except Exception as e:
+                results[entry.id] = e
+
+    now = datetime.utcnow()
+    for entry in EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).all():
+        result = results.get(entry.id, DeliveryUnknown("No response for this email"))
+        entry.attempts += 1
+        if isinstance(result, DeliveryUnknown):
+            entry.status = "unknown"
+            entry.last_error = str(result)[:500]
+            counts["unknown"] += 1
+            logger.error(f"Email {entry.id} to {entry.to_email} may not have been sent: {result}")
+            continue
+        if not isinstance(result, Exception):
+            entry.status = "sent"
+            entry.provider_id = result
+            entry.sent_at = now
+            entry.last_error = None
+            counts["sent"] += 1
+            continue
+
+        entry.last_error = str(result)[:500]
+        entry.status = "pending"
+        if entry.attempts >= max_attempts:
+            entry.status = "dead"
+            counts["dead"] += 1
+            logger.error(f"Email {entry.id} to {entry.to_email} moved to dead letter: {result}")
+        else:
+            delay = min(max_delay, base_delay * 2 ** (entry.attempts - 1))
+            entry.next_attempt_at = now + timedelta(seconds=random.uniform(delay / 2, delay))
+            counts["retrying"] += 1
+
+    db.session.commit()
+    return counts
+
+
+email_cli = AppGroup("email", help="Email outbox commands.")
+
+
+@email_cli.command("drain")
+@click.option("--batch-size", default=RESEND_BATCH_SIZE, help="Emails to claim per round")
+@click.option("--max-attempts", default=8, help="Attempts before an email is dead-lettered")
+@click.option("--loop", is_flag=True, help="Keep draining, sleeping --interval seconds when idle")
+@click.option("--interval", default=5.0, help="Idle sleep between rounds with --loop")
+def drain_command(batch_size, max_attempts, loop, interval):
+    """Send pending emails from the outbox"""
+    import time
+
+    while True:
+        counts = drain_outbox(batch_size=batch_size, max_attempts=max_attempts)
+        if any(counts.values()):
+            click.echo(
+                f"Sent: {counts['sent']}, retrying: {counts['retrying']}, dead: {counts['dead']}, unknown: {counts['unknown']}"
+            )
+        if not loop:
+            break
+        if counts["sent"] + counts["retrying"] + counts["dead"] + counts["unknown"] < batch_size:
+            time.sleep(interval)
+
+
+@email_cli.command("requeue-dead")
+def requeue_dead_command():
+    """Give dead-lettered emails another round of attempts"""
+    from extensions import db
+    from models import EmailOutbox
+
+    count = EmailOutbox.query.filter_by(status="dead").update(
+        {"status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    click.echo(f"Requeued {count} emails")
 
 def send_magic_link(user_email, magic_link_url):
     subject = "Welcome to Deliveroo - Confirm your email"
@@ -67,7 +289,7 @@ def send_payment_success_email(user_email, order_id, amount, pdf_buffer):
         
     attachments = [{
         "filename": f"receipt_order_{order_id}.pdf",
-        "content": list(content)
+        "content": base64.b64encode(content).decode()
     }]
     
     return send_email(user_email, subject, html_content, attachments)
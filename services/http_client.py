@@ -0,0 +1,303 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt: throttling and gateway/upstream hiccups
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without sending anything when an upstream is known to be down or saturated"""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class BulkheadFullError(UpstreamUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed: requests flow, consecutive failures are counted.
+    Open: after `failure_threshold` failures, requests fail fast for `reset_timeout` seconds.
+    Half-open: one probe request is let through; success closes the circuit, failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened
+        }
+
+
+class Bulkhead:
+    """Caps concurrent requests to one upstream so a slow one can't take every worker thread"""
+
+    def __init__(self, max_concurrent=8, max_wait=0.5):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.rejected = 0
+        self._in_flight = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._semaphore.acquire(timeout=self.max_wait):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+    def to_dict(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected
+        }
+
+
+class UpstreamStats:
+    """Request counts and recent latencies for one upstream"""
+
+    def __init__(self, window=500):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses = {}
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, status=None, error=False):
+        with self._lock:
+            self.requests += 1
+            self.latencies.append(elapsed)
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            if error:
+                self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def to_dict(self):
+        with self._lock:
+            requests, errors, retries = self.requests, self.errors, self.retries
+            latencies = sorted(self.latencies)
+            statuses = dict(self.statuses)
+
+        def percentile(pct):
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(pct / 100.0 * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 1)
+
+        return {
+            "requests": requests,
+            "errors": errors,
+            "retries": retries,
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "max_ms": round(latencies[-1] * 1000, 1) if latencies else None
+        }
+
+
+class HttpClient:
+    """
+    Outbound HTTP shared by all integrations.
+    Each upstream (mapbox, mpesa, resend, cloudinary) gets its own Session, so
+    connections are kept alive per host, plus default timeouts, bounded retries
+    with jittered backoff and latency/error stats.
+    Only idempotent requests are retried unless the caller says otherwise.
+    Each upstream also has a circuit breaker and a bulkhead; when either
+    refuses a request, UpstreamUnavailable is raised so callers can take
+    their fallback path straight away.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, max_retries=2,
+                 backoff=0.25, max_backoff=4.0, pool_size=10,
+                 failure_threshold=5, reset_timeout=30.0, max_concurrent=8, bulkhead_wait=0.5):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_concurrent = max_concurrent
+        self.bulkhead_wait = bulkhead_wait
+        self._sessions = {}
+        self._stats = {}
+        self._breakers = {}
+        self._bulkheads = {}
+        self._lock = threading.Lock()
+
+    def session(self, upstream):
+        session = self._sessions.get(upstream)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(upstream)
+                if session is None:
+                    session = requests.Session()
+                    # Retries are handled here, not by urllib3, so they show up in the stats
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._stats[upstream] = UpstreamStats()
+                    self._breakers[upstream] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                    # HTTP_MAX_CONCURRENCY_<UPSTREAM> overrides the shared limit
+                    max_concurrent = int(os.environ.get(
+                        f"HTTP_MAX_CONCURRENCY_{upstream.upper()}", self.max_concurrent
+                    ))
+                    self._bulkheads[upstream] = Bulkhead(max_concurrent, self.bulkhead_wait)
+                    # Published last so other threads never see a half-registered upstream
+                    self._sessions[upstream] = session
+        return session
+
+    def request(self, upstream, method, url, timeout=None, retries=None, idempotent=None, **kwargs):
+        """
+        Send a request through `upstream`'s pool and return the Response.
+        Raises the last requests exception when every attempt failed to connect
+        or timed out; retryable statuses are returned as-is after the last try.
+        Raises UpstreamUnavailable when the circuit is open or the bulkhead is full.
+        """
+        method = method.upper()
+        session = self.session(upstream)
+        stats = self._stats[upstream]
+        breaker = self._breakers[upstream]
+        bulkhead = self._bulkheads[upstream]
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = 1 + ((self.max_retries if retries is None else retries) if idempotent else 0)
+
+        for attempt in range(attempts):
+            if attempt:
+                stats.record_retry()
+                # Full jitter keeps workers from retrying in lockstep
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+            # Bulkhead first: a half-open probe granted by the breaker must be sent,
+            # or the breaker waits on it forever
+            if not bulkhead.acquire():
+                raise BulkheadFullError(f"{upstream} has {bulkhead.max_concurrent} requests in flight")
+            if not breaker.allow():
+                bulkhead.release()
+                raise CircuitOpenError(f"{upstream} circuit is open")
+
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                stats.record(time.perf_counter() - started, error=True)
+                breaker.record_failure()
+                logger.warning(f"{upstream} {method} failed (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 == attempts:
+                    raise
+                continue
+            except Exception:
+                # Don't leave a half-open probe hanging on an unexpected error
+                breaker.record_failure()
+                raise
+            finally:
+                bulkhead.release()
+
+            failed = response.status_code >= 500 or response.status_code in RETRY_STATUSES
+            stats.record(time.perf_counter() - started, status=response.status_code, error=failed)
+            if failed:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if response.status_code not in RETRY_STATUSES or attempt + 1 == attempts:
+                return response
+            logger.warning(f"{upstream} {method} returned {response.status_code} (attempt {attempt + 1}/{attempts})")
+
+    def get(self, upstream, url, **kwargs):
+        return self.request(upstream, "GET", url, **kwargs)
+
+    def post(self, upstream, url, **kwargs):
+        return self.request(upstream, "POST", url, **kwargs)
+
+    def stats(self):
+        return {
+            upstream: dict(
+                self._stats[upstream].to_dict(),
+                circuit=self._breakers[upstream].to_dict(),
+                bulkhead=self._bulkheads[upstream].to_dict()
+            )
+            for upstream in sorted(self._sessions)
+        }
+
+
+http_client = HttpClient(
+    connect_timeout=float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05)),
+    read_timeout=float(os.environ.get("HTTP_READ_TIMEOUT", 10)),
+    max_retries=int(os.environ.get("HTTP_MAX_RETRIES", 2)),
+    failure_threshold=int(os.environ.get("HTTP_CIRCUIT_FAILURES", 5)),
+    reset_timeout=float(os.environ.get("HTTP_CIRCUIT_RESET", 30)),
+    max_concurrent=int(os.environ.get("HTTP_MAX_CONCURRENCY", 8))
+)
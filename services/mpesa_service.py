@@ -1,7 +1,14 @@
 import os
 import base64
+import random
 import requests
-from datetime import datetime
+from services.http_client import http_client, UpstreamUnavailable
+from datetime import datetime, timedelta
+
+# Raised before the request reached Safaricom, so it is safe to send again later
+UNAVAILABLE_ERRORS = (UpstreamUnavailable, requests.ConnectionError)
+# A push claimed for longer than this belongs to a run that died mid-send
+SENDING_TIMEOUT = timedelta(minutes=10)
 
 def generate_mpesa_access_token():
     consumer_key = os.environ.get("MPESA_CONSUMER_KEY")
@@ -13,15 +20,26 @@ def generate_mpesa_access_token():
         encoded_credentials = base64.b64encode(credentials.encode()).decode()
         headers = {"Authorization": f"Basic {encoded_credentials}"}
         
-        response = requests.get(api_url, headers=headers)
+        response = http_client.get("mpesa", api_url, headers=headers)
         response.raise_for_status()
         return response.json()['access_token']
+    except (UpstreamUnavailable, requests.ConnectionError, requests.Timeout):
+        raise
     except Exception as e:
         print(f"Error generating access token: {e}")
         return None
 
 def initiate_stk_push(phone_number, amount, order_id):
-    access_token = generate_mpesa_access_token()
+    """
+    Send an STK push. Returns the M-Pesa response, or {"error": ...}; the error
+    also carries "unavailable": True when M-Pesa couldn't be reached and
+    nothing was sent, so the push can be queued and retried.
+    """
+    try:
+        access_token = generate_mpesa_access_token()
+    except (UpstreamUnavailable, requests.ConnectionError, requests.Timeout) as e:
+        print(f"M-Pesa unavailable: {e}")
+        return {"error": "M-Pesa is temporarily unavailable", "unavailable": True}
     if not access_token:
         return {"error": "Failed to generate access token"}
 
@@ -74,12 +92,16 @@ def initiate_stk_push(phone_number, amount, order_id):
     print(f"Payload: {payload}")
     
     try:
-        response = requests.post(process_request_url, json=payload, headers=headers)
+        # Not retried: a repeated STK push would prompt the customer twice
+        response = http_client.post("mpesa", process_request_url, json=payload, headers=headers)
         print(f"M-Pesa STK Push Response Status: {response.status_code}")
         print(f"M-Pesa STK Push Response Body: {response.text}")
         
         response.raise_for_status()
         return response.json()
+    except UNAVAILABLE_ERRORS as e:
+        print(f"M-Pesa unavailable: {e}")
+        return {"error": "M-Pesa is temporarily unavailable", "unavailable": True}
     except Exception as e:
         print(f"Error initiating STK push: {e}")
         # Return the response text if available to help debug 400 errors
@@ -89,3 +111,147 @@ def initiate_stk_push(phone_number, amount, order_id):
              except:
                  pass
         return {"error": str(e)}
+
+
+def pending_stk_push(order_id):
+    """The order's queued or in-flight push, if any"""
+    from models import QueuedStkPush
+
+    return QueuedStkPush.query.filter(
+        QueuedStkPush.order_id == order_id,
+        QueuedStkPush.status.in_(("queued", "sending"))
+    ).first()
+
+
+def queue_stk_push(order, user_id, phone_number):
+    """
+    Hold an STK push for `retry_queued_stk_pushes` while M-Pesa is unavailable.
+    An order has at most one waiting push; asking again returns that one.
+    """
+    from sqlalchemy.exc import IntegrityError
+    from extensions import db
+    from models import QueuedStkPush
+
+    entry = pending_stk_push(order.id)
+    if entry:
+        return entry
+
+    entry = QueuedStkPush(
+        order_id=order.id,
+        user_id=user_id,
+        phone_number=phone_number,
+        amount=order.price,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request queued one first
+        db.session.rollback()
+        return pending_stk_push(order.id)
+    return entry
+
+
+def retry_queued_stk_pushes(limit=50, max_attempts=5, base_delay=30):
+    """
+    Send queued STK pushes that are due. Still-unavailable pushes are retried
+    with exponential backoff; after `max_attempts` the push fails and the
+    customer is told to pay again.
+    Each push is claimed (queued -> sending) and committed before M-Pesa is
+    called, so overlapping runs never send the same one twice.
+    Returns counts of {"sent", "retrying", "failed"}.
+    """
+    from extensions import db
+    from models import QueuedStkPush, ParcelOrder, Payment
+    from utils import create_notification
+
+    counts = {"sent": 0, "retrying": 0, "failed": 0}
+
+    # Whether M-Pesa got a push whose run died is unknown, so it isn't sent again
+    stale = QueuedStkPush.query.filter(
+        QueuedStkPush.status == "sending",
+        QueuedStkPush.updated_at <= datetime.utcnow() - SENDING_TIMEOUT
+    ).all()
+    for entry in stale:
+        entry.status = "failed"
+        entry.last_error = "Interrupted while sending"
+        create_notification(
+            user_id=entry.user_id,
+            order_id=entry.order_id,
+            message=f"We couldn't confirm your M-Pesa payment request for Order #{entry.order_id}. If no prompt arrived, please try paying again.",
+            type_="payment_failed"
+        )
+        counts["failed"] += 1
+    db.session.commit()
+
+    due_ids = db.session.execute(
+        db.select(QueuedStkPush.id).filter(
+            QueuedStkPush.status == "queued",
+            QueuedStkPush.next_attempt_at <= datetime.utcnow()
+        ).order_by(QueuedStkPush.next_attempt_at).limit(limit)
+    ).scalars().all()
+
+    for entry_id in due_ids:
+        claimed = QueuedStkPush.query.filter_by(id=entry_id, status="queued").update(
+            {"status": "sending", "attempts": QueuedStkPush.attempts + 1},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if not claimed:
+            # Another run got to it first
+            continue
+
+        entry = db.session.get(QueuedStkPush, entry_id)
+        order = db.session.get(ParcelOrder, entry.order_id)
+        if order.payment_status == "completed":
+            entry.status = "failed"
+            entry.last_error = "Order already paid"
+            counts["failed"] += 1
+            db.session.commit()
+            continue
+
+        response = initiate_stk_push(entry.phone_number, int(entry.amount), entry.order_id)
+
+        if response.get("unavailable") and entry.attempts < max_attempts:
+            delay = base_delay * 2 ** (entry.attempts - 1)
+            entry.status = "queued"
+            entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=random.uniform(delay / 2, delay))
+            entry.last_error = response["error"]
+            counts["retrying"] += 1
+        elif response.get("ResponseCode") == "0" and response.get("CheckoutRequestID"):
+            entry.status = "sent"
+            entry.checkout_request_id = response["CheckoutRequestID"]
+            payment = Payment(
+                order_id=entry.order_id,
+                amount=entry.amount,
+                payment_method="mpesa",
+                status="pending",
+                transaction_id=response["CheckoutRequestID"]
+            )
+            db.session.add(payment)
+            db.session.flush()
+            order.apply_payment(payment)
+            create_notification(
+                user_id=entry.user_id,
+                order_id=entry.order_id,
+                message=f"Check your phone to complete the payment of KES {entry.amount} for Order #{entry.order_id}.",
+                type_="payment_requested"
+            )
+            counts["sent"] += 1
+        else:
+            entry.status = "failed"
+            entry.last_error = str(
+                response.get("error") or response.get("errorMessage") or response.get("CustomerMessage") or "STK Push failed"
+            )[:255]
+            create_notification(
+                user_id=entry.user_id,
+                order_id=entry.order_id,
+                message=f"We couldn't request your M-Pesa payment for Order #{entry.order_id}. Please try paying again.",
+                type_="payment_failed"
+            )
+            counts["failed"] += 1
+
+        db.session.commit()
+
+    return counts
@@ -3,6 +3,7 @@ import os
 from app import create_app
 from extensions import db, bcrypt
 from models import User, ParcelOrder
+from utils.location_store import location_store
 
 os.environ['TESTING'] = 'True'
 
@@ -21,6 +22,7 @@ def app():
         db.create_all()
         yield app
         db.drop_all()
+    location_store.backend.clear()
 
 
 @pytest.fixture
@@ -33,6 +35,8 @@ def runner(app):
     return app.test_cli_runner()
 
 
+# Login rejects unverified accounts, so the users behind the *_auth_headers
+# fixtures are created verified
 @pytest.fixture
 def test_customer(app):
     with app.app_context():
@@ -40,7 +44,8 @@ def test_customer(app):
             full_name="Test Customer",
             email="customer@test.com",
             phone="+254700000001",
-            role="customer"
+            role="customer",
+            is_verified=True
         )
         user.set_password("password123")
         db.session.add(user)
@@ -58,7 +63,8 @@ def test_courier(app):
             phone="+254700000002",
             role="courier",
             vehicle_type="Motorcycle",
-            plate_number="ABC123DE"
+            plate_number="ABC123DE",
+            is_verified=True
         )
         user.set_password("password123")
         db.session.add(user)
@@ -74,7 +80,8 @@ def test_admin(app):
             full_name="Test Admin",
             email="admin@test.com",
             phone="+254700000003",
-            role="admin"
+            role="admin",
+            is_verified=True
         )
         user.set_password("password123")
         db.session.add(user)
@@ -83,6 +90,29 @@ def test_admin(app):
         return user_id
 
 
+@pytest.fixture
+def make_order(app):
+    """Factory for committed orders; keyword fields override the defaults"""
+    def make(customer_id, status='pending', price=50.0, courier_id=None, **fields):
+        values = dict(
+            customer_id=customer_id,
+            courier_id=courier_id,
+            parcel_name='Test Package',
+            weight=1.0,
+            weight_category='small',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            price=price,
+            status=status
+        )
+        values.update(fields)
+        order = ParcelOrder(**values)
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return make
+
+
 @pytest.fixture
 def auth_headers(client, test_customer):
     response = client.post('/api/login', json={
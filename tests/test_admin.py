@@ -152,3 +152,207 @@ class TestAdmin:
         data = response.get_json()
         assert 'couriers' in data
         assert len(data['couriers']) >= 1
+
+
+class TestCourierSuggestions:
+    def test_nearest_first_with_load(self, client, app, test_admin, test_customer, test_courier, admin_auth_headers, courier_auth_headers):
+        far = User(
+            full_name="Far Courier",
+            email="far@test.com",
+            phone="+254700000009",
+            role="courier",
+            vehicle_type="Car",
+            plate_number="KDA123X",
+            is_verified=True
+        )
+        far.set_password("password123")
+        db.session.add(far)
+        order = ParcelOrder(
+            customer_id=test_customer,
+            parcel_name='Test Package',
+            weight=1.0,
+            weight_category='small',
+            pickup_address='Kenyatta Avenue',
+            pickup_lat=-1.2864,
+            pickup_lng=36.8172,
+            destination_address='Westlands',
+            price=50.0,
+            status='pending'
+        )
+        db.session.add(order)
+        db.session.commit()
+        
+        from datetime import datetime
+        from utils.location_store import location_store
+        location_store.update_courier(far.id, -1.3500, 36.9000, datetime.utcnow())
+        client.patch('/api/courier/location', json={'lat': -1.2870, 'lng': 36.8180}, headers=courier_auth_headers)
+        
+        response = client.get(f'/api/admin/orders/{order.id}/courier-suggestions', headers=admin_auth_headers)
+        
+        assert response.status_code == 200
+        suggestions = response.get_json()['suggestions']
+        assert [s['id'] for s in suggestions] == [test_courier, far.id]
+        assert suggestions[0]['distance_km'] < 1
+        assert suggestions[0]['active_orders'] == 0
+
+    def test_skips_inactive_and_stale(self, client, app, test_admin, test_customer, test_courier, admin_auth_headers):
+        from datetime import datetime, timedelta
+        from utils.location_store import location_store
+        courier = db.session.get(User, test_courier)
+        courier.is_active = False
+        order = ParcelOrder(
+            customer_id=test_customer,
+            parcel_name='Test Package',
+            weight=1.0,
+            weight_category='small',
+            pickup_address='Kenyatta Avenue',
+            pickup_lat=-1.2864,
+            pickup_lng=36.8172,
+            destination_address='Westlands',
+            price=50.0
+        )
+        db.session.add(order)
+        db.session.commit()
+        location_store.update_courier(test_courier, -1.2870, 36.8180, datetime.utcnow())
+        location_store.update_courier(test_admin, -1.2870, 36.8180, datetime.utcnow() - timedelta(hours=1))
+        
+        response = client.get(f'/api/admin/orders/{order.id}/courier-suggestions', headers=admin_auth_headers)
+        
+        assert response.get_json()['suggestions'] == []
+
+    def test_admin_only(self, client, test_customer, auth_headers):
+        response = client.get('/api/admin/orders/1/courier-suggestions', headers=auth_headers)
+        
+        assert response.status_code == 403
+
+
+class TestCourierListing:
+    @pytest.fixture
+    def fleet(self, app, test_customer):
+        from datetime import datetime
+        couriers = []
+        for i, (vehicle, active, delivered) in enumerate([('Car', True, 3), ('Motorcycle', True, 1), ('Car', False, 0)]):
+            courier = User(
+                full_name=f"Courier {i}",
+                email=f"courier{i}@test.com",
+                phone=f"+25470000002{i}",
+                role="courier",
+                vehicle_type=vehicle,
+                plate_number=f"KDA12{i}X",
+                is_active=active,
+                is_verified=True
+            )
+            courier.set_password("password123")
+            db.session.add(courier)
+            db.session.flush()
+            statuses = ['delivered'] * delivered + ['in_transit', 'cancelled']
+            for j, status in enumerate(statuses):
+                db.session.add(ParcelOrder(
+                    customer_id=test_customer,
+                    courier_id=courier.id,
+                    parcel_name='Test Package',
+                    weight=1.0,
+                    weight_category='small',
+                    pickup_address='123 Main St',
+                    destination_address='456 Oak Ave',
+                    price=100.0 + j,
+                    status=status,
+                    delivered_at=datetime(2026, 3, 1 + j) if status == 'delivered' else None
+                ))
+            couriers.append(courier.id)
+        db.session.commit()
+        return couriers
+
+    def test_aggregates_and_sort(self, client, test_admin, admin_auth_headers, fleet):
+        response = client.get('/api/admin/couriers?sort=earnings', headers=admin_auth_headers)
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['total'] == 3
+        assert [c['id'] for c in data['couriers']] == fleet
+        busiest = data['couriers'][0]
+        assert busiest['total_deliveries'] == 3
+        assert busiest['active_orders'] == 1
+        assert busiest['earnings'] == 303.0
+        assert busiest['last_delivery_at'].startswith('2026-03-03')
+        assert data['couriers'][2]['last_delivery_at'] is None
+        
+        response = client.get('/api/admin/couriers?sort=last_delivery_at&order=asc', headers=admin_auth_headers)
+        assert [c['id'] for c in response.get_json()['couriers']] == [fleet[1], fleet[0], fleet[2]]
+
+    def test_filter_and_paginate(self, client, test_admin, admin_auth_headers, fleet):
+        response = client.get('/api/admin/couriers?vehicle_type=car&is_active=true', headers=admin_auth_headers)
+        assert [c['id'] for c in response.get_json()['couriers']] == [fleet[0]]
+        
+        response = client.get('/api/admin/couriers?sort=total_deliveries&per_page=2&page=2', headers=admin_auth_headers)
+        data = response.get_json()
+        assert [c['id'] for c in data['couriers']] == [fleet[2]]
+        assert data['pages'] == 2
+
+    def test_bad_sort(self, client, test_admin, admin_auth_headers):
+        response = client.get('/api/admin/couriers?sort=password_hash', headers=admin_auth_headers)
+        
+        assert response.status_code == 400
+
+    def test_constant_query_count(self, client, app, test_admin, admin_auth_headers, fleet):
+        from sqlalchemy import event
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        def count_queries():
+            statements.clear()
+            event.listen(db.engine, 'before_cursor_execute', record)
+            response = client.get('/api/admin/couriers', headers=admin_auth_headers)
+            event.remove(db.engine, 'before_cursor_execute', record)
+            assert response.status_code == 200
+            return len(statements)
+        
+        few = count_queries()
+        for i in range(10):
+            courier = User(
+                full_name=f"Extra {i}",
+                email=f"extra{i}@test.com",
+                role="courier",
+                vehicle_type="Bicycle",
+                plate_number=f"KDB10{i}X"
+            )
+            courier.set_password("password123")
+            db.session.add(courier)
+        db.session.commit()
+        
+        assert count_queries() == few
+
+
+class TestAdminCursorPagination:
+    def test_users_by_cursor(self, client, test_admin, test_customer, test_courier, admin_auth_headers):
+        first = client.get('/api/admin/users?cursor=&per_page=2&total=exact', headers=admin_auth_headers).get_json()
+        rest = client.get(f"/api/admin/users?cursor={first['next_cursor']}&per_page=2", headers=admin_auth_headers).get_json()
+        
+        assert first['total'] == 3
+        assert len(first['users']) == 2
+        assert len(rest['users']) == 1
+        assert rest['next_cursor'] is None
+        ids = [u['id'] for u in first['users'] + rest['users']]
+        assert sorted(ids) == sorted([test_admin, test_customer, test_courier])
+
+    def test_orders_by_cursor_with_filter(self, client, test_admin, test_customer, admin_auth_headers):
+        for status in ['pending', 'delivered', 'pending']:
+            db.session.add(ParcelOrder(
+                customer_id=test_customer,
+                parcel_name='Test Package',
+                weight=1.0,
+                weight_category='small',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                price=50.0,
+                status=status
+            ))
+        db.session.commit()
+        
+        response = client.get('/api/admin/orders?cursor=&status=pending', headers=admin_auth_headers)
+        
+        data = response.get_json()
+        assert [order['status'] for order in data['orders']] == ['pending', 'pending']
+        assert data['next_cursor'] is None
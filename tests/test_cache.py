@@ -0,0 +1,138 @@
+import pytest
+from utils.cache import LRUCache, GeocodeCache, DistanceCache, normalize_address
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+    def test_expired_entries_are_misses(self):
+        cache = LRUCache()
+        cache.set('a', 1, ttl=-1)
+        
+        assert cache.get('a') is None
+        assert cache.misses == 1
+
+
+class TestGeocodeCache:
+    def test_normalize_address(self):
+        assert normalize_address('  123 Main St.,Nairobi ') == normalize_address('123 main st , NAIROBI')
+
+    def test_memory_and_db_hits(self, app):
+        calls = []
+        
+        def fetch(address):
+            calls.append(address)
+            return -1.28, 36.82
+        
+        cache = GeocodeCache()
+        assert cache.get_or_fetch('123 Main St, Nairobi', fetch) == (-1.28, 36.82)
+        assert cache.get_or_fetch('123 main st nairobi', fetch) == (-1.28, 36.82)
+        
+        # A fresh process only has the table to go on
+        cache.memory.clear()
+        assert cache.get_or_fetch('123 Main St, Nairobi', fetch) == (-1.28, 36.82)
+        
+        assert len(calls) == 1
+        assert cache.stats()['db_hits'] == 1
+
+    def test_negative_results_are_cached(self, app):
+        calls = []
+        
+        def fetch(address):
+            calls.append(address)
+            return None, None
+        
+        cache = GeocodeCache()
+        assert cache.get_or_fetch('nowhere', fetch) == (None, None)
+        assert cache.get_or_fetch('nowhere', fetch) == (None, None)
+        assert len(calls) == 1
+
+    def test_unavailable_provider_is_not_cached(self, app):
+        calls = []
+        
+        def fetch(address):
+            calls.append(address)
+            return None
+        
+        cache = GeocodeCache()
+        cache.get_or_fetch('somewhere', fetch)
+        cache.get_or_fetch('somewhere', fetch)
+        assert len(calls) == 2
+
+
+
+class TestDistanceCache:
+    def test_nearby_points_share_an_entry(self, app):
+        calls = []
+        
+        def fetch(origin, destination):
+            calls.append((origin, destination))
+            return 4200.0, 600.0
+        
+        cache = DistanceCache()
+        assert cache.get_or_fetch((-1.28640, 36.81720), (-1.30000, 36.80000), fetch) == (4200.0, 600.0)
+        # ~10 m away at both ends
+        assert cache.get_or_fetch((-1.28645, 36.81725), (-1.30005, 36.79995), fetch) == (4200.0, 600.0)
+        
+        cache.memory.clear()
+        assert cache.get_or_fetch((-1.28640, 36.81720), (-1.30000, 36.80000), fetch) == (4200.0, 600.0)
+        assert len(calls) == 1
+
+    def test_direction_matters(self, app):
+        cache = DistanceCache()
+        assert cache.key_for((-1.28, 36.81), (-1.30, 36.80)) != cache.key_for((-1.30, 36.80), (-1.28, 36.81))
+
+    def test_purge(self, app):
+        cache = DistanceCache()
+        cache.get_or_fetch((-1.28, 36.81), (-1.30, 36.80), lambda o, d: (4200.0, 600.0))
+        
+        assert cache.purge() == 1
+        assert len(cache.memory) == 0
+
+    def test_lookup_and_store_many(self, app):
+        cache = DistanceCache()
+        cache.store_many({'a': (1000.0, 60.0), 'b': (2000.0, 120.0)})
+        cache.memory.clear()
+        
+        assert cache.lookup_many(['a', 'b', 'c']) == {'a': (1000.0, 60.0), 'b': (2000.0, 120.0)}
+        assert cache.stats()['db_hits'] == 2
+        
+        # Overwrites replace the stored rows
+        cache.store_many({'a': (1500.0, 90.0)})
+        cache.memory.clear()
+        assert cache.lookup_many(['a']) == {'a': (1500.0, 90.0)}
+
+
+class TestCacheEndpoints:
+    def test_cache_stats(self, client, test_admin, admin_auth_headers):
+        response = client.get('/api/admin/cache', headers=admin_auth_headers)
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert 'hit_ratio' in data['geocode']
+        assert 'hit_ratio' in data['distance']
+
+    def test_purge_cache(self, client, test_admin, admin_auth_headers):
+        response = client.delete('/api/admin/cache?cache=distance', headers=admin_auth_headers)
+        
+        assert response.status_code == 200
+        assert list(response.get_json()['purged']) == ['distance']
+
+    def test_purge_unknown_cache(self, client, test_admin, admin_auth_headers):
+        response = client.delete('/api/admin/cache?cache=routes', headers=admin_auth_headers)
+        
+        assert response.status_code == 400
+
+    def test_purge_forbidden_for_customer(self, client, test_customer, auth_headers):
+        response = client.delete('/api/admin/cache', headers=auth_headers)
+        
+        assert response.status_code == 403
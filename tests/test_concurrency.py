@@ -0,0 +1,26 @@
+import threading
+import time
+from utils.concurrency import Deadline, submit, wait_for
+
+
+class TestConcurrency:
+    def test_tasks_run_in_parallel(self, app):
+        # Every task waits for the others, so none finishes unless all run at once
+        all_running = threading.Barrier(3, timeout=5)
+        with app.app_context():
+            futures = [submit(all_running.wait) for _ in range(3)]
+            deadline = Deadline(10)
+            
+            assert sorted(wait_for(future, deadline, default=-1) for future in futures) == [0, 1, 2]
+
+    def test_late_task_gives_default(self, app):
+        with app.app_context():
+            future = submit(time.sleep, 0.5)
+            
+            assert wait_for(future, Deadline(0.05), default='late') == 'late'
+
+    def test_failed_task_gives_default(self, app):
+        with app.app_context():
+            future = submit(int, 'not a number')
+            
+            assert wait_for(future, Deadline(1), default=0) == 0
@@ -1,6 +1,8 @@
 import pytest
-from models import ParcelOrder, User
+from sqlalchemy import event
+from models import ParcelOrder, User, LocationPing
 from extensions import db
+from utils.location_store import location_store
 
 
 class TestCourier:
@@ -147,3 +149,135 @@ class TestCourier:
         assert 'total_orders' in data
         assert 'delivered_orders' in data
         assert 'earnings' in data
+
+
+class TestLocationUpload:
+    @pytest.fixture
+    def order_id(self, app, test_customer, test_courier):
+        order = ParcelOrder(
+            customer_id=test_customer,
+            courier_id=test_courier,
+            parcel_name='Test Package',
+            weight=1.0,
+            weight_category='small',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            price=50.0,
+            status='in_transit'
+        )
+        db.session.add(order)
+        db.session.commit()
+        return order.id
+
+    @pytest.fixture
+    def ping_inserts(self, app):
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO location_pings'):
+                statements.append(statement)
+        
+        event.listen(db.engine, 'before_cursor_execute', record)
+        yield statements
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    def test_batch_is_one_insert(self, client, order_id, courier_auth_headers, ping_inserts):
+        points = [
+            {'lat': -1.28 - i * 0.001, 'lng': 36.81, 'recorded_at': 1700000000 + i}
+            for i in range(30)
+        ]
+        
+        response = client.post(f'/api/courier/orders/{order_id}/locations', json={'points': points}, headers=courier_auth_headers)
+        
+        assert response.status_code == 201
+        assert response.get_json()['accepted'] == 30
+        assert len(ping_inserts) == 1
+        assert LocationPing.query.filter_by(order_id=order_id).count() == 30
+        # Newest point wins, wherever it is in the batch
+        order = location_store.apply(db.session.get(ParcelOrder, order_id))
+        assert order.current_lat == pytest.approx(-1.28 - 29 * 0.001)
+
+    def test_late_batch_does_not_rewind(self, client, order_id, courier_auth_headers):
+        client.post(f'/api/courier/orders/{order_id}/locations', json={
+            'points': [{'lat': -1.30, 'lng': 36.80, 'recorded_at': '2025-01-01T10:05:00Z'}]
+        }, headers=courier_auth_headers)
+        
+        response = client.post(f'/api/courier/orders/{order_id}/locations', json={
+            'points': [{'lat': -1.20, 'lng': 36.70, 'recorded_at': '2025-01-01T13:00:00+03:00'}]
+        }, headers=courier_auth_headers)
+        
+        data = response.get_json()
+        assert response.status_code == 201
+        assert data['position_updated'] is False
+        assert data['current_lat'] == -1.30
+        assert LocationPing.query.filter_by(order_id=order_id).count() == 2
+
+    def test_invalid_point_rejects_batch(self, client, order_id, courier_auth_headers):
+        response = client.post(f'/api/courier/orders/{order_id}/locations', json={
+            'points': [
+                {'lat': -1.30, 'lng': 36.80, 'recorded_at': 1700000000},
+                {'lat': 95, 'lng': 36.80, 'recorded_at': 1700000001}
+            ]
+        }, headers=courier_auth_headers)
+        
+        assert response.status_code == 400
+        assert 'Point 1' in response.get_json()['error']
+        assert LocationPing.query.count() == 0
+
+    def test_other_courier_denied(self, client, order_id, auth_headers):
+        response = client.post(f'/api/courier/orders/{order_id}/locations', json={
+            'points': [{'lat': -1.30, 'lng': 36.80, 'recorded_at': 1700000000}]
+        }, headers=auth_headers)
+        
+        assert response.status_code == 403
+
+
+class TestCourierLocation:
+    @pytest.fixture
+    def order_ids(self, app, test_customer, test_courier):
+        ids = []
+        for status in ('assigned', 'in_transit', 'delivered'):
+            order = ParcelOrder(
+                customer_id=test_customer,
+                courier_id=test_courier,
+                parcel_name='Test Package',
+                weight=1.0,
+                weight_category='small',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                price=50.0,
+                status=status
+            )
+            db.session.add(order)
+            db.session.commit()
+            ids.append(order.id)
+        return ids
+
+    def test_updates_all_active_orders_with_two_queries(self, client, order_ids, courier_auth_headers):
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db.engine, 'before_cursor_execute', record)
+        response = client.patch('/api/courier/location', json={'lat': -1.29, 'lng': 36.82}, headers=courier_auth_headers)
+        event.remove(db.engine, 'before_cursor_execute', record)
+        
+        assert response.status_code == 200
+        assert sorted(response.get_json()['order_ids']) == order_ids[:2]
+        # The courier's role, then their active orders
+        assert len(statements) == 2
+        db.session.expire_all()
+        assert location_store.apply(db.session.get(ParcelOrder, order_ids[0])).current_lat == -1.29
+        assert db.session.get(ParcelOrder, order_ids[2]).current_lat is None
+
+    def test_forbidden_for_customer(self, client, test_customer, order_ids, auth_headers):
+        response = client.patch('/api/courier/location', json={'lat': -1.29, 'lng': 36.82}, headers=auth_headers)
+        
+        assert response.status_code == 403
+        assert location_store.courier_position(test_customer) is None
+
+    def test_invalid_coordinates(self, client, order_ids, courier_auth_headers):
+        response = client.patch('/api/courier/location', json={'lat': 95, 'lng': 36.82}, headers=courier_auth_headers)
+        
+        assert response.status_code == 400
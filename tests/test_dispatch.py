@@ -0,0 +1,127 @@
+import itertools
+import random
+import time
+from datetime import datetime
+import numpy as np
+import pytest
+from extensions import db
+from models import Notification, ParcelOrder
+from utils.dispatch import INFEASIBLE, greedy_assignment, hungarian, plan_dispatch
+from utils.location_store import location_store
+
+
+def brute_force_cost(cost):
+    n, m = cost.shape
+    if n <= m:
+        return min(sum(cost[i, p[i]] for i in range(n)) for p in itertools.permutations(range(m), n))
+    return brute_force_cost(cost.T)
+
+
+class TestSolvers:
+    def test_hungarian_is_optimal(self):
+        rng = np.random.default_rng(7)
+        for _ in range(100):
+            n, m = (int(x) for x in rng.integers(1, 6, 2))
+            cost = rng.random((n, m)) * 10
+            
+            rows, cols = hungarian(cost)
+            
+            assert len(rows) == min(n, m)
+            assert len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+            assert cost[rows, cols].sum() == pytest.approx(brute_force_cost(cost))
+
+    def test_greedy_skips_infeasible(self):
+        cost = np.array([[1.0, INFEASIBLE], [INFEASIBLE, INFEASIBLE]])
+        
+        rows, cols = greedy_assignment(cost)
+        
+        assert list(zip(rows, cols)) == [(0, 0)]
+
+
+class TestPlanDispatch:
+    def test_respects_distance_and_capacity(self):
+        orders = [(1, -1.2864, 36.8172), (2, -1.2870, 36.8180), (3, -1.2860, 36.8170), (4, -3.0, 38.0)]
+        couriers = [(10, -1.2865, 36.8175, 2), (11, -1.3000, 36.8300, 0)]
+        
+        plan = plan_dispatch(orders, couriers, max_km=15, max_load=3)
+        
+        assigned = {order_id: courier_id for order_id, courier_id, _ in plan}
+        assert 4 not in assigned
+        # Courier 10 already carries two orders, so only one more fits
+        assert list(assigned.values()).count(10) == 1
+        assert list(assigned.values()).count(11) == 2
+
+    def test_large_batch_under_a_second(self):
+        rng = random.Random(3)
+        orders = [(i, -1.29 + rng.uniform(-0.2, 0.2), 36.82 + rng.uniform(-0.2, 0.2)) for i in range(1000)]
+        couriers = [
+            (i, -1.29 + rng.uniform(-0.2, 0.2), 36.82 + rng.uniform(-0.2, 0.2), rng.randint(0, 2))
+            for i in range(300)
+        ]
+        
+        started = time.perf_counter()
+        plan = plan_dispatch(orders, couriers)
+        
+        assert time.perf_counter() - started < 1.0
+        assert len({order_id for order_id, _, _ in plan}) == len(plan)
+
+
+class TestDispatchEndpoint:
+    def make_orders(self, customer_id, count):
+        ids = []
+        for i in range(count):
+            order = ParcelOrder(
+                customer_id=customer_id,
+                parcel_name='Test Package',
+                weight=1.0,
+                weight_category='small',
+                pickup_address='Kenyatta Avenue',
+                pickup_lat=-1.2864 + i * 0.001,
+                pickup_lng=36.8172,
+                destination_address='Westlands',
+                price=50.0,
+                status='pending'
+            )
+            db.session.add(order)
+            db.session.commit()
+            ids.append(order.id)
+        return ids
+
+    def test_assigns_in_one_pass(self, client, test_admin, test_customer, test_courier, admin_auth_headers):
+        order_ids = self.make_orders(test_customer, 2)
+        location_store.update_courier(test_courier, -1.2865, 36.8175, datetime.utcnow())
+        
+        response = client.post('/api/admin/dispatch', json={}, headers=admin_auth_headers)
+        
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data['assigned'] == 2
+        db.session.expire_all()
+        for order_id in order_ids:
+            order = db.session.get(ParcelOrder, order_id)
+            assert (order.status, order.courier_id) == ('assigned', test_courier)
+        assert Notification.query.filter_by(user_id=test_courier, type='assignment').count() == 2
+
+    def test_dry_run_saves_nothing(self, client, test_admin, test_customer, test_courier, admin_auth_headers):
+        order_ids = self.make_orders(test_customer, 1)
+        location_store.update_courier(test_courier, -1.2865, 36.8175, datetime.utcnow())
+        
+        response = client.post('/api/admin/dispatch', json={'dry_run': True}, headers=admin_auth_headers)
+        
+        assert response.get_json()['planned'][0]['order_id'] == order_ids[0]
+        assert response.get_json()['assigned'] == 0
+        db.session.expire_all()
+        assert db.session.get(ParcelOrder, order_ids[0]).status == 'pending'
+
+    def test_cli(self, app, runner, test_customer, test_courier):
+        self.make_orders(test_customer, 1)
+        location_store.update_courier(test_courier, -1.2865, 36.8175, datetime.utcnow())
+        
+        result = runner.invoke(args=['admin', 'dispatch'])
+        
+        assert 'assigned: 1' in result.output
+
+    def test_admin_only(self, client, test_customer, auth_headers):
+        response = client.post('/api/admin/dispatch', json={}, headers=auth_headers)
+        
+        assert response.status_code == 403
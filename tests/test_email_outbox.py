@@ -0,0 +1,149 @@
+import json
+import threading
+import pytest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from extensions import db
+from models import EmailOutbox
+from services.email_service import send_email, drain_outbox
+from services.http_client import HttpClient
+
+
+class ResendHandler(BaseHTTPRequestHandler):
+    """Accepts emails like Resend; `status` forces an error response, `batch_results` a short batch answer"""
+    requests = []
+    status = 200
+    batch_results = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        type(self).requests.append((self.path, body, self.headers.get('Idempotency-Key')))
+        if self.path.endswith('/batch'):
+            count = len(body) if type(self).batch_results is None else type(self).batch_results
+            payload = {'data': [{'id': f'batch-{i}'} for i in range(count)]}
+        else:
+            payload = {'id': 'single'}
+        data = json.dumps(payload).encode()
+        self.send_response(type(self).status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def resend(monkeypatch):
+    ResendHandler.requests = []
+    ResendHandler.status = 200
+    ResendHandler.batch_results = None
+    httpd = HTTPServer(('127.0.0.1', 0), ResendHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr('services.email_service.RESEND_URL', f"http://127.0.0.1:{httpd.server_port}/emails")
+    monkeypatch.setenv('RESEND_API_KEY', 're_test')
+    # Own client so failures here don't open the shared circuit
+    monkeypatch.setattr('services.email_service.http_client', HttpClient(backoff=0.01))
+    yield ResendHandler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestEmailOutbox:
+    def test_register_queues_email_with_user(self, client):
+        response = client.post('/api/register', json={
+            'full_name': 'New User',
+            'email': 'new@test.com',
+            'phone': '+254711111111',
+            'password': 'password123'
+        })
+        
+        assert response.status_code == 201
+        entry = EmailOutbox.query.one()
+        assert entry.to_email == 'new@test.com'
+        assert entry.status == 'pending'
+
+    def test_rollback_discards_email(self, app):
+        send_email('a@test.com', 'Subject', '<p>Hi</p>')
+        db.session.rollback()
+        
+        assert EmailOutbox.query.count() == 0
+
+    def test_drain_uses_batch_endpoint(self, app, resend):
+        for i in range(3):
+            send_email(f'user{i}@test.com', 'Subject', '<p>Hi</p>')
+        send_email('pdf@test.com', 'Receipt', '<p>Hi</p>', [{'filename': 'r.pdf', 'content': b'%PDF'}])
+        db.session.commit()
+        
+        assert drain_outbox() == {'sent': 4, 'retrying': 0, 'dead': 0, 'unknown': 0}
+        
+        paths = [path for path, _, _ in resend.requests]
+        assert paths == ['/emails/batch', '/emails']
+        assert len(resend.requests[0][1]) == 3
+        # Attachments go out base64 encoded
+        assert resend.requests[1][1]['attachments'][0]['content'] == 'JVBERg=='
+        assert EmailOutbox.query.filter_by(status='sent').count() == 4
+
+    def test_failures_back_off_then_dead_letter(self, app, resend):
+        resend.status = 500
+        send_email('a@test.com', 'Subject', '<p>Hi</p>')
+        db.session.commit()
+        
+        assert drain_outbox(max_attempts=2) == {'sent': 0, 'retrying': 1, 'dead': 0, 'unknown': 0}
+        entry = EmailOutbox.query.one()
+        assert entry.next_attempt_at > datetime.utcnow()
+        
+        entry.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert drain_outbox(max_attempts=2) == {'sent': 0, 'retrying': 0, 'dead': 1, 'unknown': 0}
+        assert EmailOutbox.query.one().status == 'dead'
+
+    def test_short_batch_response_marks_unknown(self, app, resend):
+        resend.batch_results = 2
+        for i in range(3):
+            send_email(f'user{i}@test.com', 'Subject', '<p>Hi</p>')
+        db.session.commit()
+        
+        assert drain_outbox() == {'sent': 0, 'retrying': 0, 'dead': 0, 'unknown': 3}
+        assert EmailOutbox.query.filter_by(status='unknown').count() == 3
+        # Not sent again on the next round
+        assert drain_outbox() == {'sent': 0, 'retrying': 0, 'dead': 0, 'unknown': 0}
+        assert len(resend.requests) == 1
+
+    def test_claimed_rows_are_not_drained_twice(self, app, resend, monkeypatch):
+        send_email('a@test.com', 'Subject', '<p>Hi</p>')
+        db.session.commit()
+        seen = []
+        
+        def deliver(entries):
+            seen.append([entry.id for entry in entries])
+            # A second drain running meanwhile finds nothing to claim
+            assert drain_outbox() == {'sent': 0, 'retrying': 0, 'dead': 0, 'unknown': 0}
+            assert EmailOutbox.query.one().status == 'sending'
+            return {entry.id: 'resend-id' for entry in entries}
+        
+        monkeypatch.setattr('services.email_service._deliver_batch', deliver)
+        
+        assert drain_outbox() == {'sent': 1, 'retrying': 0, 'dead': 0, 'unknown': 0}
+        assert len(seen) == 1
+
+    def test_stale_claim_is_marked_unknown(self, app, resend):
+        send_email('a@test.com', 'Subject', '<p>Hi</p>')
+        db.session.commit()
+        entry = EmailOutbox.query.one()
+        entry.status = 'sending'
+        entry.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        
+        assert drain_outbox() == {'sent': 0, 'retrying': 0, 'dead': 0, 'unknown': 1}
+        assert EmailOutbox.query.one().status == 'unknown'
+        assert resend.requests == []
+
+    def test_drain_command(self, runner, resend):
+        send_email('a@test.com', 'Subject', '<p>Hi</p>')
+        db.session.commit()
+        
+        result = runner.invoke(args=['email', 'drain'])
+        
+        assert 'Sent: 1' in result.output
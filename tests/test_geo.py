@@ -0,0 +1,166 @@
+import math
+import threading
+import time
+import pytest
+from utils.geo import CircuityEstimator, haversine_km
+from extensions import db
+from models import ParcelOrder
+from utils import get_distance_matrix, get_distance_matrix_batch, resolve_distance, _matrix_tile_shape
+from utils.cache import distance_cache
+
+
+class TestCircuityEstimator:
+    def test_haversine(self):
+        # Nairobi CBD to JKIA is roughly 15 km as the crow flies
+        assert haversine_km((-1.2864, 36.8172), (-1.3192, 36.9278)) == pytest.approx(12.8, abs=0.5)
+
+    def test_fit_recovers_region_factor(self):
+        origin = (-1.2864, 36.8172)
+        samples = []
+        for i in range(30):
+            destination = (-1.2864 - 0.01 * (i + 1), 36.8172 + 0.005 * i)
+            samples.append((origin, destination, haversine_km(origin, destination) * 1.6))
+        
+        estimator = CircuityEstimator(min_samples=20).fit(samples)
+        
+        assert estimator.factor_for(origin) == pytest.approx(1.6)
+        assert estimator.global_factor == pytest.approx(1.6)
+
+    def test_fit_ignores_implausible_distances(self):
+        origin = (-1.2864, 36.8172)
+        destination = (-1.3864, 36.8172)
+        straight = haversine_km(origin, destination)
+        samples = [(origin, destination, straight * 1.5)] * 20 + [(origin, destination, straight * 10)] * 5
+        
+        estimator = CircuityEstimator(min_samples=20).fit(samples)
+        
+        assert estimator.global_factor == pytest.approx(1.5)
+        assert estimator.sample_count == 20
+
+    def test_fit_from_db_uses_only_mapbox_distances(self, app, test_customer):
+        origin = (-1.2864, 36.8172)
+        for i in range(25):
+            destination = (-1.2864 - 0.01 * (i + 1), 36.8172 + 0.005 * i)
+            straight = haversine_km(origin, destination)
+            for source, factor in (('mapbox', 1.6), ('estimate', 1.35)):
+                db.session.add(ParcelOrder(
+                    customer_id=test_customer,
+                    parcel_name='Test Package',
+                    weight=1.0,
+                    weight_category='small',
+                    pickup_address='123 Main St',
+                    pickup_lat=origin[0],
+                    pickup_lng=origin[1],
+                    destination_address='456 Oak Ave',
+                    destination_lat=destination[0],
+                    destination_lng=destination[1],
+                    distance=straight * factor,
+                    distance_source=source,
+                    price=50.0
+                ))
+        db.session.commit()
+        
+        estimator = CircuityEstimator(min_samples=20).fit_from_db()
+        
+        assert estimator.sample_count == 25
+        assert estimator.global_factor == pytest.approx(1.6)
+        # Only the most recent orders are read
+        assert CircuityEstimator(min_samples=5, max_samples=10).fit_from_db().sample_count == 10
+
+    def test_refit_runs_in_background_once(self, app, monkeypatch):
+        estimator = CircuityEstimator()
+        release = threading.Event()
+        fits = []
+        
+        def slow_fit():
+            fits.append(threading.current_thread().name)
+            release.wait(5)
+            return estimator.fit([])
+        
+        monkeypatch.setattr(estimator, 'fit_from_db', slow_fit)
+        monkeypatch.setattr(app, 'testing', False)
+        
+        for _ in range(5):
+            estimator.ensure_fitted()
+            # Callers estimate with the current factors meanwhile
+            assert estimator.factor_for((-1.2864, 36.8172)) == CircuityEstimator.DEFAULT_FACTOR
+        release.set()
+        for _ in range(50):
+            if estimator.fitted_at is not None and not estimator._refitting:
+                break
+            time.sleep(0.05)
+        
+        assert fits == ['circuity-fit']
+        assert estimator.fitted_at is not None
+
+    def test_unfitted_region_uses_default(self):
+        estimator = CircuityEstimator()
+        distance_m, duration_s = estimator.estimate((-1.2864, 36.8172), (-1.3864, 36.8172))
+        
+        assert distance_m == pytest.approx(haversine_km((-1.2864, 36.8172), (-1.3864, 36.8172)) * 1350)
+        assert duration_s > 0
+
+    def test_offline_provider(self, app):
+        distance, duration = get_distance_matrix((-1.2864, 36.8172), (-1.3864, 36.8172), provider='offline')
+        
+        assert distance == pytest.approx(11.1 * CircuityEstimator.DEFAULT_FACTOR, rel=0.02)
+        assert duration.endswith('mins')
+        assert resolve_distance((-1.2864, 36.8172), (-1.3864, 36.8172), provider='offline')[2] == 'estimate'
+
+
+class TestDistanceMatrixBatch:
+    ORIGINS = [(-1.2864, 36.8172), (-1.2921, 36.8219)]
+    DESTINATIONS = [(-1.3864, 36.8172), (-1.3192, 36.9278), (-1.2630, 36.8040)]
+
+    def test_offline_matches_single_pair(self, app):
+        distances, durations = get_distance_matrix_batch(self.ORIGINS, self.DESTINATIONS, provider='offline')
+        
+        assert distances.shape == durations.shape == (2, 3)
+        for i, origin in enumerate(self.ORIGINS):
+            for j, destination in enumerate(self.DESTINATIONS):
+                single, _ = get_distance_matrix(origin, destination, provider='offline')
+                assert distances[i, j] == pytest.approx(single)
+
+    def test_cached_pairs_are_used(self, app, monkeypatch):
+        monkeypatch.delenv('MAPBOX_ACCESS_TOKEN', raising=False)
+        origin, destination = self.ORIGINS[0], self.DESTINATIONS[1]
+        distance_cache.store_many({distance_cache.key_for(origin, destination): (20000.0, 1800.0)})
+        
+        try:
+            distances, durations = get_distance_matrix_batch(self.ORIGINS, self.DESTINATIONS, provider='mapbox')
+        finally:
+            distance_cache.memory.clear()
+        
+        assert distances[0, 1] == pytest.approx(20.0)
+        assert durations[0, 1] == pytest.approx(1800.0)
+        # Nothing else is known without Mapbox
+        assert sum(math.isnan(value) for value in distances.ravel()) == 5
+
+    def test_tile_shape_fits_mapbox_limit(self):
+        for num_origins, num_destinations in [(1, 100), (100, 1), (30, 30), (5, 5)]:
+            rows, cols = _matrix_tile_shape(num_origins, num_destinations)
+            assert rows + cols <= 25
+        
+        # One origin against many stops: a single origin per request
+        assert _matrix_tile_shape(1, 100) == (1, 24)
+        assert _matrix_tile_shape(5, 5) == (5, 5)
+
+    def test_endpoint(self, client, test_admin, admin_auth_headers):
+        response = client.post('/api/admin/distance-matrix', headers=admin_auth_headers, json={
+            'origins': [list(point) for point in self.ORIGINS],
+            'destinations': [list(point) for point in self.DESTINATIONS],
+            'provider': 'offline'
+        })
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['distances_km']) == 2
+        assert len(data['durations_s'][0]) == 3
+
+    def test_endpoint_rejects_large_matrix(self, client, test_admin, admin_auth_headers):
+        response = client.post('/api/admin/distance-matrix', headers=admin_auth_headers, json={
+            'origins': [[-1.28, 36.81]] * 101,
+            'destinations': [[-1.30, 36.80]] * 100
+        })
+        
+        assert response.status_code == 400
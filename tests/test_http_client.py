@@ -0,0 +1,144 @@
+import threading
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from services.http_client import HttpClient, CircuitBreaker, CircuitOpenError, BulkheadFullError
+from services.cloudinary_service import sign_params
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 to the first `failures` requests, then 200"""
+    failures = 0
+    calls = 0
+
+    def _respond(self):
+        type(self).calls += 1
+        status = 503 if type(self).calls <= type(self).failures else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FlakyHandler.calls = 0
+    FlakyHandler.failures = 0
+    httpd = HTTPServer(('127.0.0.1', 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestCircuitBreaker:
+    def test_half_open_allows_one_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        breaker.opened_at -= 60
+        
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+
+class TestHttpClient:
+    def test_retries_idempotent_requests(self, server):
+        FlakyHandler.failures = 2
+        client = HttpClient(max_retries=2, backoff=0.01)
+        
+        response = client.get('test', server)
+        
+        assert response.status_code == 200
+        stats = client.stats()['test']
+        assert stats['requests'] == 3
+        assert stats['retries'] == 2
+        assert stats['statuses'] == {'200': 1, '503': 2}
+
+    def test_post_is_not_retried(self, server):
+        FlakyHandler.failures = 1
+        client = HttpClient(max_retries=2, backoff=0.01)
+        
+        assert client.post('test', server).status_code == 503
+        assert client.post('test', server, idempotent=True).status_code == 200
+        assert FlakyHandler.calls == 2
+
+    def test_connection_errors_raise_after_retries(self):
+        client = HttpClient(max_retries=1, backoff=0.01, connect_timeout=0.2)
+        
+        with pytest.raises(requests.ConnectionError):
+            client.get('down', 'http://127.0.0.1:1/')
+        
+        assert client.stats()['down']['errors'] == 2
+
+    def test_session_is_reused_per_upstream(self):
+        client = HttpClient()
+        
+        assert client.session('mapbox') is client.session('mapbox')
+        assert client.session('mapbox') is not client.session('mpesa')
+
+    def test_circuit_opens_and_fails_fast(self, server):
+        FlakyHandler.failures = 100
+        client = HttpClient(max_retries=0, failure_threshold=3, reset_timeout=60)
+        
+        for _ in range(3):
+            assert client.get('test', server).status_code == 503
+        with pytest.raises(CircuitOpenError):
+            client.get('test', server)
+        
+        assert FlakyHandler.calls == 3
+        assert client.stats()['test']['circuit']['state'] == 'open'
+
+    def test_bulkhead_rejects_when_full(self, server):
+        client = HttpClient(max_concurrent=1, bulkhead_wait=0.01)
+        client.session('test')
+        client._bulkheads['test'].acquire()
+        
+        with pytest.raises(BulkheadFullError):
+            client.get('test', server)
+        
+        assert client.stats()['test']['bulkhead']['rejected'] == 1
+
+    def test_bulkhead_full_during_half_open_keeps_probe(self, server):
+        client = HttpClient(max_retries=0, max_concurrent=1, bulkhead_wait=0.01, failure_threshold=1, reset_timeout=0)
+        client.session('test')
+        breaker = client._breakers['test']
+        breaker.record_failure()
+        bulkhead = client._bulkheads['test']
+        bulkhead.acquire()
+        
+        with pytest.raises(BulkheadFullError):
+            client.get('test', server)
+        bulkhead.release()
+        
+        # The probe wasn't used up by the rejected call, so the next one closes the circuit
+        assert client.get('test', server).status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_cloudinary_signature(self):
+        # Example from the Cloudinary upload signature docs
+        params = {'eager': 'w_400,h_300,c_pad|w_260,h_200,c_crop', 'public_id': 'sample_image', 'timestamp': 1315060510}
+        
+        assert sign_params(params, 'abcd') == 'bfd09f95f331f558cbd1320e67aa8d488770583e'
+
+    def test_upstream_stats_endpoint(self, client, test_admin, admin_auth_headers):
+        response = client.get('/api/admin/upstreams', headers=admin_auth_headers)
+        
+        assert response.status_code == 200
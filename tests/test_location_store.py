@@ -0,0 +1,215 @@
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from extensions import db
+from models import LocationPing, ParcelOrder
+from utils.location_store import (
+    LocalLocationBackend, LocationStore, LocationStoreManager, RemoteLocationBackend, _create_store, location_store
+)
+
+
+def point(lat, lng, minutes_ago=0):
+    return {'lat': lat, 'lng': lng, 'accuracy': None, 'recorded_at': datetime.utcnow() - timedelta(minutes=minutes_ago)}
+
+
+@pytest.fixture
+def orders(app, test_customer, test_courier):
+    ids = []
+    for _ in range(3):
+        order = ParcelOrder(
+            customer_id=test_customer,
+            courier_id=test_courier,
+            parcel_name='Test Package',
+            weight=1.0,
+            weight_category='small',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            price=50.0,
+            status='in_transit'
+        )
+        db.session.add(order)
+        db.session.commit()
+        ids.append(order.id)
+    return ids
+
+
+@pytest.fixture
+def statements(app):
+    recorded = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append((statement, executemany))
+    
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+class TestLocalBackend:
+    def test_older_point_does_not_replace_newer(self):
+        backend = LocalLocationBackend()
+        
+        assert backend.record(1, 7, [point(-1.30, 36.80)]) is True
+        assert backend.record(1, 7, [point(-1.20, 36.70, minutes_ago=5)]) is False
+        
+        assert backend.get_many([1, 2])[1][:2] == (-1.30, 36.80)
+        positions, pings = backend.take_dirty()
+        assert list(positions) == [1]
+        assert len(pings) == 2
+        assert backend.take_dirty() == ({}, [])
+
+    def test_restore_keeps_newer_position(self):
+        backend = LocalLocationBackend()
+        backend.record(1, 7, [point(-1.30, 36.80, minutes_ago=5)])
+        taken = backend.take_dirty()
+        backend.record(1, 7, [point(-1.10, 36.90)])
+        
+        backend.restore(*taken)
+        
+        assert backend.get_many([1])[1][:2] == (-1.10, 36.90)
+        assert len(backend.take_dirty()[1]) == 2
+
+    def test_prune_keeps_unflushed(self):
+        backend = LocalLocationBackend()
+        backend.record(1, 7, [point(-1.30, 36.80, minutes_ago=120)])
+        backend.record(2, 7, [point(-1.30, 36.80, minutes_ago=120)])
+        backend.take_dirty()
+        backend.record(2, 7, [point(-1.30, 36.80, minutes_ago=90)])
+        
+        assert backend.prune(datetime.utcnow() - timedelta(hours=1)) == 1
+        assert list(backend.get_many([1, 2])) == [2]
+
+
+class TestLocationStore:
+    def test_pings_do_not_write(self, client, orders, courier_auth_headers, statements):
+        for i in range(5):
+            response = client.patch(f'/api/courier/orders/{orders[0]}/location', json={
+                'lat': -1.28 - i * 0.001,
+                'lng': 36.81
+            }, headers=courier_auth_headers)
+            assert response.status_code == 200
+        
+        assert not [s for s, _ in statements if s.startswith(('UPDATE', 'INSERT'))]
+
+    def test_store_wins_on_read(self, client, orders, courier_auth_headers, auth_headers):
+        client.patch(f'/api/courier/orders/{orders[0]}/location', json={'lat': -1.29, 'lng': 36.82}, headers=courier_auth_headers)
+        
+        response = client.get(f'/api/orders/{orders[0]}', headers=auth_headers)
+        
+        assert response.get_json()['current_lat'] == -1.29
+
+    def test_flush_is_one_update(self, app, orders, statements):
+        for order_id in orders:
+            location_store.record(order_id, 7, [point(-1.2 - order_id * 0.01, 36.8)])
+        
+        assert location_store.flush() == 3
+        
+        updates = [s for s in statements if s[0].startswith('UPDATE parcel_orders')]
+        inserts = [s for s in statements if s[0].startswith('INSERT INTO location_pings')]
+        assert len(updates) == 1 and not updates[0][1]
+        assert len(inserts) == 1 and not inserts[0][1]
+        assert LocationPing.query.count() == 3
+        location_store.backend.clear()
+        db.session.expire_all()
+        for order_id in orders:
+            assert db.session.get(ParcelOrder, order_id).current_lat == pytest.approx(-1.2 - order_id * 0.01)
+        assert location_store.flush() == 0
+
+    def test_flush_keeps_updated_at(self, app, orders):
+        stamped = datetime(2026, 3, 1, 9)
+        ParcelOrder.query.update({'updated_at': stamped})
+        db.session.commit()
+        store = LocationStore(LocalLocationBackend(), flush_interval=0)
+        store.record(orders[0], 7, [point(-1.30, 36.80)])
+        
+        assert store.flush() == 1
+        
+        db.session.expire_all()
+        order = db.session.get(ParcelOrder, orders[0])
+        assert order.current_lat == -1.30
+        assert order.updated_at == stamped
+
+    def test_listing_reads_store_once(self, client, orders, auth_headers, monkeypatch):
+        for order_id in orders:
+            location_store.record(order_id, 7, [point(-1.29, 36.82)])
+        lookups = []
+        get_many = location_store.backend.get_many
+        
+        def counting_get_many(order_ids):
+            lookups.append(list(order_ids))
+            return get_many(order_ids)
+        
+        monkeypatch.setattr(location_store.backend, 'get_many', counting_get_many)
+        db.session.remove()
+        
+        response = client.get('/api/orders', headers=auth_headers)
+        
+        assert [order['current_lat'] for order in response.get_json()['orders']] == [-1.29] * 3
+        assert len(lookups) == 1 and sorted(lookups[0]) == orders
+        location_store.backend.clear()
+
+    def test_flush_does_not_rewind(self, app, orders):
+        store = LocationStore(LocalLocationBackend(), flush_interval=0)
+        store.record(orders[0], 7, [point(-1.30, 36.80)])
+        store.flush()
+        
+        # Another process flushes an older point it received late
+        late = LocationStore(LocalLocationBackend(), flush_interval=0)
+        late.record(orders[0], 7, [point(-1.10, 36.90, minutes_ago=10)])
+        late.flush()
+        
+        db.session.expire_all()
+        assert db.session.get(ParcelOrder, orders[0]).current_lat == -1.30
+
+    def test_remote_backend(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        address = sock.getsockname()
+        sock.close()
+        backend = LocalLocationBackend()
+        LocationStoreManager.register('backend', callable=lambda: backend)
+        server = LocationStoreManager(address=address, authkey=b'secret').get_server()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        time.sleep(0.2)
+        
+        # Two clients stand in for two web workers
+        first = RemoteLocationBackend(address, b'secret')
+        second = RemoteLocationBackend(address, b'secret')
+        first.record(1, 7, [point(-1.30, 36.80)])
+        
+        assert second.get_many([1])[1][:2] == (-1.30, 36.80)
+        assert list(second.take_dirty()[0]) == [1]
+
+    def test_remote_backend_requires_authkey(self, monkeypatch):
+        monkeypatch.setenv('LOCATION_STORE_ADDRESS', '127.0.0.1:6151')
+        monkeypatch.setenv('PUBSUB_AUTHKEY', 'deliveroo')
+        
+        with pytest.raises(RuntimeError):
+            _create_store()
+
+    def test_several_workers_need_a_shared_store(self, app, monkeypatch):
+        monkeypatch.setenv('WEB_CONCURRENCY', '4')
+        
+        with pytest.raises(RuntimeError, match='LOCATION_STORE_ADDRESS'):
+            LocationStore(LocalLocationBackend()).init_app(app)
+
+    def test_flusher_starts_with_the_app(self, app, monkeypatch):
+        monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+        monkeypatch.setattr(app, 'testing', False)
+        monkeypatch.setattr('atexit.register', lambda *args: None)
+        store = LocationStore(LocalLocationBackend(), flush_interval=3600)
+        
+        store.init_app(app)
+        
+        assert store._flusher.is_alive()
+
+    def test_serve_command_requires_authkey(self, runner, monkeypatch):
+        monkeypatch.delenv('PUBSUB_AUTHKEY', raising=False)
+        
+        result = runner.invoke(args=['locations', 'serve'])
+        
+        assert result.exit_code != 0
+        assert 'PUBSUB_AUTHKEY' in result.output
@@ -0,0 +1,125 @@
+import pytest
+from sqlalchemy import event
+from extensions import db
+from models import Notification, User
+from utils import create_notification, queue_notifications
+
+
+@pytest.fixture
+def notification_inserts(app):
+    """Statements that insert into notifications while the test runs"""
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO notifications'):
+            statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+class TestNotificationUnitOfWork:
+    def test_written_on_commit(self, app, test_customer):
+        create_notification(test_customer, None, 'Hello', 'test')
+        
+        assert Notification.query.count() == 0
+        db.session.commit()
+        assert Notification.query.one().message == 'Hello'
+
+    def test_rollback_discards(self, app, test_customer):
+        create_notification(test_customer, None, 'Hello', 'test')
+        db.session.rollback()
+        db.session.commit()
+        
+        assert Notification.query.count() == 0
+
+    def test_many_notifications_one_insert(self, app, test_customer, notification_inserts):
+        queue_notifications(
+            {'user_id': test_customer, 'message': f'Message {i}', 'type': 'test'}
+            for i in range(500)
+        )
+        db.session.commit()
+        
+        assert Notification.query.count() == 500
+        assert len(notification_inserts) == 1
+
+    def test_broadcast(self, client, test_customer, test_courier, test_admin, admin_auth_headers, notification_inserts):
+        response = client.post('/api/admin/notifications', json={
+            'message': 'Service update',
+            'role': 'customer'
+        }, headers=admin_auth_headers)
+        
+        assert response.status_code == 201
+        assert response.get_json()['recipients'] == 1
+        assert Notification.query.filter_by(user_id=test_customer, type='announcement').count() == 1
+        assert len(notification_inserts) == 1
+
+    def test_broadcast_requires_message(self, client, test_admin, admin_auth_headers):
+        response = client.post('/api/admin/notifications', json={'role': 'all'}, headers=admin_auth_headers)
+        
+        assert response.status_code == 400
+
+
+class TestNotificationFeed:
+    @pytest.fixture
+    def notifications(self, app, test_customer):
+        queue_notifications(
+            {'user_id': test_customer, 'message': f'Message {i}', 'type': 'test'}
+            for i in range(25)
+        )
+        db.session.commit()
+
+    def test_keyset_pages_cover_everything_once(self, client, notifications, auth_headers):
+        seen = []
+        cursor = None
+        for _ in range(5):
+            url = '/api/notifications?limit=10' + (f'&cursor={cursor}' if cursor else '')
+            data = client.get(url, headers=auth_headers).get_json()
+            seen.extend(n['id'] for n in data['notifications'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        
+        assert len(seen) == 25
+        assert seen == sorted(seen, reverse=True)
+
+    def test_invalid_cursor(self, client, test_customer, auth_headers):
+        response = client.get('/api/notifications?cursor=garbage', headers=auth_headers)
+        
+        assert response.status_code == 400
+
+    def test_unread_counter_follows_inserts_and_reads(self, client, notifications, auth_headers):
+        assert client.get('/api/notifications/unread-count', headers=auth_headers).get_json()['unread_count'] == 25
+        
+        ids = [n['id'] for n in client.get('/api/notifications?limit=5', headers=auth_headers).get_json()['notifications']]
+        response = client.post('/api/notifications/read', json={'ids': ids}, headers=auth_headers)
+        assert response.get_json() == {'message': 'Notifications marked as read', 'updated': 5, 'unread_count': 20}
+        
+        # Already read: no double decrement
+        response = client.post('/api/notifications/read', json={'ids': ids}, headers=auth_headers)
+        assert response.get_json()['unread_count'] == 20
+        
+        response = client.post('/api/notifications/read', json={'all': True}, headers=auth_headers)
+        assert response.get_json()['unread_count'] == 0
+        unread = client.get('/api/notifications?unread_only=true', headers=auth_headers).get_json()
+        assert unread['notifications'] == []
+
+    def test_cannot_mark_other_users_notifications(self, client, test_courier, test_customer, auth_headers):
+        create_notification(test_courier, None, 'For the courier', 'test')
+        db.session.commit()
+        notification_id = Notification.query.one().id
+        
+        response = client.post('/api/notifications/read', json={'ids': [notification_id]}, headers=auth_headers)
+        
+        assert response.get_json()['updated'] == 0
+        assert db.session.get(User, test_courier).unread_notifications == 1
+
+    def test_rebuild_unread(self, runner, notifications, test_customer):
+        db.session.execute(db.update(User).values(unread_notifications=0))
+        db.session.commit()
+        
+        runner.invoke(args=['notifications', 'rebuild-unread'])
+        
+        db.session.expire_all()
+        assert db.session.get(User, test_customer).unread_notifications == 25
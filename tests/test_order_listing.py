@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import event
+from extensions import db
+from models import ParcelOrder, Payment, User
+
+
+@pytest.fixture
+def add_orders(app, test_courier):
+    """Adds orders, each from its own customer and with a payment, assigned to the test courier"""
+    def add(count):
+        start = User.query.count()
+        for i in range(start, start + count):
+            customer = User(
+                full_name=f"Customer {i}",
+                email=f"customer{i}@test.com",
+                role="customer"
+            )
+            customer.set_password("password123")
+            db.session.add(customer)
+            order = ParcelOrder(
+                customer=customer,
+                courier_id=test_courier,
+                parcel_name='Test Package',
+                weight=1.0,
+                weight_category='small',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                price=50.0,
+                status='assigned'
+            )
+            db.session.add(order)
+            db.session.add(Payment(order=order, amount=50.0, status='completed'))
+        db.session.commit()
+    return add
+
+
+def count_queries(client, url, headers):
+    # Start from an empty identity map, as a real request would
+    db.session.remove()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    response = client.get(url, headers=headers)
+    event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+class TestOrderListingQueries:
+    @pytest.mark.parametrize('url, headers_fixture, listed', [
+        ('/api/admin/orders?per_page=50', 'admin_auth_headers', 'orders'),
+        ('/api/orders?per_page=50', 'courier_auth_headers', 'orders'),
+        ('/api/courier/orders', 'courier_auth_headers', 'orders'),
+        ('/api/admin/dashboard', 'admin_auth_headers', 'recent_orders'),
+    ])
+    def test_constant_per_page(self, request, client, test_admin, add_orders, url, headers_fixture, listed):
+        headers = request.getfixturevalue(headers_fixture)
+        # The dashboard builds its counters on first use
+        client.get(url, headers=headers)
+
+        add_orders(2)
+        few, data = count_queries(client, url, headers)
+        assert len(data[listed]) == 2
+
+        add_orders(8)
+        many, data = count_queries(client, url, headers)
+        assert len(data[listed]) == 10
+        assert many == few
+        assert few <= 5
+
+    def test_customer_listing_includes_payment_and_parties(self, client, test_customer, test_courier, auth_headers):
+        order = ParcelOrder(
+            customer_id=test_customer,
+            courier_id=test_courier,
+            parcel_name='Test Package',
+            weight=1.0,
+            weight_category='small',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            price=50.0,
+            status='assigned'
+        )
+        db.session.add(order)
+        payment = Payment(order=order, amount=50.0, status='completed')
+        db.session.add(payment)
+        db.session.flush()
+        order.apply_payment(payment)
+        db.session.commit()
+
+        _, data = count_queries(client, '/api/orders', auth_headers)
+
+        listed = data['orders'][0]
+        assert listed['payment_status'] == 'completed'
+        assert listed['customer']['full_name'] == 'Test Customer'
+        assert listed['courier']['plate_number'] == 'ABC123DE'
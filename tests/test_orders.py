@@ -1,3 +1,5 @@
+import io
+import threading
 import pytest
 from models import ParcelOrder, User
 from extensions import db
@@ -20,6 +22,109 @@ class TestOrders:
         assert data['order']['status'] == 'pending'
         assert 'price' in data['order']
 
+    def test_create_order_without_mapbox_uses_estimate(self, client, test_customer, auth_headers):
+        response = client.post('/api/orders', json={
+            'parcel_name': 'Test Package',
+            'weight': 2.5,
+            'pickup_address': 'Kenyatta Avenue, Nairobi',
+            'pickup_lat': -1.2864,
+            'pickup_lng': 36.8172,
+            'destination_address': 'Langata Road, Nairobi',
+            'destination_lat': -1.3864,
+            'destination_lng': 36.8172
+        }, headers=auth_headers)
+        
+        assert response.status_code == 201
+        assert response.get_json()['order']['distance'] > 11
+        order = db.session.get(ParcelOrder, response.get_json()['order']['id'])
+        assert order.distance_source == 'estimate'
+
+    def test_create_order_geocodes_concurrently(self, client, test_customer, auth_headers, monkeypatch):
+        # Each lookup waits for the other, so both must be in flight at once
+        both_running = threading.Barrier(2, timeout=5)
+        geocoded = []
+        
+        def geocode(address):
+            both_running.wait()
+            geocoded.append(address)
+            return (-1.2864, 36.8172) if 'Kenyatta' in address else (-1.3864, 36.8172)
+        
+        monkeypatch.setattr('routes.orders.get_geocode', geocode)
+        
+        response = client.post('/api/orders', json={
+            'parcel_name': 'Test Package',
+            'weight': 2.5,
+            'pickup_address': 'Kenyatta Avenue, Nairobi',
+            'destination_address': 'Langata Road, Nairobi'
+        }, headers=auth_headers)
+        
+        assert response.status_code == 201
+        assert sorted(geocoded) == ['Kenyatta Avenue, Nairobi', 'Langata Road, Nairobi']
+        assert response.get_json()['order']['distance'] > 11
+
+    def test_create_order_uploads_image_bytes(self, client, test_customer, auth_headers, monkeypatch):
+        uploads = []
+        
+        def upload_image(data, filename=None):
+            uploads.append((data, filename))
+            return 'https://images.test/parcel.jpg'
+        
+        monkeypatch.setattr('services.cloudinary_service.upload_image', upload_image)
+        
+        response = client.post('/api/orders', data={
+            'parcel_name': 'Test Package',
+            'weight': '2.5',
+            'pickup_address': '123 Main St, Nairobi',
+            'destination_address': '456 Oak Ave, Nairobi',
+            'parcel_image': (io.BytesIO(b'image bytes'), 'parcel.jpg')
+        }, headers=auth_headers, content_type='multipart/form-data')
+        
+        assert response.status_code == 201
+        assert uploads == [(b'image bytes', 'parcel.jpg')]
+        order = db.session.get(ParcelOrder, response.get_json()['order']['id'])
+        assert order.parcel_image_url == 'https://images.test/parcel.jpg'
+
+    def test_create_order_failed_upload_saves_without_image(self, client, test_customer, auth_headers, monkeypatch):
+        monkeypatch.setattr('services.cloudinary_service.upload_image', lambda data, filename=None: None)
+        
+        response = client.post('/api/orders', data={
+            'parcel_name': 'Test Package',
+            'weight': '2.5',
+            'pickup_address': '123 Main St, Nairobi',
+            'destination_address': '456 Oak Ave, Nairobi',
+            'parcel_image': (io.BytesIO(b'image bytes'), 'parcel.jpg')
+        }, headers=auth_headers, content_type='multipart/form-data')
+        
+        assert response.status_code == 201
+        order = db.session.get(ParcelOrder, response.get_json()['order']['id'])
+        assert order.parcel_image_url is None
+
+    def test_create_order_slow_upload_does_not_hold_the_request(self, client, test_customer, auth_headers, monkeypatch):
+        release = threading.Event()
+        
+        def upload_image(data, filename=None):
+            release.wait(5)
+            return 'https://images.test/parcel.jpg'
+        
+        monkeypatch.setattr('services.cloudinary_service.upload_image', upload_image)
+        monkeypatch.setenv('ORDER_RESOLVE_TIMEOUT', '0.2')
+        
+        try:
+            response = client.post('/api/orders', data={
+                'parcel_name': 'Test Package',
+                'weight': '2.5',
+                'pickup_lat': '-1.28', 'pickup_lng': '36.82',
+                'destination_lat': '-1.30', 'destination_lng': '36.80',
+                'pickup_address': '123 Main St, Nairobi',
+                'destination_address': '456 Oak Ave, Nairobi',
+                'parcel_image': (io.BytesIO(b'image bytes'), 'parcel.jpg')
+            }, headers=auth_headers, content_type='multipart/form-data')
+        finally:
+            release.set()
+        
+        assert response.status_code == 201
+        assert response.get_json()['order']['parcel_image_url'] is None
+
     def test_create_order_missing_fields(self, client, test_customer, auth_headers):
         response = client.post('/api/orders', json={
             'parcel_name': 'Test Package'
@@ -196,3 +301,62 @@ class TestOrders:
         
         assert response.status_code == 400
         assert 'Can only cancel before pickup' in response.get_json()['error']
+
+
+class TestCursorPagination:
+    @pytest.fixture
+    def order_ids(self, app, test_customer):
+        from datetime import datetime
+        ids = []
+        # Several orders share a created_at, so the id tiebreak matters
+        for i in range(7):
+            order = ParcelOrder(
+                customer_id=test_customer,
+                parcel_name=f'Package {i}',
+                weight=1.0,
+                weight_category='small',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                price=50.0,
+                created_at=datetime(2026, 3, 1, 9, i // 3)
+            )
+            db.session.add(order)
+            db.session.flush()
+            ids.append(order.id)
+        db.session.commit()
+        # Newest first
+        return sorted(ids, key=lambda order_id: (ids.index(order_id) // 3, order_id), reverse=True)
+
+    def test_pages_cover_every_order_once(self, client, auth_headers, order_ids):
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = client.get(f'/api/orders?cursor={cursor}&per_page=3', headers=auth_headers)
+            assert response.status_code == 200
+            data = response.get_json()
+            assert len(data['orders']) <= 3
+            assert data['total'] is None
+            seen.extend(order['id'] for order in data['orders'])
+            cursor = data['next_cursor']
+        
+        assert seen == order_ids
+
+    def test_total_on_request(self, client, auth_headers, order_ids):
+        response = client.get('/api/orders?cursor=&total=exact', headers=auth_headers)
+        
+        data = response.get_json()
+        assert data['total'] == 7
+        assert 'pages' not in data
+
+    def test_bad_cursor(self, client, auth_headers):
+        response = client.get('/api/orders?cursor=not-a-cursor', headers=auth_headers)
+        
+        assert response.status_code == 400
+
+    def test_page_mode_unchanged(self, client, auth_headers, order_ids):
+        response = client.get('/api/orders?page=2&per_page=3', headers=auth_headers)
+        
+        data = response.get_json()
+        assert data['total'] == 7
+        assert data['pages'] == 3
+        assert 'next_cursor' not in data
@@ -0,0 +1,158 @@
+import pytest
+from extensions import db
+from models import ParcelOrder, Payment, QueuedStkPush, Notification
+
+
+@pytest.fixture
+def test_order(app, test_customer):
+    order = ParcelOrder(
+        customer_id=test_customer,
+        parcel_name='Test Package',
+        weight=1.0,
+        weight_category='small',
+        pickup_address='123 Main St',
+        destination_address='456 Oak Ave',
+        price=150.0,
+        status='pending'
+    )
+    db.session.add(order)
+    db.session.commit()
+    return order.id
+
+
+UNAVAILABLE = {"error": "M-Pesa is temporarily unavailable", "unavailable": True}
+ACCEPTED = {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_123"}
+
+
+class TestQueuedStkPush:
+    def test_pay_is_queued_when_mpesa_unavailable(self, client, test_order, auth_headers, monkeypatch):
+        monkeypatch.setattr('routes.payments.initiate_stk_push', lambda *args: UNAVAILABLE)
+        
+        response = client.post('/api/payments/pay', json={'order_id': test_order}, headers=auth_headers)
+        
+        assert response.status_code == 202
+        entry = QueuedStkPush.query.get(response.get_json()['queued_id'])
+        assert entry.status == 'queued'
+        assert entry.phone_number == '+254700000001'
+        assert Payment.query.count() == 0
+
+    def test_pay_again_reuses_queued_push(self, client, test_order, auth_headers, monkeypatch):
+        calls = []
+        
+        def initiate(*args):
+            calls.append(args)
+            return UNAVAILABLE
+        
+        monkeypatch.setattr('routes.payments.initiate_stk_push', initiate)
+        
+        first = client.post('/api/payments/pay', json={'order_id': test_order}, headers=auth_headers)
+        second = client.post('/api/payments/pay', json={'order_id': test_order}, headers=auth_headers)
+        
+        assert second.status_code == 202
+        assert second.get_json()['queued_id'] == first.get_json()['queued_id']
+        assert QueuedStkPush.query.count() == 1
+        assert len(calls) == 1
+
+    def test_one_pending_push_per_order(self, app, test_order, test_customer):
+        from sqlalchemy.exc import IntegrityError
+        for _ in range(2):
+            db.session.add(QueuedStkPush(order_id=test_order, user_id=test_customer, phone_number='+254700000001', amount=150.0))
+        
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_claimed_push_is_not_sent_again(self, app, test_order, test_customer, monkeypatch):
+        from services.mpesa_service import queue_stk_push, retry_queued_stk_pushes
+        entry = queue_stk_push(ParcelOrder.query.get(test_order), test_customer, '+254700000001')
+        sent = []
+        
+        def initiate(*args):
+            sent.append(args)
+            # An overlapping run starts while this one waits on M-Pesa
+            assert retry_queued_stk_pushes() == {"sent": 0, "retrying": 0, "failed": 0}
+            return ACCEPTED
+        
+        monkeypatch.setattr('services.mpesa_service.initiate_stk_push', initiate)
+        
+        assert retry_queued_stk_pushes() == {"sent": 1, "retrying": 0, "failed": 0}
+        assert len(sent) == 1
+        assert db.session.get(QueuedStkPush, entry.id).status == 'sent'
+
+    def test_stale_claim_fails_without_resending(self, app, test_order, test_customer, monkeypatch):
+        from datetime import datetime, timedelta
+        from services.mpesa_service import queue_stk_push, retry_queued_stk_pushes
+        entry = queue_stk_push(ParcelOrder.query.get(test_order), test_customer, '+254700000001')
+        entry.status = 'sending'
+        db.session.commit()
+        entry.updated_at = datetime.utcnow() - timedelta(minutes=11)
+        db.session.commit()
+        monkeypatch.setattr('services.mpesa_service.initiate_stk_push', lambda *args: pytest.fail('resent'))
+        
+        assert retry_queued_stk_pushes() == {"sent": 0, "retrying": 0, "failed": 1}
+        assert db.session.get(QueuedStkPush, entry.id).status == 'failed'
+
+    def test_retry_sends_queued_push(self, runner, test_order, test_customer, monkeypatch):
+        order = ParcelOrder.query.get(test_order)
+        from services.mpesa_service import queue_stk_push
+        queue_stk_push(order, test_customer, '+254700000001')
+        monkeypatch.setattr('services.mpesa_service.initiate_stk_push', lambda *args: ACCEPTED)
+        
+        result = runner.invoke(args=['payments', 'retry-queued'])
+        
+        assert 'Sent: 1' in result.output
+        assert QueuedStkPush.query.one().status == 'sent'
+        assert Payment.query.one().transaction_id == 'ws_CO_123'
+        assert Notification.query.filter_by(type='payment_requested').count() == 1
+
+    def test_retry_backs_off_then_fails(self, app, test_order, test_customer, monkeypatch):
+        from services.mpesa_service import queue_stk_push, retry_queued_stk_pushes
+        entry = queue_stk_push(ParcelOrder.query.get(test_order), test_customer, '+254700000001')
+        monkeypatch.setattr('services.mpesa_service.initiate_stk_push', lambda *args: UNAVAILABLE)
+        
+        assert retry_queued_stk_pushes(max_attempts=2) == {"sent": 0, "retrying": 1, "failed": 0}
+        # Not due again until the backoff has passed
+        assert retry_queued_stk_pushes(max_attempts=2) == {"sent": 0, "retrying": 0, "failed": 0}
+        
+        from datetime import datetime
+        entry.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert retry_queued_stk_pushes(max_attempts=2) == {"sent": 0, "retrying": 0, "failed": 1}
+        assert Notification.query.filter_by(type='payment_failed').count() == 1
+
+
+def callback(client, checkout_request_id, result_code):
+    return client.post('/api/payments/callback', json={
+        "Body": {"stkCallback": {"ResultCode": result_code, "CheckoutRequestID": checkout_request_id, "ResultDesc": "Test"}}
+    })
+
+
+class TestPaymentStatus:
+    def test_follows_pay_and_callback(self, client, test_order, auth_headers, monkeypatch):
+        monkeypatch.setattr('routes.payments.initiate_stk_push', lambda *args: ACCEPTED)
+        
+        client.post('/api/payments/pay', json={'order_id': test_order}, headers=auth_headers)
+        assert db.session.get(ParcelOrder, test_order).payment_status == 'pending'
+        
+        assert callback(client, 'ws_CO_123', 0).status_code == 200
+        db.session.expire_all()
+        assert db.session.get(ParcelOrder, test_order).payment_status == 'completed'
+        
+        response = client.get('/api/orders?payment_status=completed', headers=auth_headers)
+        assert [order['id'] for order in response.get_json()['orders']] == [test_order]
+        response = client.get('/api/orders?payment_status=pending', headers=auth_headers)
+        assert response.get_json()['orders'] == []
+
+    def test_late_failure_of_older_attempt_is_ignored(self, client, test_order, auth_headers, monkeypatch):
+        responses = iter([ACCEPTED, {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_456"}])
+        monkeypatch.setattr('routes.payments.initiate_stk_push', lambda *args: next(responses))
+        client.post('/api/payments/pay', json={'order_id': test_order}, headers=auth_headers)
+        client.post('/api/payments/pay', json={'order_id': test_order}, headers=auth_headers)
+        
+        callback(client, 'ws_CO_123', 1032)
+        db.session.expire_all()
+        assert db.session.get(ParcelOrder, test_order).payment_status == 'pending'
+        
+        callback(client, 'ws_CO_456', 1032)
+        db.session.expire_all()
+        assert db.session.get(ParcelOrder, test_order).payment_status == 'failed'
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import text
+from extensions import db
+from models import Notification, ParcelOrder, Payment, User
+from utils.location_store import TRACKED_STATUSES
+from utils.order_queries import order_listing
+
+
+def query_plan(query):
+    """The database's plan for `query` as one string"""
+    sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    if db.engine.dialect.name == 'postgresql':
+        # Tiny test tables would always be scanned; make the planner show what it would use at scale
+        with db.engine.connect() as conn:
+            conn.execute(text("SET enable_seqscan = off"))
+            return "\n".join(row[0] for row in conn.execute(text(f"EXPLAIN {sql}")))
+    return "\n".join(row[-1] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+def assert_uses_index(plan, table, index):
+    assert index in plan, plan
+    # A full scan is "SCAN <table>" on SQLite without an index, "Seq Scan" on PostgreSQL
+    assert f"Seq Scan on {table}" not in plan, plan
+    assert not any(line.strip() == f"SCAN {table}" for line in plan.splitlines()), plan
+
+
+HOT_QUERIES = {
+    "customer orders": (
+        lambda: order_listing(customer=True, courier=True)
+        .filter_by(customer_id=1).order_by(ParcelOrder.created_at.desc()).limit(10),
+        "parcel_orders", "ix_parcel_orders_customer_id_created_at"
+    ),
+    "courier orders": (
+        lambda: order_listing(customer=True).filter_by(courier_id=1).order_by(ParcelOrder.created_at.desc()),
+        "parcel_orders", "ix_parcel_orders_courier_id_status"
+    ),
+    "courier active orders": (
+        lambda: ParcelOrder.query.filter(ParcelOrder.courier_id == 1, ParcelOrder.status.in_(TRACKED_STATUSES)),
+        "parcel_orders", "ix_parcel_orders_courier_id_status"
+    ),
+    "orders by status": (
+        lambda: order_listing(customer=True, courier=True)
+        .filter_by(status='pending').order_by(ParcelOrder.created_at.desc()).limit(20),
+        "parcel_orders", "ix_parcel_orders_status_created_at"
+    ),
+    "orders by payment status": (
+        lambda: ParcelOrder.query.filter_by(payment_status='completed').order_by(ParcelOrder.created_at.desc()).limit(20),
+        "parcel_orders", "ix_parcel_orders_payment_status_created_at"
+    ),
+    "order payments": (
+        lambda: Payment.query.filter_by(order_id=1, status='completed'),
+        "payments", "ix_payments_order_id_status"
+    ),
+    "admin orders page": (
+        lambda: order_listing(customer=True, courier=True)
+        .order_by(ParcelOrder.created_at.desc(), ParcelOrder.id.desc()).limit(21),
+        "parcel_orders", "ix_parcel_orders_created_at_id"
+    ),
+    "admin users page": (
+        lambda: User.query.order_by(User.created_at.desc(), User.id.desc()).limit(21),
+        "users", "ix_users_created_at_id"
+    ),
+    "notification feed": (
+        lambda: Notification.query.filter_by(user_id=1)
+        .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(20),
+        "notifications", "ix_notifications_user_id_created_at_id"
+    ),
+}
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+    def test_hot_query_uses_index(self, app, name):
+        build, table, index = HOT_QUERIES[name]
+
+        assert_uses_index(query_plan(build()), table, index)
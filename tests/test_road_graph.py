@@ -0,0 +1,112 @@
+import math
+import pytest
+from utils.road_graph import RoadGraph, build_from_osm
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="-1.2800" lon="36.8100"/>
+  <node id="2" lat="-1.2800" lon="36.8200"/>
+  <node id="3" lat="-1.2900" lon="36.8200"/>
+  <node id="4" lat="-1.2900" lon="36.8100"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="primary"/>
+  </way>
+  <way id="11">
+    <nd ref="3"/><nd ref="4"/><nd ref="1"/>
+    <tag k="highway" v="residential"/>
+    <tag k="oneway" v="yes"/>
+  </way>
+  <way id="12">
+    <nd ref="1"/><nd ref="3"/>
+    <tag k="highway" v="footway"/>
+  </way>
+</osm>
+"""
+
+
+@pytest.fixture
+def grid_graph():
+    # 10 x 10 grid of 2-way streets ~110 m apart, with one fast avenue along row 0
+    size = 10
+    lat, lng, edges = [], [], []
+    for row in range(size):
+        for col in range(size):
+            lat.append(-1.28 - row * 0.001)
+            lng.append(36.81 + col * 0.001)
+    for row in range(size):
+        for col in range(size):
+            node = row * size + col
+            for other in ((node + 1) if col + 1 < size else None, (node + size) if row + 1 < size else None):
+                if other is None:
+                    continue
+                speed = 20.0 if row == 0 and other == node + 1 else 5.0
+                edges.append((node, other, 111.0, 111.0 / speed))
+                edges.append((other, node, 111.0, 111.0 / speed))
+    return RoadGraph.from_edges(lat, lng, edges)
+
+
+class TestRoadGraph:
+    def test_route_matches_one_to_many(self, grid_graph):
+        for source, target in ((0, 99), (45, 9), (90, 0), (37, 62)):
+            expected = grid_graph.one_to_many(source, [target])[0]
+            result = grid_graph.route(source, target)
+            assert result[1] == pytest.approx(expected[1])
+            assert result[0] == pytest.approx(expected[0])
+
+    def test_route_prefers_fast_road(self, grid_graph):
+        # Going along row 0 is faster than any detour
+        distance_m, duration_s = grid_graph.route(0, 9)
+        assert distance_m == pytest.approx(9 * 111.0)
+        assert duration_s == pytest.approx(9 * 111.0 / 20.0)
+
+    def test_matrix(self, grid_graph):
+        origins = [(-1.28, 36.81), (-1.289, 36.819)]
+        destinations = [(-1.28, 36.819), (-1.289, 36.81), (10.0, 10.0)]
+        distances, durations = grid_graph.matrix(origins, destinations)
+        
+        assert distances.shape == (2, 3)
+        assert distances[0, 0] == pytest.approx(9 * 111.0, rel=0.01)
+        assert math.isnan(distances[0, 2])
+
+    def test_hierarchy_matches_dijkstra(self, grid_graph):
+        hierarchy = grid_graph.contract()
+        assert hierarchy.has_hierarchy
+        
+        sources, targets = [0, 37, 99, 50], [9, 62, 0, 55, 90]
+        rows = hierarchy.many_to_many(sources, targets)
+        for source, row in zip(sources, rows):
+            expected = grid_graph.one_to_many(source, targets)
+            for result, reference in zip(row, expected):
+                assert result == pytest.approx(reference)
+            assert hierarchy.route(source, targets[1]) == pytest.approx(expected[1])
+
+    def test_save_and_memory_map(self, grid_graph, tmp_path):
+        hierarchy = grid_graph.contract()
+        hierarchy.save(str(tmp_path))
+        loaded = RoadGraph.load(str(tmp_path))
+        
+        assert loaded.has_hierarchy
+        assert loaded.route(0, 99) == pytest.approx(grid_graph.route(0, 99))
+
+    def test_local_provider(self, app, grid_graph, tmp_path, monkeypatch):
+        import utils.road_graph
+        from utils import get_distance_matrix
+        grid_graph.contract().save(str(tmp_path))
+        monkeypatch.setenv('ROAD_GRAPH_PATH', str(tmp_path))
+        monkeypatch.setattr(utils.road_graph, '_road_graph_path', None)
+        
+        distance, duration = get_distance_matrix((-1.28, 36.81), (-1.28, 36.819), provider='local')
+        
+        assert distance == pytest.approx(9 * 0.111, rel=0.01)
+
+    def test_build_from_osm(self, tmp_path):
+        path = tmp_path / "extract.osm"
+        path.write_text(OSM_EXTRACT)
+        graph = build_from_osm(str(path))
+        
+        # Footway ignored, residential way one-way
+        assert graph.num_nodes == 4
+        assert len(graph.indices) == 4 + 2
+        assert graph.point_to_point((-1.28, 36.81), (-1.29, 36.81))[0] > 2000
+        assert graph.point_to_point((-1.29, 36.81), (-1.28, 36.81))[0] < 1200
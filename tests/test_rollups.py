@@ -0,0 +1,135 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+from extensions import db
+from models import DailyOrderRollup, ParcelOrder
+from utils.rollups import backfill_rollups, refresh_rollups
+
+LONG_AGO = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def make_order(make_order):
+    def make(customer_id, created_at, status='pending', price=50.0, distance=5.0, courier_id=None):
+        # An old updated_at keeps the order out of later incremental refreshes until it changes
+        return make_order(customer_id, status, price, courier_id, created_at=created_at, distance=distance, updated_at=LONG_AGO)
+    return make
+
+
+def stored():
+    db.session.expire_all()
+    return {
+        (rollup.day, rollup.status): (rollup.order_count, rollup.revenue, rollup.distance_km, rollup.courier_count)
+        for rollup in DailyOrderRollup.query.all()
+    }
+
+
+def direct():
+    day = func.date(ParcelOrder.created_at)
+    return {
+        (date.fromisoformat(row[0]), row[1]): tuple(row[2:])
+        for row in db.session.query(
+            day,
+            ParcelOrder.status,
+            func.count(ParcelOrder.id),
+            func.sum(ParcelOrder.price),
+            func.sum(ParcelOrder.distance),
+            func.count(func.distinct(ParcelOrder.courier_id))
+        ).group_by(day, ParcelOrder.status)
+    }
+
+
+class TestRollups:
+    def test_backfill_matches_orders(self, app, test_customer, test_courier, make_order):
+        make_order(test_customer, datetime(2026, 3, 1, 9), 'delivered', 80.0, 4.0, test_courier)
+        make_order(test_customer, datetime(2026, 3, 1, 23, 59), 'delivered', 20.0, 1.5, test_courier)
+        make_order(test_customer, datetime(2026, 3, 1, 12), 'pending', 30.0)
+        make_order(test_customer, datetime(2026, 3, 5, 0, 0), 'cancelled', 10.0)
+        make_order(test_customer, datetime(2026, 4, 20, 8), 'delivered', 60.0, 7.0, test_courier)
+
+        days = backfill_rollups(chunk_days=7)
+
+        assert days[0] == date(2026, 3, 1) and days[-1] == date(2026, 4, 20)
+        assert stored() == direct()
+        assert stored()[(date(2026, 3, 1), 'delivered')] == (2, 100.0, 5.5, 1)
+
+    def test_refresh_only_touches_changed_days(self, app, test_customer, make_order):
+        first = make_order(test_customer, datetime(2026, 3, 1, 9))
+        make_order(test_customer, datetime(2026, 3, 2, 9))
+        make_order(test_customer, datetime(2026, 3, 9, 9))
+        backfill_rollups()
+
+        first.status = 'delivered'
+        db.session.commit()
+        make_order(test_customer, datetime(2026, 3, 9, 15), 'cancelled').updated_at = datetime.utcnow()
+        db.session.commit()
+        # Nothing else changed, so the other day is left alone
+        db.session.query(DailyOrderRollup).filter_by(day=date(2026, 3, 2)).update({"order_count": 99})
+        db.session.commit()
+
+        assert refresh_rollups() == [date(2026, 3, 1), date(2026, 3, 9)]
+        rollups = stored()
+        assert rollups[(date(2026, 3, 1), 'delivered')][0] == 1
+        assert (date(2026, 3, 1), 'pending') not in rollups
+        assert rollups[(date(2026, 3, 9), 'cancelled')][0] == 1
+        assert rollups[(date(2026, 3, 2), 'pending')][0] == 99
+
+    def test_first_refresh_backfills(self, app, test_customer, make_order):
+        make_order(test_customer, datetime(2026, 3, 1, 9))
+        make_order(test_customer, datetime(2026, 3, 3, 9))
+
+        assert refresh_rollups() == [date(2026, 3, 1), date(2026, 3, 2), date(2026, 3, 3)]
+        assert stored() == direct()
+        # Nothing changed since
+        assert refresh_rollups() == []
+
+
+class TestReports:
+    def test_range_from_rollups(self, client, admin_auth_headers, test_customer, test_courier, make_order):
+        with client.application.app_context():
+            make_order(test_customer, datetime(2026, 3, 1, 9), 'delivered', 80.0, 4.0, test_courier)
+            make_order(test_customer, datetime(2026, 3, 3, 9), 'delivered', 20.0, 2.0, test_courier)
+            make_order(test_customer, datetime(2026, 3, 3, 10), 'pending', 30.0, 3.0)
+            make_order(test_customer, datetime(2026, 5, 1, 9), 'delivered', 500.0, 9.0, test_courier)
+            refresh_rollups()
+
+        response = client.get('/api/admin/reports?from=2026-03-01&to=2026-03-04', headers=admin_auth_headers)
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [day['date'] for day in data['revenue_trends']] == ['2026-03-01', '2026-03-02', '2026-03-03', '2026-03-04']
+        assert [day['revenue'] for day in data['revenue_trends']] == [80.0, 0.0, 20.0, 0.0]
+        # All orders, whatever the range
+        assert data['status_distribution'] == [{"name": "delivered", "value": 3}, {"name": "pending", "value": 1}]
+        assert data['range_status_distribution'] == [{"name": "delivered", "value": 2}, {"name": "pending", "value": 1}]
+        assert data['summary'] == {"orders": 3, "revenue": 100.0, "distance_km": 9.0}
+        # Deliveries in the range only
+        assert data['top_couriers'][0]['deliveries'] == 2
+
+    def test_reads_do_not_refresh(self, client, runner, admin_auth_headers, test_customer, make_order):
+        url = '/api/admin/reports?from=2026-03-01&to=2026-03-01'
+        with client.application.app_context():
+            refresh_rollups()
+            make_order(test_customer, datetime(2026, 3, 1, 9)).updated_at = datetime.utcnow()
+            db.session.commit()
+
+        assert client.get(url, headers=admin_auth_headers).get_json()['summary']['orders'] == 0
+
+        result = runner.invoke(args=['admin', 'refresh-rollups'])
+        assert result.exit_code == 0
+
+        assert client.get(url, headers=admin_auth_headers).get_json()['summary']['orders'] == 1
+
+    @pytest.mark.parametrize('query', ['from=2026-13-01', 'to=yesterday', 'from=2026-03-05&to=2026-03-01'])
+    def test_bad_range(self, client, admin_auth_headers, query):
+        response = client.get(f'/api/admin/reports?{query}', headers=admin_auth_headers)
+
+        assert response.status_code == 400
+
+    def test_default_range_is_last_30_days(self, client, admin_auth_headers):
+        data = client.get('/api/admin/reports', headers=admin_auth_headers).get_json()
+
+        assert len(data['revenue_trends']) == 30
+        assert data['to'] == datetime.utcnow().date().isoformat()
+        assert data['from'] == (datetime.utcnow().date() - timedelta(days=29)).isoformat()
@@ -0,0 +1,143 @@
+import itertools
+import threading
+import time
+import numpy as np
+import pytest
+import utils
+from extensions import db
+from models import ParcelOrder
+from utils.route_planner import MAX_ROUTE_STOPS, plan_route, route_cost
+
+
+def random_instance(rng, orders):
+    n = 1 + 2 * orders
+    points = rng.random((n, 2))
+    cost = np.linalg.norm(points[:, None] - points[None], axis=2)
+    pairs = [(1 + 2 * i, 2 + 2 * i) for i in range(orders)]
+    return cost, pairs
+
+
+def respects_precedence(route, pairs):
+    position = {node: index for index, node in enumerate(route)}
+    return all(position[pickup] < position[drop] for pickup, drop in pairs)
+
+
+class TestPlanRoute:
+    def test_valid_and_close_to_optimal(self):
+        rng = np.random.default_rng(5)
+        for _ in range(50):
+            cost, pairs = random_instance(rng, 3)
+            
+            route = plan_route(cost, pairs)
+            
+            assert route[0] == 0 and sorted(route) == list(range(7))
+            assert respects_precedence(route, pairs)
+            best = min(
+                route_cost([0] + list(p), cost)
+                for p in itertools.permutations(range(1, 7))
+                if respects_precedence([0] + list(p), pairs)
+            )
+            assert route_cost(route, cost) <= best * 1.15
+
+    def test_improves_on_nearest_neighbour(self):
+        from utils.route_planner import nearest_neighbour
+        rng = np.random.default_rng(11)
+        cost, pairs = random_instance(rng, 10)
+        
+        greedy = nearest_neighbour(cost, 0, {drop: pickup for pickup, drop in pairs})
+        route = plan_route(cost, pairs, time_budget=1)
+        
+        assert route_cost(route, cost) <= route_cost(greedy, cost)
+        assert respects_precedence(route, pairs)
+
+    def test_twenty_stops_well_under_100ms(self):
+        cost, pairs = random_instance(np.random.default_rng(1), 10)
+        
+        started = time.perf_counter()
+        plan_route(cost, pairs, time_budget=1)
+        
+        assert time.perf_counter() - started < 0.05
+
+
+class TestCourierRoute:
+    def test_route_for_active_orders(self, client, app, test_customer, test_courier, courier_auth_headers, monkeypatch):
+        monkeypatch.setenv('DISTANCE_PROVIDER', 'offline')
+        for status, offset in (('assigned', 0.0), ('in_transit', 0.01), ('delivered', 0.02)):
+            db.session.add(ParcelOrder(
+                customer_id=test_customer,
+                courier_id=test_courier,
+                parcel_name='Test Package',
+                weight=1.0,
+                weight_category='small',
+                pickup_address='Pickup',
+                pickup_lat=-1.28 - offset,
+                pickup_lng=36.81,
+                destination_address='Drop-off',
+                destination_lat=-1.30 - offset,
+                destination_lng=36.83,
+                price=50.0,
+                status=status
+            ))
+        db.session.commit()
+        
+        response = client.get('/api/courier/route?lat=-1.28&lng=36.81', headers=courier_auth_headers)
+        
+        data = response.get_json()
+        assert response.status_code == 200
+        # Pickup and drop-off of the assigned order, drop-off of the one in transit
+        assert [stop['type'] for stop in data['stops']].count('pickup') == 1
+        assert len(data['stops']) == 3
+        kinds = [(stop['order_id'], stop['type']) for stop in data['stops']]
+        pickup = next(i for i, (_, kind) in enumerate(kinds) if kind == 'pickup')
+        assert kinds.index((kinds[pickup][0], 'dropoff')) > pickup
+        etas = [stop['eta_seconds'] for stop in data['stops']]
+        assert etas == sorted(etas)
+        assert data['total_duration_s'] == etas[-1]
+
+    def test_slow_matrix_falls_back_to_estimate(self, client, app, test_customer, test_courier, courier_auth_headers, make_order, monkeypatch):
+        make_order(
+            test_customer, 'assigned', courier_id=test_courier,
+            pickup_lat=-1.28, pickup_lng=36.81, destination_lat=-1.30, destination_lng=36.83
+        )
+        release = threading.Event()
+        providers = []
+        get_distance_matrix_batch = utils.get_distance_matrix_batch
+        
+        def slow_matrix(origins, destinations, provider=None):
+            providers.append(provider)
+            if provider is None:
+                release.wait(5)
+            return get_distance_matrix_batch(origins, destinations, provider='offline')
+        
+        monkeypatch.setattr(utils, 'get_distance_matrix_batch', slow_matrix)
+        monkeypatch.setenv('ROUTE_MATRIX_TIMEOUT', '0.1')
+        try:
+            started = time.perf_counter()
+            response = client.get('/api/courier/route?lat=-1.28&lng=36.81', headers=courier_auth_headers)
+            elapsed = time.perf_counter() - started
+        finally:
+            release.set()
+        
+        assert response.status_code == 200
+        assert len(response.get_json()['stops']) == 2
+        assert providers == [None, 'offline']
+        assert elapsed < 2
+
+    def test_stops_are_capped(self, client, app, test_customer, test_courier, courier_auth_headers, make_order, monkeypatch):
+        monkeypatch.setenv('DISTANCE_PROVIDER', 'offline')
+        for index in range(MAX_ROUTE_STOPS // 2 + 1):
+            make_order(
+                test_customer, 'assigned', courier_id=test_courier,
+                pickup_lat=-1.28 - index * 0.01, pickup_lng=36.81,
+                destination_lat=-1.30 - index * 0.01, destination_lng=36.83
+            )
+        
+        data = client.get('/api/courier/route?lat=-1.28&lng=36.81', headers=courier_auth_headers).get_json()
+        
+        assert len(data['stops']) == MAX_ROUTE_STOPS
+        assert len(data['unrouted_order_ids']) == 1
+
+    def test_courier_only(self, client, test_customer, auth_headers):
+        response = client.get('/api/courier/route', headers=auth_headers)
+        
+        assert response.status_code == 403
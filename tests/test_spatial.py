@@ -0,0 +1,49 @@
+import random
+import pytest
+from utils.geo import haversine_km
+from utils.spatial import GridIndex
+
+
+def brute_force(points, lat, lng, k, max_km):
+    found = sorted(
+        (haversine_km((lat, lng), point), key)
+        for key, point in points.items()
+        if haversine_km((lat, lng), point) <= max_km
+    )
+    return [key for _, key in found[:k]]
+
+
+class TestGridIndex:
+    @pytest.mark.parametrize('count', [20, 2000])
+    def test_matches_brute_force(self, count):
+        rng = random.Random(count)
+        index = GridIndex(cell_size=0.01)
+        points = {}
+        for key in range(count):
+            points[key] = (-1.29 + rng.uniform(-0.2, 0.2), 36.82 + rng.uniform(-0.2, 0.2))
+            index.update(key, *points[key])
+        
+        for _ in range(25):
+            lat, lng = -1.29 + rng.uniform(-0.25, 0.25), 36.82 + rng.uniform(-0.25, 0.25)
+            result = [key for _, key, _ in index.nearest(lat, lng, k=5, max_km=30)]
+            assert result == brute_force(points, lat, lng, 5, 30)
+
+    def test_update_moves_point(self):
+        index = GridIndex()
+        index.update('a', -1.29, 36.82)
+        index.update('a', -1.50, 37.00)
+        
+        assert index.nearest(-1.29, 36.82, k=1, max_km=1) == []
+        assert index.nearest(-1.50, 37.00, k=1, max_km=1)[0][1] == 'a'
+        assert len(index) == 1
+
+    def test_remove_and_filter(self):
+        index = GridIndex()
+        index.update('a', -1.29, 36.82, data='stale')
+        index.update('b', -1.30, 36.82, data='fresh')
+        index.update('c', -1.31, 36.82, data='fresh')
+        index.remove('c')
+        
+        result = index.nearest(-1.29, 36.82, k=5, where=lambda key, data: data == 'fresh')
+        
+        assert [key for _, key, _ in result] == ['b']
@@ -0,0 +1,118 @@
+import pytest
+from sqlalchemy import event
+from extensions import db
+from models import ParcelOrder, StatsCounter, User
+from utils.stats import compute_stats, read_stats, rebuild_stats
+
+
+def stored():
+    db.session.expire_all()
+    return dict(db.session.query(StatsCounter.name, StatsCounter.value).all())
+
+
+class TestStatsCounters:
+    def test_rebuild_matches_tables(self, app, test_customer, test_courier, test_admin, make_order):
+        make_order(test_customer, 'delivered', 80.0)
+        make_order(test_customer, 'pending', 20.0)
+        
+        values = rebuild_stats()
+        
+        assert values['users'] == 3
+        assert values['users.courier'] == 1
+        assert values['orders'] == 2
+        assert values['orders.delivered'] == 1
+        assert values['revenue'] == 80.0
+        assert stored() == values
+
+    def test_kept_in_step_with_changes(self, app, test_customer, test_courier, make_order):
+        rebuild_stats()
+        
+        order = make_order(test_customer)
+        order.status = 'in_transit'
+        db.session.commit()
+        order.price = 70.0
+        db.session.commit()
+        cancelled = make_order(test_customer, 'delivered', 30.0)
+        cancelled.status = 'cancelled'
+        db.session.commit()
+        db.session.delete(cancelled)
+        user = db.session.get(User, test_courier)
+        user.role = 'admin'
+        db.session.commit()
+        
+        assert stored() == compute_stats()
+        assert stored()['revenue'] == 70.0
+
+    def test_rolled_back_changes_are_not_counted(self, app, test_customer):
+        rebuild_stats()
+        order = ParcelOrder(
+            customer_id=test_customer,
+            parcel_name='Test Package',
+            weight=1.0,
+            weight_category='small',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            price=10.0
+        )
+        db.session.add(order)
+        db.session.flush()
+        db.session.rollback()
+        
+        assert stored()['orders'] == 0
+        assert stored() == compute_stats()
+
+    def test_missing_counter_row_is_created(self, app, test_customer, make_order):
+        rebuild_stats()
+        db.session.query(StatsCounter).filter_by(name='orders.delivered').delete()
+        db.session.commit()
+        
+        make_order(test_customer, 'delivered', 40.0)
+        
+        assert stored()['orders.delivered'] == 1
+        assert stored() == compute_stats()
+
+    def test_bulk_updates_need_a_rebuild(self, app, test_customer, make_order):
+        rebuild_stats()
+        make_order(test_customer, 'pending')
+        
+        # Bulk writes skip the ORM flush, so the counters only catch up on rebuild_stats()
+        ParcelOrder.query.filter_by(status='pending').update({'status': 'cancelled'})
+        db.session.commit()
+        assert stored()['orders.pending'] == 1
+        
+        rebuild_stats()
+        assert stored()['orders.pending'] == 0
+        assert stored()['orders.cancelled'] == 1
+
+    def test_read_builds_missing_counters(self, app, test_customer, make_order):
+        make_order(test_customer)
+        
+        assert read_stats()['orders.pending'] == 1
+        assert StatsCounter.query.count() > 0
+
+    def test_dashboard_queries(self, client, app, test_admin, test_customer, test_courier, admin_auth_headers, make_order):
+        for _ in range(5):
+            order = make_order(test_customer, 'delivered', 10.0)
+            order.courier_id = test_courier
+        db.session.commit()
+        rebuild_stats()
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db.engine, 'before_cursor_execute', record)
+        response = client.get('/api/admin/dashboard', headers=admin_auth_headers)
+        event.remove(db.engine, 'before_cursor_execute', record)
+        
+        stats = response.get_json()['stats']
+        assert stats['delivered_orders'] == 5
+        assert stats['total_revenue'] == 50.0
+        assert response.get_json()['recent_orders'][0]['courier_name'] == 'Test Courier'
+        # The admin check, the counters and the recent orders
+        assert len(statements) == 3
+
+    def test_rebuild_command(self, runner, test_customer):
+        result = runner.invoke(args=['admin', 'rebuild-stats'])
+        
+        assert '1 users' in result.output
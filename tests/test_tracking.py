@@ -0,0 +1,182 @@
+import json
+import socket
+import threading
+import time
+import pytest
+from multiprocessing.connection import Client
+from utils import pubsub
+from utils.pubsub import LocalBroker, RemoteBroker, run_broker, get_broker, order_channel
+
+
+def read_event(chunks):
+    """Next `event:` message from an SSE body, skipping comments and retry hints"""
+    for chunk in chunks:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event:'):
+            name, data = chunk.strip().split('\n')
+            return name[len('event: '):], json.loads(data[len('data: '):])
+    return None, None
+
+
+class TestPubSub:
+    def test_local_publish(self):
+        broker = LocalBroker()
+        
+        with broker.subscribe('order:1') as subscription:
+            assert broker.publish('order:1', {'status': 'picked_up'}) == 1
+            assert broker.publish('order:2', {'status': 'delivered'}) == 0
+            assert subscription.get(timeout=1) == {'status': 'picked_up'}
+            assert subscription.get(timeout=0.01) is None
+        
+        assert not broker.has_subscribers('order:1')
+
+    def test_slow_subscriber_keeps_latest(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe('order:1')
+        
+        for i in range(150):
+            broker.publish('order:1', i)
+        
+        assert subscription.get(timeout=0) == 50
+        subscription.close()
+
+    def test_remote_broker_between_processes(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        address = sock.getsockname()
+        sock.close()
+        threading.Thread(target=run_broker, args=(address, b'secret'), daemon=True).start()
+        time.sleep(0.2)
+        
+        # Two brokers stand in for two web workers
+        publisher = RemoteBroker(address, b'secret')
+        subscriber = RemoteBroker(address, b'secret')
+        with subscriber.subscribe('order:1') as subscription:
+            time.sleep(0.2)
+            publisher.publish('order:1', {'status': 'in_transit'})
+            assert subscription.get(timeout=2) == {'status': 'in_transit'}
+
+    def test_remote_broker_unavailable(self):
+        broker = RemoteBroker(('127.0.0.1', 1), b'secret')
+        
+        assert broker.publish('order:1', {}) == 0
+
+    def test_stalled_handshake_does_not_block_broker(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        address = sock.getsockname()
+        sock.close()
+        threading.Thread(target=run_broker, args=(address, b'secret'), daemon=True).start()
+        time.sleep(0.2)
+        
+        # Connects but never answers the challenge
+        stalled = socket.create_connection(address)
+        with pytest.raises(Exception):
+            Client(address, authkey=b'wrong')
+        
+        publisher = RemoteBroker(address, b'secret')
+        subscriber = RemoteBroker(address, b'secret')
+        with subscriber.subscribe('order:1') as subscription:
+            time.sleep(0.2)
+            publisher.publish('order:1', {'status': 'in_transit'})
+            assert subscription.get(timeout=2) == {'status': 'in_transit'}
+        stalled.close()
+
+    @pytest.mark.parametrize('authkey', [None, '', 'deliveroo'])
+    def test_remote_broker_requires_authkey(self, monkeypatch, authkey):
+        monkeypatch.setattr(pubsub, '_broker', None)
+        monkeypatch.setenv('PUBSUB_BROKER_ADDRESS', '127.0.0.1:6150')
+        if authkey is None:
+            monkeypatch.delenv('PUBSUB_AUTHKEY', raising=False)
+        else:
+            monkeypatch.setenv('PUBSUB_AUTHKEY', authkey)
+        
+        with pytest.raises(RuntimeError):
+            get_broker()
+
+    def test_broker_command_requires_authkey(self, runner, monkeypatch):
+        monkeypatch.delenv('PUBSUB_AUTHKEY', raising=False)
+        
+        result = runner.invoke(args=['pubsub', 'broker'])
+        
+        assert result.exit_code != 0
+        assert 'PUBSUB_AUTHKEY' in result.output
+
+    def test_broker_binds_to_localhost_by_default(self, monkeypatch):
+        monkeypatch.delenv('PUBSUB_BIND_ADDRESS', raising=False)
+        monkeypatch.setenv('PUBSUB_BROKER_ADDRESS', '10.0.0.5:7000')
+        
+        assert pubsub.bind_address(None, 'PUBSUB_BIND_ADDRESS', 'PUBSUB_BROKER_ADDRESS', 6150) == ('127.0.0.1', 7000)
+        assert pubsub.bind_address('0.0.0.0:6150', 'PUBSUB_BIND_ADDRESS', 'PUBSUB_BROKER_ADDRESS', 6150) == ('0.0.0.0', 6150)
+
+
+class TestOrderStream:
+    @pytest.fixture(autouse=True)
+    def short_stream(self, monkeypatch):
+        # A missed update ends the stream quickly instead of hanging the test
+        monkeypatch.setenv('SSE_KEEPALIVE_SECONDS', '1')
+        monkeypatch.setenv('SSE_MAX_SECONDS', '5')
+        monkeypatch.setattr('routes.orders.stream_slots', threading.BoundedSemaphore(2))
+
+    def test_snapshot_then_updates(self, app, client, test_customer, test_courier, auth_headers, courier_auth_headers, make_order):
+        order_id = make_order(test_customer, 'assigned', courier_id=test_courier).id
+        
+        response = client.get(f'/api/orders/{order_id}/stream', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        chunks = iter(response.response)
+        
+        name, data = read_event(chunks)
+        assert name == 'snapshot'
+        assert data['status'] == 'assigned'
+        
+        client.patch(f'/api/courier/orders/{order_id}/location', json={
+            'lat': -1.286389,
+            'lng': 36.817223
+        }, headers=courier_auth_headers)
+        name, data = read_event(chunks)
+        assert name == 'location'
+        assert data['current_lat'] == -1.286389
+        
+        client.patch(f'/api/courier/orders/{order_id}/status', json={'status': 'picked_up'}, headers=courier_auth_headers)
+        name, data = read_event(chunks)
+        assert name == 'status'
+        assert data['status'] == 'picked_up'
+        response.close()
+        
+        assert not get_broker().has_subscribers(order_channel(order_id))
+
+    def test_token_in_query_string(self, client, test_customer, auth_headers, make_order):
+        order_id = make_order(test_customer, 'delivered').id
+        token = auth_headers['Authorization'].split()[1]
+        
+        response = client.get(f'/api/orders/{order_id}/stream?jwt={token}')
+        
+        assert response.status_code == 200
+        # A finished order sends its snapshot and ends the stream
+        assert read_event(iter(response.response))[1]['status'] == 'delivered'
+
+    def test_streams_per_process_are_capped(self, client, test_customer, auth_headers, make_order):
+        order_id = make_order(test_customer, 'assigned').id
+        url = f'/api/orders/{order_id}/stream'
+        
+        open_streams = [client.get(url, headers=auth_headers) for _ in range(2)]
+        assert [r.status_code for r in open_streams] == [200, 200]
+        
+        rejected = client.get(url, headers=auth_headers)
+        assert rejected.status_code == 503
+        assert rejected.headers['Retry-After'] == '5'
+        
+        # Closing a stream that never sent anything still frees its slot
+        open_streams[0].close()
+        assert client.get(url, headers=auth_headers).status_code == 200
+        
+        for response in open_streams[1:]:
+            response.close()
+
+    def test_other_customer_denied(self, client, test_customer, test_courier, courier_auth_headers, make_order):
+        order_id = make_order(test_customer, 'assigned').id
+        
+        response = client.get(f'/api/orders/{order_id}/stream', headers=courier_auth_headers)
+        
+        assert response.status_code == 403
@@ -1,16 +1,72 @@
-import requests
 import os
+import numpy as np
+from datetime import datetime
+from urllib.parse import quote
+from sqlalchemy import Boolean, DateTime, Integer, String, Text, bindparam, case, event, insert, literal, update
+from sqlalchemy.orm import Session
 from flask_mail import Message
 from extensions import mail, db
-from models import Notification
+from models import Notification, User
+from services.http_client import http_client
+from utils.cache import geocode_cache, distance_cache
+from utils.geo import circuity_estimator
+from utils.road_graph import get_road_graph
 
+# Only used when an address can't be located at all
+DEFAULT_DISTANCE_KM = 5.0
 
 
-def get_distance_matrix(origin, destination):
-    """Get distance and duration using Mapbox Matrix API"""
+def get_distance_matrix(origin, destination, provider=None):
+    """Get distance (km) and duration text between two (lat, lng) points; see resolve_distance"""
+    distance, duration, _ = resolve_distance(origin, destination, provider)
+    return distance, duration
+
+
+def resolve_distance(origin, destination, provider=None):
+    """
+    Get distance (km), duration text and the source that answered ("mapbox",
+    "road_graph" or "estimate") between two (lat, lng) points.
+    Providers (DISTANCE_PROVIDER env var by default):
+    - "mapbox": Mapbox Matrix API only, (None, None) when it can't answer
+    - "local": self-hosted routing over the ROAD_GRAPH_PATH road graph only
+    - "fallback": Mapbox, then the local road graph if one is loaded, then
+      the offline estimate (default)
+    - "offline": offline estimate only, no network
+    """
+    provider = provider or os.environ.get('DISTANCE_PROVIDER', 'fallback')
+    
+    distance_meters, duration_seconds, source = None, None, None
+    if provider in ('mapbox', 'fallback'):
+        try:
+            distance_meters, duration_seconds = distance_cache.get_or_fetch(
+                origin, destination, _fetch_distance
+            )
+            source = 'mapbox'
+        except Exception as e:
+            print(f"Error getting distance: {e}")
+    
+    if distance_meters is None and provider in ('local', 'fallback'):
+        road_graph = get_road_graph()
+        if road_graph is not None:
+            distance_meters, duration_seconds = road_graph.point_to_point(origin, destination) or (None, None)
+            source = 'road_graph'
+    
+    if distance_meters is None and provider in ('offline', 'fallback'):
+        circuity_estimator.ensure_fitted()
+        distance_meters, duration_seconds = circuity_estimator.estimate(origin, destination)
+        source = 'estimate'
+    
+    if distance_meters is None:
+        return None, None, None
+    
+    return distance_meters / 1000.0, format_duration(duration_seconds), source
+
+
+def _fetch_distance(origin, destination):
+    """Get (meters, seconds) using Mapbox Matrix API (see DistanceCache.get_or_fetch)"""
     access_token = os.environ.get('MAPBOX_ACCESS_TOKEN')
     if not access_token:
-        return None, None
+        return None
     
     # Mapbox Matrix API: https://api.mapbox.com/directions-matrix/v1/mapbox/driving/{coordinates}
     # Coordinates format: lon,lat;lon,lat (semi-colon separated)
@@ -26,36 +82,172 @@ def get_distance_matrix(origin, destination):
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get('mapbox', url, params=params)
         data = response.json()
-        
-        if data.get("code") == "Ok" and data.get("distances"):
-            # specific requirement: "Use value (meters) for accuracy"
-            # Mapbox returns matrix: [[0, dist], [dist, 0]]
-            # We want from origin (0) to destination (1)
-            distance_meters = data["distances"][0][1]
-            duration_seconds = data["durations"][0][1]
-            
-            if distance_meters is None:
-                return None, None
-                
-            distance_km = distance_meters / 1000.0
-            
-            # Format duration text (e.g., "15 mins")
-            duration_minutes = round(duration_seconds / 60)
-            if duration_minutes >= 60:
-                hours = duration_minutes // 60
-                mins = duration_minutes % 60
-                duration_text = f"{hours} hrs {mins} mins"
-            else:
-                duration_text = f"{duration_minutes} mins"
-            
-            return distance_km, duration_text
-        
-        return None, None
     except Exception as e:
         print(f"Error getting distance: {e}")
+        return None
+    
+    if data.get("code") == "Ok" and data.get("distances"):
+        # specific requirement: "Use value (meters) for accuracy"
+        # Mapbox returns matrix: [[0, dist], [dist, 0]]
+        # We want from origin (0) to destination (1)
+        return data["distances"][0][1], data["durations"][0][1]
+    
+    if data.get("code") in ("NoRoute", "NoSegment"):
         return None, None
+    
+    return None
+
+
+# Mapbox Matrix API accepts at most 25 coordinates per request
+MAPBOX_MATRIX_MAX_COORDINATES = 25
+
+
+def get_distance_matrix_batch(origins, destinations, provider=None):
+    """
+    Distances (km) and durations (s) for every origin/destination pair.
+    Returns two NumPy arrays of shape (len(origins), len(destinations)), NaN
+    where no provider could answer. Providers and their order are the same as
+    get_distance_matrix; cached pairs are filled first and the rest is sent
+    to Mapbox in as few requests as possible.
+    """
+    provider = provider or os.environ.get('DISTANCE_PROVIDER', 'fallback')
+    origins = [(float(lat), float(lng)) for lat, lng in origins]
+    destinations = [(float(lat), float(lng)) for lat, lng in destinations]
+    distances = np.full((len(origins), len(destinations)), np.nan)
+    durations = np.full((len(origins), len(destinations)), np.nan)
+    if not origins or not destinations:
+        return distances, durations
+    
+    if provider in ('mapbox', 'fallback'):
+        keys = [
+            [distance_cache.key_for(origin, destination) for destination in destinations]
+            for origin in origins
+        ]
+        cached = distance_cache.lookup_many(key for row in keys for key in row)
+        # Pairs cached as unroutable aren't re-requested, only estimated below
+        missing = np.ones(distances.shape, dtype=bool)
+        for i, row in enumerate(keys):
+            for j, key in enumerate(row):
+                if key in cached:
+                    missing[i, j] = False
+                    if cached[key][0] is not None:
+                        distances[i, j], durations[i, j] = cached[key]
+        
+        try:
+            fetched = _fetch_distance_tiles(origins, destinations, missing)
+        except Exception as e:
+            print(f"Error getting distance matrix: {e}")
+            fetched = {}
+        
+        for (i, j), (distance_meters, duration_seconds) in fetched.items():
+            if distance_meters is not None:
+                distances[i, j], durations[i, j] = distance_meters, duration_seconds
+        distance_cache.fetches += len(fetched)
+        distance_cache.store_many({keys[i][j]: value for (i, j), value in fetched.items()})
+    
+    if provider in ('local', 'fallback') and np.isnan(distances).any():
+        road_graph = get_road_graph()
+        if road_graph is not None:
+            rows = sorted(set(np.nonzero(np.isnan(distances))[0].tolist()))
+            local_distances, local_durations = road_graph.matrix([origins[i] for i in rows], destinations)
+            for local_row, i in enumerate(rows):
+                gaps = np.isnan(distances[i])
+                distances[i, gaps] = local_distances[local_row, gaps]
+                durations[i, gaps] = local_durations[local_row, gaps]
+    
+    if provider in ('offline', 'fallback') and np.isnan(distances).any():
+        circuity_estimator.ensure_fitted()
+        estimated_distances, estimated_durations = circuity_estimator.estimate_matrix(origins, destinations)
+        gaps = np.isnan(distances)
+        distances[gaps] = estimated_distances[gaps]
+        durations[gaps] = estimated_durations[gaps]
+    
+    return distances / 1000.0, durations
+
+
+def _matrix_tile_shape(num_origins, num_destinations):
+    """Origins/destinations per Mapbox request that cover the matrix in the fewest requests"""
+    best = None
+    for per_request in range(1, MAPBOX_MATRIX_MAX_COORDINATES):
+        rows = min(per_request, num_origins)
+        cols = min(MAPBOX_MATRIX_MAX_COORDINATES - per_request, num_destinations)
+        requests_needed = -(-num_origins // rows) * -(-num_destinations // cols)
+        if best is None or requests_needed < best[0]:
+            best = (requests_needed, rows, cols)
+    return best[1], best[2]
+
+
+def _fetch_distance_tiles(origins, destinations, missing):
+    """
+    Fetch the pairs flagged in the `missing` mask from Mapbox, tiling the
+    matrix into requests of at most 25 coordinates.
+    Returns {(i, j): (meters, seconds)}; pairs Mapbox couldn't answer are absent.
+    """
+    results = {}
+    if not missing.any() or not os.environ.get('MAPBOX_ACCESS_TOKEN'):
+        return results
+    
+    missing_rows = np.nonzero(missing.any(axis=1))[0].tolist()
+    missing_cols = np.nonzero(missing.any(axis=0))[0].tolist()
+    rows_per_tile, cols_per_tile = _matrix_tile_shape(len(missing_rows), len(missing_cols))
+    
+    for row_start in range(0, len(missing_rows), rows_per_tile):
+        tile_rows = missing_rows[row_start:row_start + rows_per_tile]
+        for col_start in range(0, len(missing_cols), cols_per_tile):
+            tile_cols = missing_cols[col_start:col_start + cols_per_tile]
+            if not missing[np.ix_(tile_rows, tile_cols)].any():
+                continue
+            
+            tile = _fetch_distance_tile(
+                [origins[i] for i in tile_rows],
+                [destinations[j] for j in tile_cols]
+            )
+            if tile is None:
+                continue
+            for a, i in enumerate(tile_rows):
+                for b, j in enumerate(tile_cols):
+                    if missing[i, j]:
+                        results[(i, j)] = tile[a][b]
+    return results
+
+
+def _fetch_distance_tile(origins, destinations):
+    """One Mapbox Matrix request: rows of (meters, seconds) per origin, or None on failure"""
+    coordinates = ";".join(f"{lng},{lat}" for lat, lng in origins + destinations)
+    url = f"https://api.mapbox.com/directions-matrix/v1/mapbox/driving/{coordinates}"
+    params = {
+        "access_token": os.environ.get('MAPBOX_ACCESS_TOKEN'),
+        "annotations": "distance,duration",
+        "sources": ";".join(str(i) for i in range(len(origins))),
+        "destinations": ";".join(str(len(origins) + j) for j in range(len(destinations)))
+    }
+    
+    try:
+        response = http_client.get('mapbox', url, params=params)
+        data = response.json()
+    except Exception as e:
+        print(f"Error getting distance matrix: {e}")
+        return None
+    
+    if data.get("code") != "Ok" or not data.get("distances"):
+        return None
+    
+    return [
+        list(zip(distance_row, duration_row))
+        for distance_row, duration_row in zip(data["distances"], data["durations"])
+    ]
+
+
+def format_duration(duration_seconds):
+    """Format a duration in seconds as text (e.g., "15 mins")"""
+    duration_minutes = round(duration_seconds / 60)
+    if duration_minutes >= 60:
+        hours = duration_minutes // 60
+        mins = duration_minutes % 60
+        return f"{hours} hrs {mins} mins"
+    return f"{duration_minutes} mins"
 
 
 def calculate_delivery_price(distance_km):
@@ -72,31 +264,41 @@ def calculate_delivery_price(distance_km):
 
 
 def get_geocode(address):
-    """Get lat/lng for an address using Mapbox Geocoding API"""
+    """Get lat/lng for an address, served from the geocode cache when possible"""
+    try:
+        return geocode_cache.get_or_fetch(address, _fetch_geocode)
+    except Exception as e:
+        print(f"Error geocoding: {e}")
+        return None, None
+
+
+def _fetch_geocode(address):
+    """Look an address up with the Mapbox Geocoding API (see GeocodeCache.get_or_fetch)"""
     access_token = os.environ.get('MAPBOX_ACCESS_TOKEN')
     if not access_token:
-        return None, None
+        return None
     
-    url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{address}.json"
+    url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{quote(address)}.json"
     params = {
         "access_token": access_token,
         "limit": 1
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get('mapbox', url, params=params)
+        response.raise_for_status()
         data = response.json()
-        
-        if data.get("features"):
-            # Mapbox returns [lng, lat]
-            center = data["features"][0]["center"]
-            lng, lat = center[0], center[1]
-            return lat, lng
-        
-        return None, None
     except Exception as e:
         print(f"Error geocoding: {e}")
-        return None, None
+        return None
+    
+    if data.get("features"):
+        # Mapbox returns [lng, lat]
+        center = data["features"][0]["center"]
+        lng, lat = center[0], center[1]
+        return lat, lng
+    
+    return None, None
 
 
 def send_email(to, subject, body):
@@ -110,17 +312,115 @@ def send_email(to, subject, body):
         return False
 
 
+# session.info key for notifications waiting for the next commit
+PENDING_NOTIFICATIONS = "pending_notifications"
+
+
 def create_notification(user_id, order_id, message, type_):
-    """Create a notification record"""
-    notification = Notification(
-        user_id=user_id,
-        order_id=order_id,
-        message=message,
-        type=type_
+    """
+    Queue a notification on the current session.
+    Queued notifications are written with the next commit, so call this
+    before committing the change it reports.
+    """
+    queue_notifications([{
+        "user_id": user_id,
+        "order_id": order_id,
+        "message": message,
+        "type": type_
+    }])
+
+
+def queue_notifications(notifications):
+    """Queue many notifications (dicts of user_id, order_id, message, type) for the next commit"""
+    session = db.session()
+    if not session.in_transaction():
+        # Begin now so a rollback before any query still discards the queue
+        session.begin()
+    session.info.setdefault(PENDING_NOTIFICATIONS, []).extend(
+        {
+            "user_id": n["user_id"],
+            "order_id": n.get("order_id"),
+            "message": n["message"],
+            "type": n["type"],
+            "is_read": False
+        }
+        for n in notifications
+    )
+
+
+def notify_users(user_ids, message, type_, order_id=None):
+    """
+    Notify every user selected by `user_ids` (a select of user ids) with one
+    INSERT ... SELECT, without loading the users. Runs in the current
+    transaction; returns the number of notifications created.
+    """
+    rows = user_ids.add_columns(
+        literal(order_id, Integer),
+        literal(message, Text),
+        literal(type_, String(50)),
+        literal(False, Boolean),
+        literal(datetime.utcnow(), DateTime)
+    )
+    result = db.session.execute(
+        insert(Notification).from_select(["user_id", "order_id", "message", "type", "is_read", "created_at"], rows)
     )
-    db.session.add(notification)
-    db.session.commit()
-    return notification
+    db.session.execute(
+        update(User.__table__)
+        .where(User.id.in_(user_ids))
+        .values(unread_notifications=User.unread_notifications + 1)
+    )
+    return result.rowcount
+
+
+def mark_notifications_read(user_id, ids=None):
+    """
+    Mark a user's notifications read (all of them when `ids` is None) and
+    lower their unread counter by the number that actually changed.
+    Runs in the current transaction; returns that number.
+    """
+    stmt = update(Notification.__table__).where(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    )
+    if ids is not None:
+        stmt = stmt.where(Notification.id.in_(ids))
+    changed = db.session.execute(stmt.values(is_read=True)).rowcount
+
+    if changed:
+        db.session.execute(
+            update(User.__table__)
+            .where(User.id == user_id)
+            .values(unread_notifications=case(
+                (User.unread_notifications > changed, User.unread_notifications - changed),
+                else_=0
+            ))
+        )
+    return changed
+
+
+@event.listens_for(Session, "before_commit")
+def _insert_pending_notifications(session):
+    pending = session.info.pop(PENDING_NOTIFICATIONS, None)
+    if pending:
+        # A single multi-row INSERT for everything queued in this transaction
+        session.execute(insert(Notification), pending)
+        
+        per_user = {}
+        for notification in pending:
+            per_user[notification["user_id"]] = per_user.get(notification["user_id"], 0) + 1
+        session.execute(
+            update(User.__table__)
+            .where(User.id == bindparam("uid"))
+            .values(unread_notifications=User.unread_notifications + bindparam("added")),
+            [{"uid": user_id, "added": added} for user_id, added in per_user.items()]
+        )
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_notifications(session, previous_transaction):
+    # A savepoint rollback leaves the outer transaction (and its queue) alive
+    if not previous_transaction.nested:
+        session.info.pop(PENDING_NOTIFICATIONS, None)
 
 
 def send_order_status_email(user, order, status):
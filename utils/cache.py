@@ -0,0 +1,347 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import GeocodeCacheEntry, DistanceCacheEntry
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded in-process cache with per-entry expiry"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def normalize_address(address):
+    """Collapse case, punctuation and whitespace so equivalent addresses share a key"""
+    text = unicodedata.normalize("NFKC", address or "").lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class PersistentCache:
+    """
+    In-process LRU in front of a cache table that survives restarts.
+    Subclasses set `model`, its `key_column` and `value_columns`; values are
+    tuples in `value_columns` order.
+    Table I/O uses its own short transactions so it never touches the request's session.
+    """
+
+    model = None
+    key_column = None
+    value_columns = ()
+
+    def __init__(self, maxsize=2048, ttl=30 * 24 * 3600):
+        self.memory = LRUCache(maxsize=maxsize)
+        self.ttl = ttl
+        self.db_hits = 0
+        self.fetches = 0
+        self.db_errors = 0
+
+    def lookup(self, key):
+        cached = self.memory.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        row = self._load(key)
+        if row is None:
+            return _MISSING
+
+        self.db_hits += 1
+        value, remaining = row
+        self.memory.set(key, value, ttl=remaining)
+        return value
+
+    def store(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl=ttl)
+        self._store(key, value, ttl)
+
+    def lookup_many(self, keys):
+        """Like `lookup` for many keys at once (one table query); returns {key: value} for hits"""
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            cached = self.memory.get(key, _MISSING)
+            if cached is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = cached
+        if not missing:
+            return found
+
+        table = self.model.__table__
+        key_column = table.c[self.key_column]
+        columns = [table.c[name] for name in self.value_columns]
+        now = datetime.utcnow()
+        try:
+            with db.engine.connect() as conn:
+                rows = []
+                # Stay well under bind-parameter limits
+                for start in range(0, len(missing), 500):
+                    rows.extend(conn.execute(
+                        select(key_column, *columns, table.c.expires_at).where(
+                            key_column.in_(missing[start:start + 500]),
+                            table.c.expires_at > now
+                        )
+                    ).all())
+        except Exception as e:
+            self.db_errors += 1
+            print(f"{table.name} read error: {e}")
+            return found
+
+        for row in rows:
+            self.db_hits += 1
+            value = tuple(row[1:-1])
+            self.memory.set(row[0], value, ttl=(row.expires_at - now).total_seconds())
+            found[row[0]] = value
+        return found
+
+    def store_many(self, items, ttl=None):
+        """Store {key: value} pairs in one table transaction"""
+        if not items:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        for key, value in items.items():
+            self.memory.set(key, value, ttl=ttl)
+
+        table = self.model.__table__
+        key_column = table.c[self.key_column]
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        rows = [
+            {self.key_column: key, "expires_at": expires_at, **dict(zip(self.value_columns, value))}
+            for key, value in items.items()
+        ]
+        try:
+            with db.engine.begin() as conn:
+                keys = list(items)
+                for start in range(0, len(keys), 500):
+                    conn.execute(delete(table).where(key_column.in_(keys[start:start + 500])))
+                conn.execute(insert(table), rows)
+        except IntegrityError:
+            # Another worker stored some of the same keys first
+            pass
+        except Exception as e:
+            self.db_errors += 1
+            print(f"{table.name} write error: {e}")
+
+    def _load(self, key):
+        table = self.model.__table__
+        now = datetime.utcnow()
+        columns = [table.c[name] for name in self.value_columns]
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    select(*columns, table.c.expires_at).where(
+                        table.c[self.key_column] == key,
+                        table.c.expires_at > now
+                    )
+                ).first()
+        except Exception as e:
+            self.db_errors += 1
+            print(f"{table.name} read error: {e}")
+            return None
+
+        if row is None:
+            return None
+        return tuple(row[:-1]), (row.expires_at - now).total_seconds()
+
+    def _store(self, key, value, ttl):
+        table = self.model.__table__
+        values = dict(zip(self.value_columns, value))
+        values["expires_at"] = datetime.utcnow() + timedelta(seconds=ttl)
+        try:
+            with db.engine.begin() as conn:
+                result = conn.execute(
+                    update(table).where(table.c[self.key_column] == key).values(**values)
+                )
+                if result.rowcount == 0:
+                    conn.execute(insert(table).values({self.key_column: key, **values}))
+        except IntegrityError:
+            # Another worker stored the same key first
+            pass
+        except Exception as e:
+            self.db_errors += 1
+            print(f"{table.name} write error: {e}")
+
+    def purge(self, expired_only=False):
+        """Drop cached entries; returns the number of table rows removed"""
+        table = self.model.__table__
+        stmt = delete(table)
+        if expired_only:
+            stmt = stmt.where(table.c.expires_at <= datetime.utcnow())
+        else:
+            self.memory.clear()
+
+        with db.engine.begin() as conn:
+            return conn.execute(stmt).rowcount
+
+    def stats(self):
+        data = self.memory.stats()
+        lookups = data["hits"] + data["misses"]
+        data.update({
+            "db_hits": self.db_hits,
+            "fetches": self.fetches,
+            "db_errors": self.db_errors,
+            "overall_hit_ratio": round((data["hits"] + self.db_hits) / lookups, 4) if lookups else 0.0
+        })
+        return data
+
+
+class GeocodeCache(PersistentCache):
+    """
+    Cache for address geocoding keyed on the normalized address.
+    Addresses the provider could not resolve are cached too (with a shorter
+    TTL) so repeated bad input doesn't hit Mapbox.
+    """
+
+    model = GeocodeCacheEntry
+    key_column = "address_key"
+    value_columns = ("lat", "lng")
+
+    def __init__(self, maxsize=2048, ttl=30 * 24 * 3600, negative_ttl=24 * 3600):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.negative_ttl = negative_ttl
+
+    def get_or_fetch(self, address, fetch):
+        """
+        Return (lat, lng) for an address.
+        `fetch(address)` must return a (lat, lng) tuple, (None, None) when the
+        address can't be resolved, or None when no answer is available right now
+        (missing credentials, provider down) - the latter is never cached.
+        """
+        key = normalize_address(address)
+        if not key:
+            return None, None
+
+        coords = self.lookup(key)
+        if coords is not _MISSING:
+            return coords
+
+        self.fetches += 1
+        coords = fetch(address)
+        if coords is None:
+            return None, None
+
+        self.store(key, coords, ttl=self.ttl if coords[0] is not None else self.negative_ttl)
+        return coords
+
+
+class DistanceCache(PersistentCache):
+    """
+    Cache for road distance/duration between two points.
+    Coordinates are snapped to a grid (`grid` degrees, ~55 m by default) so
+    repeat routes between the same buildings share an entry.
+    """
+
+    model = DistanceCacheEntry
+    key_column = "pair_key"
+    value_columns = ("distance_m", "duration_s")
+
+    def __init__(self, maxsize=10000, ttl=30 * 24 * 3600, grid=0.0005):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.grid = grid
+
+    def key_for(self, origin, destination):
+        cells = [
+            round(float(value) / self.grid)
+            for point in (origin, destination)
+            for value in point
+        ]
+        return ":".join(str(cell) for cell in cells)
+
+    def get_or_fetch(self, origin, destination, fetch):
+        """
+        Return (distance_m, duration_s) between two (lat, lng) points.
+        `fetch` follows the same contract as GeocodeCache.get_or_fetch.
+        """
+        key = self.key_for(origin, destination)
+
+        value = self.lookup(key)
+        if value is not _MISSING:
+            return value
+
+        self.fetches += 1
+        value = fetch(origin, destination)
+        if value is None:
+            return None, None
+
+        self.store(key, value)
+        return value
+
+
+geocode_cache = GeocodeCache(
+    maxsize=int(os.environ.get("GEOCODE_CACHE_SIZE", 2048)),
+    ttl=int(os.environ.get("GEOCODE_CACHE_TTL", 30 * 24 * 3600)),
+    negative_ttl=int(os.environ.get("GEOCODE_NEGATIVE_TTL", 24 * 3600))
+)
+
+distance_cache = DistanceCache(
+    maxsize=int(os.environ.get("DISTANCE_CACHE_SIZE", 10000)),
+    ttl=int(os.environ.get("DISTANCE_CACHE_TTL", 30 * 24 * 3600)),
+    grid=float(os.environ.get("DISTANCE_CACHE_GRID", 0.0005))
+)
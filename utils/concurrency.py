@@ -0,0 +1,65 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Process-wide pool for blocking I/O (geocoding, routing, uploads), created on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get("RESOLVE_WORKERS", 8)),
+                    thread_name_prefix="resolve"
+                )
+    return _executor
+
+
+class Deadline:
+    """Overall time budget shared by several waits"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Run `fn(*args, **kwargs)` on the shared pool inside an app context of the
+    current app, so it can use the database and config like the request does.
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    return _get_executor().submit(run)
+
+
+def wait_for(future, deadline, default=None, label="task"):
+    """
+    Result of `future` if it finishes before `deadline`, else `default`.
+    Errors are logged and also give `default`; a late task keeps running in
+    the background but its result is dropped.
+    """
+    try:
+        return future.result(timeout=deadline.remaining())
+    except FutureTimeoutError:
+        future.cancel()
+        logger.warning(f"{label} did not finish within the time budget")
+    except Exception as e:
+        logger.error(f"{label} failed: {e}")
+    return default
@@ -0,0 +1,238 @@
+import logging
+import os
+import time
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+
+from extensions import db
+from models import ParcelOrder, User
+from utils import create_notification
+from utils.geo import haversine_matrix_km
+from utils.location_store import TRACKED_STATUSES, location_store
+from utils.pubsub import publish_order_update
+
+logger = logging.getLogger(__name__)
+
+# Stands in for "not allowed" so the solvers can stay in finite arithmetic
+INFEASIBLE = 1e9
+
+
+def hungarian(cost):
+    """
+    Minimum-cost assignment for a rectangular cost matrix.
+    Returns (rows, cols) index arrays with one entry per row, or per column if
+    there are fewer columns. Shortest augmenting path form of the Hungarian
+    algorithm; the inner scan over columns is vectorised with numpy.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    # 1-based potentials and matching; column 0 is the virtual start column
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+
+    for row in range(1, n + 1):
+        match[0] = row
+        col = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            current_row = match[col]
+            free = ~used[1:]
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            better = free & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = col
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+            u[match[used]] += delta
+            v[used] -= delta
+            min_slack[1:][free] -= delta
+            col = next_col
+            if match[col] == 0:
+                break
+        # Flip the augmenting path
+        while col:
+            previous = way[col]
+            match[col] = match[previous]
+            col = previous
+
+    cols = np.nonzero(match[1:])[0]
+    rows = match[1:][cols] - 1
+    order = np.argsort(rows)
+    rows, cols = rows[order], cols[order]
+    return (cols, rows) if transposed else (rows, cols)
+
+
+def greedy_assignment(cost):
+    """Cheapest remaining pair first; near-optimal for dispatch and O(N·M log(N·M))"""
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    flat = np.flatnonzero(cost < INFEASIBLE)
+    flat = flat[np.argsort(cost.flat[flat], kind="stable")]
+    row_taken = np.zeros(n, dtype=bool)
+    col_taken = np.zeros(m, dtype=bool)
+    rows, cols = [], []
+    limit = min(n, m)
+    for row, col in zip(*np.divmod(flat, m)):
+        if row_taken[row] or col_taken[col]:
+            continue
+        row_taken[row] = col_taken[col] = True
+        rows.append(row)
+        cols.append(col)
+        if len(rows) == limit:
+            break
+    return np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+
+
+def plan_dispatch(orders, couriers, max_km=15.0, max_load=3, load_penalty_km=2.0, exact_max_orders=150):
+    """
+    Match pending orders to couriers.
+    `orders` are (order_id, pickup_lat, pickup_lng); `couriers` are
+    (courier_id, lat, lng, active_orders). Each courier has
+    `max_load - active_orders` slots, and each further order a courier takes
+    costs `load_penalty_km` more, so work spreads out unless a loaded courier
+    is much closer. Pairs further than `max_km` are never made.
+    Returns [(order_id, courier_id, distance_km)].
+    """
+    slots = [
+        (courier_index, load + slot)
+        for courier_index, (_, _, _, load) in enumerate(couriers)
+        for slot in range(max(0, max_load - load))
+    ]
+    if not orders or not slots:
+        return []
+
+    slot_couriers = np.array([courier_index for courier_index, _ in slots])
+    slot_loads = np.array([load for _, load in slots], dtype=np.float64)
+    distances = haversine_matrix_km(
+        [(lat, lng) for _, lat, lng in orders],
+        [(lat, lng) for _, lat, lng, _ in couriers]
+    )[:, slot_couriers]
+    cost = distances + load_penalty_km * slot_loads
+    cost[distances > max_km] = INFEASIBLE
+
+    # Drop orders and slots that can't be matched before solving
+    feasible = cost < INFEASIBLE
+    order_rows = np.flatnonzero(feasible.any(axis=1))
+    slot_cols = np.flatnonzero(feasible.any(axis=0))
+    cost = cost[np.ix_(order_rows, slot_cols)]
+
+    if min(cost.shape) <= exact_max_orders:
+        rows, cols = hungarian(cost)
+    else:
+        rows, cols = greedy_assignment(cost)
+
+    plan = []
+    for row, col in zip(rows, cols):
+        if cost[row, col] >= INFEASIBLE:
+            continue
+        order_row, slot = order_rows[row], slot_cols[col]
+        plan.append((
+            orders[order_row][0],
+            couriers[slot_couriers[slot]][0],
+            float(distances[order_row, slot])
+        ))
+    return plan
+
+
+def dispatch_pending(dry_run=False):
+    """
+    Assign every pending order that has a courier nearby, in one transaction.
+    Couriers must be active and have pinged within COURIER_POSITION_MAX_AGE.
+    """
+    started = time.perf_counter()
+    max_age = timedelta(seconds=int(os.environ.get("COURIER_POSITION_MAX_AGE", 600)))
+    positions = {
+        courier_id: (lat, lng)
+        for courier_id, lat, lng in location_store.couriers_seen_since(max_age)
+    }
+
+    orders = db.session.execute(
+        select(ParcelOrder.id, ParcelOrder.pickup_lat, ParcelOrder.pickup_lng)
+        .where(ParcelOrder.status == "pending", ParcelOrder.pickup_lat.isnot(None), ParcelOrder.pickup_lng.isnot(None))
+        .order_by(ParcelOrder.created_at, ParcelOrder.id)
+    ).all()
+    active_ids = db.session.execute(
+        select(User.id).where(User.id.in_(list(positions)), User.role == "courier", User.is_active.is_(True))
+    ).scalars().all() if positions else []
+    loads = dict(db.session.execute(
+        select(ParcelOrder.courier_id, func.count(ParcelOrder.id))
+        .where(ParcelOrder.courier_id.in_(active_ids), ParcelOrder.status.in_(TRACKED_STATUSES))
+        .group_by(ParcelOrder.courier_id)
+    ).all()) if active_ids else {}
+
+    plan = plan_dispatch(
+        orders,
+        [(courier_id, *positions[courier_id], loads.get(courier_id, 0)) for courier_id in active_ids],
+        max_km=float(os.environ.get("DISPATCH_MAX_KM", 15)),
+        max_load=int(os.environ.get("DISPATCH_MAX_LOAD", 3)),
+        load_penalty_km=float(os.environ.get("DISPATCH_LOAD_PENALTY_KM", 2)),
+        exact_max_orders=int(os.environ.get("DISPATCH_EXACT_MAX", 150))
+    )
+    planned_at = time.perf_counter()
+
+    assigned = []
+    if plan and not dry_run:
+        courier_for = {order_id: courier_id for order_id, courier_id, _ in plan}
+        # Orders assigned by hand meanwhile are skipped, not reassigned
+        locked = (
+            ParcelOrder.query
+            .options(selectinload(ParcelOrder.customer))
+            .filter(ParcelOrder.id.in_(list(courier_for)), ParcelOrder.status == "pending")
+            .with_for_update(skip_locked=True, of=ParcelOrder)
+            .all()
+        )
+        from services.email_service import send_order_status_email
+        for order in locked:
+            order.courier_id = courier_for[order.id]
+            order.status = "assigned"
+            if order.customer:
+                send_order_status_email(order.customer.email, order.id, "assigned", order.parcel_name)
+            create_notification(
+                user_id=order.courier_id,
+                order_id=order.id,
+                message=f"You have been assigned order #{order.id}",
+                type_="assignment"
+            )
+            create_notification(
+                user_id=order.customer_id,
+                order_id=order.id,
+                message=f"Courier assigned to your order #{order.id}",
+                type_="assignment"
+            )
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for order in locked:
+            publish_order_update(order, "status")
+        assigned = [(order.id, order.courier_id) for order in locked]
+
+    logger.info(
+        f"Dispatch: {len(orders)} pending, {len(active_ids)} couriers, {len(plan)} matched, "
+        f"{len(assigned)} assigned, planned in {(planned_at - started) * 1000:.0f} ms"
+    )
+    return {
+        "pending_orders": len(orders),
+        "available_couriers": len(active_ids),
+        "planned": [
+            {"order_id": order_id, "courier_id": courier_id, "distance_km": round(distance, 2)}
+            for order_id, courier_id, distance in plan
+        ],
+        "assigned": len(assigned),
+        "planning_ms": round((planned_at - started) * 1000, 1)
+    }
@@ -0,0 +1,179 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_matrix_km(origins, destinations):
+    """Great-circle distances in km for every origin/destination pair, shape (N, M)"""
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+    lat1, lng1 = origins[:, 0:1], origins[:, 1:2]
+    lat2, lng2 = destinations[:, 0], destinations[:, 1]
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+
+def haversine_km(origin, destination):
+    """Great-circle distance in km between two (lat, lng) points"""
+    lat1, lng1 = math.radians(origin[0]), math.radians(origin[1])
+    lat2, lng2 = math.radians(destination[0]), math.radians(destination[1])
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class CircuityEstimator:
+    """
+    Offline road-distance estimate: straight-line distance times a circuity
+    factor fitted per region from historical orders priced with Mapbox.
+    Regions are `region_size` degree cells around the pickup point; regions
+    with too few samples use the global factor.
+    """
+
+    # Typical urban road circuity, used until there is history to fit
+    DEFAULT_FACTOR = 1.35
+    # Ratios outside this band are geocoding mistakes or the old 5 km default
+    MIN_RATIO = 1.0
+    MAX_RATIO = 4.0
+
+    def __init__(self, region_size=0.1, min_samples=20, speed_kmh=25.0, refit_after=24 * 3600, max_samples=50000):
+        self.region_size = region_size
+        self.min_samples = min_samples
+        self.speed_kmh = speed_kmh
+        self.refit_after = refit_after
+        self.max_samples = max_samples
+        self.global_factor = self.DEFAULT_FACTOR
+        self.region_factors = {}
+        self.sample_count = 0
+        self.fitted_at = None
+        self._refitting = False
+        self._lock = threading.Lock()
+
+    def region_for(self, point):
+        return (
+            math.floor(point[0] / self.region_size),
+            math.floor(point[1] / self.region_size)
+        )
+
+    def fit(self, samples):
+        """
+        Fit factors from (origin, destination, road_km) samples.
+        Each factor is the least-squares slope through the origin of road
+        distance against straight-line distance.
+        """
+        totals = {}
+        overall = [0.0, 0.0, 0]
+        for origin, destination, road_km in samples:
+            straight_km = haversine_km(origin, destination)
+            if straight_km < 0.05 or not road_km:
+                continue
+            if not (self.MIN_RATIO <= road_km / straight_km <= self.MAX_RATIO):
+                continue
+
+            region = totals.setdefault(self.region_for(origin), [0.0, 0.0, 0])
+            for bucket in (region, overall):
+                bucket[0] += road_km * straight_km
+                bucket[1] += straight_km * straight_km
+                bucket[2] += 1
+
+        global_factor = overall[0] / overall[1] if overall[2] >= self.min_samples else self.DEFAULT_FACTOR
+        region_factors = {
+            region: sxy / sxx
+            for region, (sxy, sxx, count) in totals.items()
+            if count >= self.min_samples
+        }
+
+        with self._lock:
+            self.global_factor = global_factor
+            self.region_factors = region_factors
+            self.sample_count = overall[2]
+            self.fitted_at = time.monotonic()
+        return self
+
+    def fit_from_db(self):
+        """
+        Fit from the most recent `max_samples` orders with both coordinates
+        and a Mapbox distance. Estimated distances are left out, or the fit
+        would learn its own output.
+        """
+        from extensions import db
+        from models import ParcelOrder
+
+        rows = db.session.query(
+            ParcelOrder.pickup_lat, ParcelOrder.pickup_lng,
+            ParcelOrder.destination_lat, ParcelOrder.destination_lng,
+            ParcelOrder.distance
+        ).filter(
+            ParcelOrder.pickup_lat.isnot(None),
+            ParcelOrder.pickup_lng.isnot(None),
+            ParcelOrder.destination_lat.isnot(None),
+            ParcelOrder.destination_lng.isnot(None),
+            ParcelOrder.distance_source == 'mapbox',
+            ParcelOrder.distance > 0
+        ).order_by(ParcelOrder.id.desc()).limit(self.max_samples).all()
+
+        return self.fit(
+            ((row[0], row[1]), (row[2], row[3]), row[4]) for row in rows
+        )
+
+    def ensure_fitted(self):
+        """
+        Start a fit from the database in the background on first use and once
+        `refit_after` has passed. Never waits for it: callers estimate with the
+        current factors, the defaults until the first fit lands.
+        """
+        from flask import current_app
+
+        if self.fitted_at is not None and time.monotonic() - self.fitted_at < self.refit_after:
+            return
+        app = current_app._get_current_object()
+        if app.testing:
+            # Tests fit explicitly
+            return
+        with self._lock:
+            if self._refitting:
+                return
+            self._refitting = True
+        threading.Thread(target=self._refit, args=(app,), name="circuity-fit", daemon=True).start()
+
+    def _refit(self, app):
+        from extensions import db
+
+        try:
+            with app.app_context():
+                try:
+                    self.fit_from_db()
+                except Exception as e:
+                    print(f"Error fitting circuity factors: {e}")
+                    # Keep the current factors and don't retry on every request
+                    self.fitted_at = time.monotonic()
+                finally:
+                    db.session.remove()
+        finally:
+            self._refitting = False
+
+    def factor_for(self, origin):
+        return self.region_factors.get(self.region_for(origin), self.global_factor)
+
+    def estimate(self, origin, destination):
+        """Estimated (distance_m, duration_s) by road between two (lat, lng) points"""
+        distance_km = haversine_km(origin, destination) * self.factor_for(origin)
+        return distance_km * 1000.0, distance_km / self.speed_kmh * 3600.0
+
+    def estimate_matrix(self, origins, destinations):
+        """`estimate` for every origin/destination pair as (distance_m, duration_s) arrays of shape (N, M)"""
+        factors = np.array([self.factor_for(origin) for origin in origins], dtype=np.float64)
+        distance_km = haversine_matrix_km(origins, destinations) * factors[:, None]
+        return distance_km * 1000.0, distance_km / self.speed_kmh * 3600.0
+
+
+circuity_estimator = CircuityEstimator()
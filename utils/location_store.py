@@ -0,0 +1,381 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from multiprocessing.managers import BaseManager
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, insert, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extensions import db
+from models import LocationPing, ParcelOrder
+from utils.spatial import GridIndex
+
+logger = logging.getLogger(__name__)
+
+# Orders whose position is still changing; only these are read from the store
+TRACKED_STATUSES = ('assigned', 'picked_up', 'in_transit')
+# Rows per UPDATE/INSERT statement when flushing
+FLUSH_CHUNK_SIZE = 500
+
+
+class LocalLocationBackend:
+    """
+    Latest position per order plus the pings not yet written, in this process.
+    Positions are (lat, lng, recorded_at); an older point never replaces a newer one.
+    """
+
+    def __init__(self):
+        self._positions = {}
+        self._dirty = set()
+        self._pings = []
+        self._lock = threading.Lock()
+        # Latest position per courier, for nearest-courier lookups
+        self.couriers = GridIndex(float(os.environ.get("COURIER_GRID_SIZE", 0.01)))
+
+    def record(self, order_id, courier_id, points, keep_history=True):
+        """
+        Take `points` (dicts with lat, lng, accuracy, recorded_at) for an order;
+        True if its position moved. With `keep_history` they are also buffered
+        for location_pings.
+        """
+        with self._lock:
+            if keep_history:
+                self._pings.extend(
+                    dict(point, order_id=order_id, courier_id=courier_id) for point in points
+                )
+            newest = max(points, key=lambda point: point['recorded_at'])
+            self.update_courier(courier_id, newest['lat'], newest['lng'], newest['recorded_at'])
+            current = self._positions.get(order_id)
+            if current is not None and current[2] >= newest['recorded_at']:
+                return False
+            self._positions[order_id] = (newest['lat'], newest['lng'], newest['recorded_at'])
+            self._dirty.add(order_id)
+            return True
+
+    def update_courier(self, courier_id, lat, lng, recorded_at):
+        current = self.couriers.get(courier_id)
+        if current is None or current[2] <= recorded_at:
+            self.couriers.update(courier_id, lat, lng, recorded_at)
+
+    def nearest_couriers(self, lat, lng, k, seen_since, max_km=50.0):
+        """Up to `k` (distance_km, courier_id, recorded_at) for couriers seen since `seen_since`"""
+        return self.couriers.nearest(
+            lat, lng, k, max_km, where=lambda courier_id, recorded_at: recorded_at >= seen_since
+        )
+
+    def get_courier(self, courier_id):
+        """(lat, lng, recorded_at) of a courier's last ping, or None"""
+        return self.couriers.get(courier_id)
+
+    def couriers_seen_since(self, seen_since):
+        """(courier_id, lat, lng) of every courier that pinged since `seen_since`"""
+        return [
+            (courier_id, lat, lng)
+            for courier_id, lat, lng, recorded_at in self.couriers.items()
+            if recorded_at >= seen_since
+        ]
+
+    def get_many(self, order_ids):
+        with self._lock:
+            return {
+                order_id: self._positions[order_id]
+                for order_id in order_ids if order_id in self._positions
+            }
+
+    def take_dirty(self):
+        """Positions changed and pings received since the last call, clearing both"""
+        with self._lock:
+            positions = {order_id: self._positions[order_id] for order_id in self._dirty}
+            pings = self._pings
+            self._dirty = set()
+            self._pings = []
+        return positions, pings
+
+    def restore(self, positions, pings):
+        """Put back what a failed flush took, unless newer positions arrived meanwhile"""
+        with self._lock:
+            for order_id, position in positions.items():
+                current = self._positions.get(order_id)
+                if current is None or current[2] <= position[2]:
+                    self._positions[order_id] = position
+                    self._dirty.add(order_id)
+            self._pings[:0] = pings
+
+    def prune(self, older_than):
+        """Forget flushed positions recorded before `older_than`; the database has them"""
+        with self._lock:
+            stale = [
+                order_id for order_id, position in self._positions.items()
+                if position[2] < older_than and order_id not in self._dirty
+            ]
+            for order_id in stale:
+                del self._positions[order_id]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._positions.clear()
+            self._dirty.clear()
+            self._pings = []
+        self.couriers = GridIndex(self.couriers.cell_size)
+
+
+class LocationStoreManager(BaseManager):
+    pass
+
+
+LocationStoreManager.register("backend")
+
+
+class RemoteLocationBackend:
+    """
+    LocalLocationBackend hosted by `flask locations serve`, shared by all workers.
+    Manager proxies can't be shared between threads, so each thread connects its own.
+    """
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _backend(self):
+        backend = getattr(self._local, "backend", None)
+        if backend is None:
+            manager = LocationStoreManager(address=self.address, authkey=self.authkey)
+            manager.connect()
+            backend = self._local.backend = manager.backend()
+        return backend
+
+    def __getattr__(self, name):
+        if name not in ("record", "update_courier", "nearest_couriers", "couriers_seen_since",
+                        "get_courier", "get_many",
+                        "take_dirty", "restore", "prune", "clear"):
+            raise AttributeError(name)
+
+        def call(*args):
+            try:
+                return getattr(self._backend(), name)(*args)
+            except (EOFError, OSError):
+                # Reconnect on the next call
+                self._local.backend = None
+                raise
+        return call
+
+
+class LocationStore:
+    """
+    Write-behind store for courier positions.
+    Pings only touch memory; `flush()` writes the positions that changed with
+    one UPDATE per chunk of orders and the buffered pings with one INSERT.
+    Endpoints that show a tracked order's position overlay the stored one on
+    what they loaded, so readers never see a position older than the last ping.
+    """
+
+    def __init__(self, backend, flush_interval=2.0, retain=timedelta(hours=1)):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.retain = retain
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Check the store can serve this deployment and start the flusher.
+        Called from create_app(), so a misconfigured process fails at startup
+        rather than serving positions that other workers never see.
+        """
+        workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+        if workers > 1 and isinstance(self.backend, LocalLocationBackend):
+            raise RuntimeError(
+                f"WEB_CONCURRENCY={workers} but LOCATION_STORE_ADDRESS is not set; "
+                "each worker would keep its own courier positions. "
+                "Run `flask locations serve` and set LOCATION_STORE_ADDRESS on every worker."
+            )
+        self._start_flusher(app)
+
+    def record(self, order_id, courier_id, points, keep_history=True):
+        """Store a batch of points for an order; True if its position moved forward"""
+        return self.backend.record(order_id, courier_id, points, keep_history)
+
+    def get_many(self, order_ids):
+        return self.backend.get_many(list(order_ids))
+
+    def update_courier(self, courier_id, lat, lng, recorded_at):
+        """Courier position without an order, for couriers waiting for work"""
+        self.backend.update_courier(courier_id, lat, lng, recorded_at)
+
+    def courier_position(self, courier_id, max_age=timedelta(minutes=10)):
+        """(lat, lng) of a courier's last ping within `max_age`, or None"""
+        position = self.backend.get_courier(courier_id)
+        if position is None or position[2] < datetime.utcnow() - max_age:
+            return None
+        return position[0], position[1]
+
+    def couriers_seen_since(self, max_age=timedelta(minutes=10)):
+        return self.backend.couriers_seen_since(datetime.utcnow() - max_age)
+
+    def nearest_couriers(self, lat, lng, k=5, max_age=timedelta(minutes=10), max_km=50.0):
+        """Couriers that pinged within `max_age`, closest first, as (distance_km, courier_id, recorded_at)"""
+        return self.backend.nearest_couriers(lat, lng, k, datetime.utcnow() - max_age, max_km)
+
+    def apply(self, order):
+        """Overwrite `order`'s loaded position with the stored one, without marking it dirty"""
+        self._overlay(order, self.backend.get_many([order.id]).get(order.id))
+        return order
+
+    def apply_many(self, orders):
+        """
+        Overlay stored positions on the tracked orders among `orders` with one
+        lookup, so a page of orders costs one round trip to a remote store.
+        Falls back to the loaded positions if the store is unavailable.
+        """
+        tracked = [order for order in orders if order.status in TRACKED_STATUSES]
+        if tracked:
+            try:
+                positions = self.backend.get_many([order.id for order in tracked])
+            except Exception as e:
+                logger.warning(f"Location store unavailable, using stored positions: {e}")
+                return orders
+            for order in tracked:
+                self._overlay(order, positions.get(order.id))
+        return orders
+
+    @staticmethod
+    def _overlay(order, position):
+        # Another process may have flushed a newer point than this one has seen
+        loaded = order.__dict__.get('location_updated_at')
+        if position is not None and (loaded is None or position[2] >= loaded):
+            set_committed_value(order, 'current_lat', position[0])
+            set_committed_value(order, 'current_lng', position[1])
+            set_committed_value(order, 'location_updated_at', position[2])
+
+    def flush(self):
+        """Persist what changed since the last flush; returns the number of orders updated"""
+        positions, pings = self.backend.take_dirty()
+        if not positions and not pings:
+            return 0
+        try:
+            for start in range(0, len(pings), FLUSH_CHUNK_SIZE):
+                db.session.execute(insert(LocationPing).values(pings[start:start + FLUSH_CHUNK_SIZE]))
+            order_ids = sorted(positions)
+            for start in range(0, len(order_ids), FLUSH_CHUNK_SIZE):
+                chunk = {order_id: positions[order_id] for order_id in order_ids[start:start + FLUSH_CHUNK_SIZE]}
+                recorded_at = case(
+                    {order_id: position[2] for order_id, position in chunk.items()},
+                    value=ParcelOrder.id
+                )
+                db.session.execute(
+                    update(ParcelOrder)
+                    .where(
+                        ParcelOrder.id.in_(list(chunk)),
+                        or_(
+                            ParcelOrder.location_updated_at.is_(None),
+                            ParcelOrder.location_updated_at < recorded_at
+                        )
+                    )
+                    .values(
+                        current_lat=case(
+                            {order_id: position[0] for order_id, position in chunk.items()},
+                            value=ParcelOrder.id
+                        ),
+                        current_lng=case(
+                            {order_id: position[1] for order_id, position in chunk.items()},
+                            value=ParcelOrder.id
+                        ),
+                        location_updated_at=recorded_at,
+                        # A position isn't an edit: leave updated_at, which drives the report rollups
+                        updated_at=ParcelOrder.updated_at
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.backend.restore(positions, pings)
+            raise
+        self.backend.prune(datetime.utcnow() - self.retain)
+        return len(positions)
+
+    def _start_flusher(self, app):
+        if self._flusher is not None or self.flush_interval <= 0:
+            return
+        if app.testing:
+            # Tests flush explicitly
+            return
+        with self._flusher_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._run_flusher, args=(app,), name="location-flusher", daemon=True
+            )
+            self._flusher.start()
+            atexit.register(self._flush_at_exit, app)
+
+    def _run_flusher(self, app):
+        while True:
+            time.sleep(self.flush_interval)
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Location flush failed: {e}")
+                finally:
+                    db.session.remove()
+
+    def _flush_at_exit(self, app):
+        with app.app_context():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Location flush at exit failed: {e}")
+
+
+def _create_store():
+    address = os.environ.get("LOCATION_STORE_ADDRESS")
+    if address:
+        from utils.pubsub import parse_address, require_authkey
+        backend = RemoteLocationBackend(parse_address(address), require_authkey())
+    else:
+        backend = LocalLocationBackend()
+    return LocationStore(backend, flush_interval=float(os.environ.get("LOCATION_FLUSH_INTERVAL", 2)))
+
+
+location_store = _create_store()
+
+
+locations_cli = AppGroup("locations", help="Courier position store commands.")
+
+
+@locations_cli.command("create-tables")
+def create_tables_command():
+    """Create location_pings in LOCATIONS_DATABASE_URL (migrations only cover the main database)"""
+    db.create_all(bind_key="locations")
+    click.echo("Created location tables")
+
+
+@locations_cli.command("flush")
+def flush_command():
+    """Write buffered positions and pings to the database now"""
+    click.echo(f"Flushed positions for {location_store.flush()} orders")
+
+
+@locations_cli.command("serve")
+@click.option("--address", default=None, help="host:port to listen on (default: LOCATION_STORE_BIND_ADDRESS, else localhost)")
+def serve_command(address):
+    """Host the position store shared by all web workers"""
+    from utils.pubsub import bind_address, require_authkey
+    try:
+        authkey = require_authkey()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    address = bind_address(address, "LOCATION_STORE_BIND_ADDRESS", "LOCATION_STORE_ADDRESS", 6151)
+    backend = LocalLocationBackend()
+    LocationStoreManager.register("backend", callable=lambda: backend)
+    manager = LocationStoreManager(address=address, authkey=authkey)
+    click.echo(f"Location store listening on {address[0]}:{address[1]}")
+    manager.get_server().serve_forever()
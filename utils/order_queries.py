@@ -0,0 +1,23 @@
+from sqlalchemy.orm import joinedload, load_only
+
+from models import ParcelOrder, User
+
+# What order listings show of a customer or courier
+PARTY_COLUMNS = (User.id, User.full_name, User.phone, User.email, User.vehicle_type, User.plate_number)
+
+
+def order_listing(customer=False, courier=False, columns=None):
+    """
+    ParcelOrder query that loads what a listing serializes up front, so a
+    page costs the same number of queries however many rows it has.
+    Customer and courier are joined into the order query; payment status is
+    a column of the order. `columns` limits the order columns loaded.
+    """
+    options = []
+    if customer:
+        options.append(joinedload(ParcelOrder.customer).load_only(*PARTY_COLUMNS))
+    if courier:
+        options.append(joinedload(ParcelOrder.courier).load_only(*PARTY_COLUMNS))
+    if columns:
+        options.append(load_only(*columns))
+    return ParcelOrder.query.options(*options)
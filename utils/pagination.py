@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, text
+
+from extensions import db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor for the row after which the next page starts"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from `encode_cursor`; raises ValueError for anything else"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a ?limit= value to 1..MAX_PAGE_SIZE"""
+    try:
+        return max(1, min(MAX_PAGE_SIZE, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(query, model, cursor, limit):
+    """
+    Newest-first page of `query` after `cursor`, ordered by (created_at, id).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Each page is an index range scan however deep it is, unlike OFFSET.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < row_id)
+        ))
+
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def estimated_count(query):
+    """
+    Row count the PostgreSQL planner expects for `query`, from table
+    statistics and without running it. None on other databases.
+    """
+    if db.engine.dialect.name != "postgresql":
+        return None
+    sql = query.enable_eagerloads(False).order_by(None).statement.compile(
+        db.engine, compile_kwargs={"literal_binds": True}
+    )
+    plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_total(query, mode):
+    """Total for ?total=: "exact" runs COUNT(*), "estimate" asks the planner, anything else skips it"""
+    if mode == "exact":
+        return query.enable_eagerloads(False).order_by(None).count()
+    if mode == "estimate":
+        return estimated_count(query)
+    return None
+
+
+def cursor_page(query, model, args, default=DEFAULT_PAGE_SIZE):
+    """
+    Page of a listing in cursor mode, from the request's ?cursor= (empty for
+    the first page), ?per_page= and ?total=exact|estimate.
+    Returns (rows, page_info); raises ValueError for a bad cursor.
+    """
+    limit = page_size(args.get("per_page"), default)
+    rows, next_cursor = keyset_page(query, model, args.get("cursor"), limit)
+    return rows, {
+        "next_cursor": next_cursor,
+        "per_page": limit,
+        "total": count_total(query, args.get("total"))
+    }
@@ -0,0 +1,305 @@
+import logging
+import os
+import queue
+import threading
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+
+import click
+from flask.cli import AppGroup
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Messages for one subscriber; only the most recent `maxsize` are kept if it falls behind"""
+
+    def __init__(self, broker, channel, maxsize=100):
+        self.broker = broker
+        self.channel = channel
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                # Slow reader: drop the oldest, a newer position supersedes it
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Next message, or None if none arrived within `timeout` seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalBroker:
+    """In-process pub/sub: publishers and subscribers must share a process"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+        return len(subscribers)
+
+    def has_subscribers(self, channel):
+        return bool(self._channels.get(channel))
+
+
+class RemoteBroker(LocalBroker):
+    """
+    Pub/sub across worker processes through a `flask pubsub broker` server.
+    Each process keeps one connection for publishing and one for receiving;
+    received messages fan out to this process's subscribers like LocalBroker.
+    """
+
+    def __init__(self, address, authkey):
+        super().__init__()
+        self.address = address
+        self.authkey = authkey
+        self._publisher = None
+        self._receiver = None
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+
+    def _connect(self):
+        with self._connect_lock:
+            if self._receiver is not None:
+                return
+            self._publisher = Client(self.address, authkey=self.authkey)
+            self._receiver = Client(self.address, authkey=self.authkey)
+            with self._lock:
+                channels = list(self._channels)
+            for channel in channels:
+                self._receiver.send(("sub", channel))
+            threading.Thread(target=self._receive, name="pubsub-receiver", daemon=True).start()
+
+    def _disconnect(self):
+        with self._connect_lock:
+            for conn in (self._publisher, self._receiver):
+                try:
+                    if conn is not None:
+                        conn.close()
+                except OSError:
+                    pass
+            self._publisher = self._receiver = None
+
+    def _receive(self):
+        receiver = self._receiver
+        try:
+            while True:
+                _, channel, message = receiver.recv()
+                super().publish(channel, message)
+        except (EOFError, OSError) as e:
+            logger.warning(f"Lost connection to pub/sub broker: {e}")
+            self._disconnect()
+
+    def _send(self, conn_name, payload):
+        try:
+            self._connect()
+            with self._send_lock:
+                getattr(self, conn_name).send(payload)
+            return True
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Pub/sub broker unavailable at {self.address}: {e}")
+            self._disconnect()
+            return False
+
+    def subscribe(self, channel):
+        first = not self.has_subscribers(channel)
+        subscription = super().subscribe(channel)
+        if first:
+            self._send("_receiver", ("sub", channel))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        if not self.has_subscribers(subscription.channel) and self._receiver is not None:
+            self._send("_receiver", ("unsub", subscription.channel))
+
+    def publish(self, channel, message):
+        # The broker echoes it back to this process too, so local subscribers aren't skipped
+        return 1 if self._send("_publisher", ("pub", channel, message)) else 0
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def bind_address(option, bind_env, connect_env, default_port):
+    """
+    Where a server command listens: --address, else `bind_env`, else localhost
+    on the port of `connect_env`. The address clients connect to is never
+    used as the bind host, so a server isn't exposed beyond localhost by accident.
+    """
+    value = option or os.environ.get(bind_env)
+    if value:
+        return parse_address(value)
+    connect = os.environ.get(connect_env)
+    return ("127.0.0.1", parse_address(connect)[1] if connect else default_port)
+
+
+def require_authkey():
+    """
+    PUBSUB_AUTHKEY as bytes. The broker and the location store unpickle what
+    they receive, so anyone holding the key can run code in them; there is
+    no default, and the server and client refuse to run without one.
+    """
+    authkey = os.environ.get("PUBSUB_AUTHKEY", "")
+    if len(authkey) < 16:
+        raise RuntimeError("PUBSUB_AUTHKEY must be set to a secret of at least 16 characters")
+    return authkey.encode()
+
+
+def run_broker(address, authkey):
+    """Relay messages between worker processes; blocks forever"""
+    # Authenticated per connection in its own thread, so a client that stalls
+    # mid-handshake can't hold up accept() for everyone else
+    listener = Listener(address)
+    subscribers = {}
+    # One writer at a time per connection, or concurrent messages interleave
+    send_locks = {}
+    lock = threading.Lock()
+    logger.info(f"Pub/sub broker listening on {listener.address}")
+
+    def serve(conn):
+        try:
+            deliver_challenge(conn, authkey)
+            answer_challenge(conn, authkey)
+        except Exception as e:
+            logger.warning(f"Rejected pub/sub connection: {e}")
+            conn.close()
+            return
+        send_locks[conn] = threading.Lock()
+
+        channels = set()
+        try:
+            while True:
+                command = conn.recv()
+                if command[0] == "sub":
+                    channels.add(command[1])
+                    with lock:
+                        subscribers.setdefault(command[1], set()).add(conn)
+                elif command[0] == "unsub":
+                    channels.discard(command[1])
+                    with lock:
+                        subscribers.get(command[1], set()).discard(conn)
+                elif command[0] == "pub":
+                    with lock:
+                        targets = list(subscribers.get(command[1], ()))
+                    for target in targets:
+                        try:
+                            with send_locks[target]:
+                                target.send(("msg", command[1], command[2]))
+                        except (KeyError, OSError):
+                            pass
+        except (EOFError, OSError):
+            pass
+        finally:
+            with lock:
+                for channel in channels:
+                    subscribers.get(channel, set()).discard(conn)
+                send_locks.pop(conn, None)
+            conn.close()
+
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError as e:
+            logger.warning(f"Failed to accept pub/sub connection: {e}")
+            continue
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """RemoteBroker when PUBSUB_BROKER_ADDRESS is set (multiple workers), else LocalBroker"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                address = os.environ.get("PUBSUB_BROKER_ADDRESS")
+                if address:
+                    _broker = RemoteBroker(parse_address(address), require_authkey())
+                else:
+                    _broker = LocalBroker()
+    return _broker
+
+
+def order_channel(order_id):
+    return f"order:{order_id}"
+
+
+def publish_order_update(order, event="update"):
+    """Push an order's tracking fields to anyone streaming it; call after the commit"""
+    from utils.location_store import location_store
+    # The database may be a flush behind the store
+    location_store.apply_many([order])
+    publish_position(order.id, order.status, order.current_lat, order.current_lng, event)
+
+
+def publish_position(order_id, status, current_lat, current_lng, event="location"):
+    """publish_order_update for callers that have the fields but no loaded order"""
+    try:
+        get_broker().publish(order_channel(order_id), {
+            "event": event,
+            "id": order_id,
+            "status": status,
+            "current_lat": current_lat,
+            "current_lng": current_lng
+        })
+    except Exception as e:
+        logger.warning(f"Failed to publish update for order {order_id}: {e}")
+
+
+pubsub_cli = AppGroup("pubsub", help="Live tracking pub/sub commands.")
+
+
+@pubsub_cli.command("broker")
+@click.option("--address", default=None, help="host:port to listen on (default: PUBSUB_BIND_ADDRESS, else localhost)")
+def broker_command(address):
+    """Run the broker that relays tracking updates between web workers"""
+    try:
+        authkey = require_authkey()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    address = bind_address(address, "PUBSUB_BIND_ADDRESS", "PUBSUB_BROKER_ADDRESS", 6150)
+    click.echo(f"Pub/sub broker listening on {address[0]}:{address[1]}")
+    run_broker(address, authkey)
@@ -0,0 +1,541 @@
+import heapq
+import math
+import os
+import threading
+
+import numpy as np
+
+from utils.geo import EARTH_RADIUS_KM, haversine_km
+
+# Arrays making up a graph directory, all memory-mapped on load
+GRAPH_ARRAYS = (
+    "lat", "lng",
+    "indptr", "indices", "distance", "duration",
+    "rev_indptr", "rev_indices", "rev_distance", "rev_duration"
+)
+# Contraction hierarchy added by RoadGraph.contract (optional)
+HIERARCHY_ARRAYS = (
+    "up_indptr", "up_indices", "up_distance", "up_duration",
+    "down_indptr", "down_indices", "down_distance", "down_duration"
+)
+
+# Default speeds (km/h) for OSM highway classes that cars can use
+HIGHWAY_SPEEDS = {
+    "motorway": 80, "motorway_link": 50,
+    "trunk": 60, "trunk_link": 40,
+    "primary": 50, "primary_link": 35,
+    "secondary": 40, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25,
+    "unclassified": 25, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25
+}
+
+# Points further than this from any road node are treated as off the graph
+MAX_SNAP_METERS = 500.0
+# Speed assumed between a point and its nearest road node
+SNAP_SPEED_MPS = 5.0
+
+
+def _to_csr(num_nodes, sources, targets, distances, durations):
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.add.at(indptr, sources + 1, 1)
+    return (
+        np.cumsum(indptr),
+        targets[order].astype(np.int32),
+        distances[order].astype(np.float32),
+        durations[order].astype(np.float32)
+    )
+
+
+class RoadGraph:
+    """
+    Directed road network in compressed sparse row form.
+    Node coordinates and forward/reverse adjacency (with per-edge distance in
+    meters and duration in seconds) are flat NumPy arrays, so a preprocessed
+    extract can be memory-mapped instead of parsed at startup.
+    Routes minimise travel time, like the Mapbox driving profile.
+    Graphs preprocessed with `contract` answer queries on the contraction
+    hierarchy; others fall back to bidirectional A* / Dijkstra.
+    """
+
+    def __init__(self, arrays):
+        for name in GRAPH_ARRAYS:
+            setattr(self, name, arrays[name])
+        for name in HIERARCHY_ARRAYS:
+            setattr(self, name, arrays.get(name))
+        self.has_hierarchy = self.up_indptr is not None
+        self.num_nodes = len(self.lat)
+        # Fastest speed on the network bounds the A* time heuristic
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speeds = np.asarray(self.distance) / np.asarray(self.duration)
+        speeds = speeds[np.isfinite(speeds)]
+        self.max_speed = float(speeds.max()) if len(speeds) else 1.0
+        self._build_snap_index()
+
+    @classmethod
+    def from_edges(cls, lat, lng, edges):
+        """Build from node coordinates and directed (source, target, distance_m, duration_s) edges"""
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        edges = np.asarray(edges, dtype=np.float64).reshape(-1, 4)
+        sources = edges[:, 0].astype(np.int64)
+        targets = edges[:, 1].astype(np.int64)
+
+        forward = _to_csr(len(lat), sources, targets, edges[:, 2], edges[:, 3])
+        reverse = _to_csr(len(lat), targets, sources, edges[:, 2], edges[:, 3])
+        return cls(dict(zip(GRAPH_ARRAYS, (lat, lng) + forward + reverse)))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a graph directory written by `save`"""
+        mode = "r" if mmap else None
+        return cls({
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+            for name in GRAPH_ARRAYS + HIERARCHY_ARRAYS
+            if name in GRAPH_ARRAYS or os.path.exists(os.path.join(path, f"{name}.npy"))
+        })
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in GRAPH_ARRAYS + HIERARCHY_ARRAYS:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+
+    # Preprocessing
+
+    def contract(self, witness_settle_limit=100):
+        """
+        Return a copy of the graph with a contraction hierarchy.
+        Nodes are contracted in lazy edge-difference order. Contracting a node
+        adds a shortcut between each pair of its neighbours unless a witness
+        path, no slower than the path through the node, exists.
+        The result keeps, per node, the edges to higher-ranked nodes: "up"
+        edges leaving it and "down" edges arriving at it (stored reversed).
+        """
+        n = self.num_nodes
+        out = [dict() for _ in range(n)]
+        inc = [dict() for _ in range(n)]
+        indptr = np.asarray(self.indptr).tolist()
+        indices = np.asarray(self.indices).tolist()
+        distance = np.asarray(self.distance).tolist()
+        duration = np.asarray(self.duration).tolist()
+        for u in range(n):
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                if v != u and duration[k] < out[u].get(v, (math.inf,))[0]:
+                    out[u][v] = inc[v][u] = (duration[k], distance[k])
+
+        def witnesses(source, excluded, limit):
+            # Upper bounds on travel time from source, avoiding `excluded`
+            times = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap and settled < witness_settle_limit:
+                time_s, node = heapq.heappop(heap)
+                if time_s > limit:
+                    break
+                if time_s > times[node]:
+                    continue
+                settled += 1
+                for neighbour, (edge_s, _) in out[node].items():
+                    candidate = time_s + edge_s
+                    if neighbour != excluded and candidate < times.get(neighbour, math.inf):
+                        times[neighbour] = candidate
+                        heapq.heappush(heap, (candidate, neighbour))
+            return times
+
+        def shortcuts_for(v):
+            shortcuts = []
+            if not out[v]:
+                return shortcuts
+            longest = max(edge_s for edge_s, _ in out[v].values())
+            for u, (in_s, in_m) in inc[v].items():
+                times = witnesses(u, v, in_s + longest)
+                for w, (out_s, out_m) in out[v].items():
+                    if w != u and times.get(w, math.inf) > in_s + out_s:
+                        shortcuts.append((u, w, in_s + out_s, in_m + out_m))
+            return shortcuts
+
+        deleted = [0] * n
+
+        def priority(v, shortcuts):
+            return len(shortcuts) - len(inc[v]) - len(out[v]) + deleted[v]
+
+        heap = [(priority(v, shortcuts_for(v)), v) for v in range(n)]
+        heapq.heapify(heap)
+        up, down = [], []
+
+        while heap:
+            _, v = heapq.heappop(heap)
+            shortcuts = shortcuts_for(v)
+            current = priority(v, shortcuts)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            # Every remaining neighbour is contracted later, i.e. ranks higher
+            for w, (edge_s, edge_m) in out[v].items():
+                up.append((v, w, edge_m, edge_s))
+                del inc[w][v]
+                deleted[w] += 1
+            for u, (edge_s, edge_m) in inc[v].items():
+                down.append((v, u, edge_m, edge_s))
+                del out[u][v]
+                deleted[u] += 1
+            out[v], inc[v] = {}, {}
+
+            for u, w, edge_s, edge_m in shortcuts:
+                if edge_s < out[u].get(w, (math.inf,))[0]:
+                    out[u][w] = inc[w][u] = (edge_s, edge_m)
+
+        up = np.asarray(up, dtype=np.float64).reshape(-1, 4)
+        down = np.asarray(down, dtype=np.float64).reshape(-1, 4)
+        arrays = {name: getattr(self, name) for name in GRAPH_ARRAYS}
+        arrays.update(zip(HIERARCHY_ARRAYS, _to_csr(
+            n, up[:, 0].astype(np.int64), up[:, 1].astype(np.int64), up[:, 2], up[:, 3]
+        ) + _to_csr(
+            n, down[:, 0].astype(np.int64), down[:, 1].astype(np.int64), down[:, 2], down[:, 3]
+        )))
+        return RoadGraph(arrays)
+
+    # Snapping
+
+    def _build_snap_index(self, cell=0.01):
+        self._cell = cell
+        lat = np.asarray(self.lat)
+        lng = np.asarray(self.lng)
+        keys = np.floor(lat / cell).astype(np.int64) * 100000 + np.floor(lng / cell).astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(order)]))
+        self._buckets = {
+            int(sorted_keys[start]): order[start:end]
+            for start, end in zip(starts, ends)
+        }
+
+    def nearest_node(self, point):
+        """Return (node, meters) for the road node closest to a (lat, lng) point"""
+        row = math.floor(point[0] / self._cell)
+        col = math.floor(point[1] / self._cell)
+        candidates = [
+            self._buckets[key]
+            for key in (
+                (row + dr) * 100000 + (col + dc)
+                for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+            )
+            if key in self._buckets
+        ]
+        nodes = np.concatenate(candidates) if candidates else np.arange(self.num_nodes)
+        if not len(nodes):
+            return None, float("inf")
+
+        lat = np.radians(np.asarray(self.lat)[nodes])
+        lng = np.radians(np.asarray(self.lng)[nodes])
+        plat, plng = math.radians(point[0]), math.radians(point[1])
+        x = (lng - plng) * math.cos(plat)
+        y = lat - plat
+        meters = np.sqrt(x * x + y * y) * EARTH_RADIUS_KM * 1000.0
+        best = int(np.argmin(meters))
+        return int(nodes[best]), float(meters[best])
+
+    # Searches
+
+    def _heuristic(self, node, target_lat, target_lng):
+        """Lower bound on travel time (s) from node to target"""
+        lat1 = math.radians(float(self.lat[node]))
+        x = (math.radians(float(self.lng[node])) - target_lng) * math.cos((lat1 + target_lat) / 2)
+        y = lat1 - target_lat
+        return math.sqrt(x * x + y * y) * EARTH_RADIUS_KM * 1000.0 * 0.999 / self.max_speed
+
+    def _upward_search(self, node, upward=True):
+        """Whole hierarchy search space above node: {node: (duration_s, distance_m)}"""
+        if upward:
+            indptr, indices, distance, duration = self.up_indptr, self.up_indices, self.up_distance, self.up_duration
+        else:
+            indptr, indices, distance, duration = self.down_indptr, self.down_indices, self.down_distance, self.down_duration
+
+        best = {node: (0.0, 0.0)}
+        settled = {}
+        heap = [(0.0, node)]
+        while heap:
+            time_s, current = heapq.heappop(heap)
+            if current in settled:
+                continue
+            settled[current] = best[current]
+            meters = best[current][1]
+
+            start, end = int(indptr[current]), int(indptr[current + 1])
+            for neighbour, edge_m, edge_s in zip(
+                indices[start:end].tolist(),
+                distance[start:end].tolist(),
+                duration[start:end].tolist()
+            ):
+                candidate = time_s + edge_s
+                if candidate < best.get(neighbour, (math.inf,))[0]:
+                    best[neighbour] = (candidate, meters + edge_m)
+                    heapq.heappush(heap, (candidate, neighbour))
+        return settled
+
+    def route(self, source, target):
+        """
+        Fastest (distance_m, duration_s) from source to target node, or None if
+        unreachable. Uses the contraction hierarchy when present, otherwise
+        bidirectional A* (average potentials).
+        """
+        if source == target:
+            return 0.0, 0.0
+
+        if self.has_hierarchy:
+            forward = self._upward_search(source)
+            backward = self._upward_search(target, upward=False)
+            best = None
+            for node, (time_s, meters) in forward.items():
+                other = backward.get(node)
+                if other is not None and (best is None or time_s + other[0] < best[1]):
+                    best = (meters + other[1], time_s + other[0])
+            return best
+
+        s_lat, s_lng = math.radians(float(self.lat[source])), math.radians(float(self.lng[source]))
+        t_lat, t_lng = math.radians(float(self.lat[target])), math.radians(float(self.lng[target]))
+        potentials = {}
+
+        def potential(node):
+            # Consistent forward potential; the reverse search uses its negation
+            value = potentials.get(node)
+            if value is None:
+                value = (self._heuristic(node, t_lat, t_lng) - self._heuristic(node, s_lat, s_lng)) / 2
+                potentials[node] = value
+            return value
+
+        graphs = (
+            (self.indptr, self.indices, self.distance, self.duration, 1),
+            (self.rev_indptr, self.rev_indices, self.rev_distance, self.rev_duration, -1)
+        )
+        # Per direction: best reduced time, meters along it, and the frontier heap
+        best = ({source: 0.0}, {target: 0.0})
+        meters = ({source: 0.0}, {target: 0.0})
+        settled = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        shortest = math.inf
+        meeting = None
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= shortest:
+                break
+
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            reduced, node = heapq.heappop(heaps[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+
+            indptr, indices, distance, duration, sign = graphs[side]
+            start, end = int(indptr[node]), int(indptr[node + 1])
+            node_potential = sign * potential(node)
+            for neighbour, edge_m, edge_s in zip(
+                indices[start:end].tolist(),
+                distance[start:end].tolist(),
+                duration[start:end].tolist()
+            ):
+                candidate = reduced + edge_s - node_potential + sign * potential(neighbour)
+                if candidate < best[side].get(neighbour, math.inf):
+                    best[side][neighbour] = candidate
+                    meters[side][neighbour] = meters[side][node] + edge_m
+                    heapq.heappush(heaps[side], (candidate, neighbour))
+
+                    other = best[1 - side].get(neighbour)
+                    if other is not None and candidate + other < shortest:
+                        shortest = candidate + other
+                        meeting = neighbour
+
+        if meeting is None:
+            return None
+
+        # Undo the potentials: reduced s->t time = time - p(s) + p(t)
+        duration_s = shortest + potential(source) - potential(target)
+        return meters[0][meeting] + meters[1][meeting], duration_s
+
+    def many_to_many(self, sources, targets):
+        """
+        Fastest (distance_m, duration_s) for every source/target node pair as a
+        list of rows (None where unreachable). With a hierarchy this is the
+        bucket algorithm: one upward search per target and per source.
+        """
+        if not self.has_hierarchy:
+            return [self.one_to_many(source, targets) for source in sources]
+
+        buckets = {}
+        for j, target in enumerate(targets):
+            for node, (time_s, meters) in self._upward_search(target, upward=False).items():
+                buckets.setdefault(node, []).append((j, time_s, meters))
+
+        rows = []
+        for source in sources:
+            row = [None] * len(targets)
+            for node, (time_s, meters) in self._upward_search(source).items():
+                for j, to_target_s, to_target_m in buckets.get(node, ()):
+                    total = time_s + to_target_s
+                    if row[j] is None or total < row[j][1]:
+                        row[j] = (meters + to_target_m, total)
+            rows.append(row)
+        return rows
+
+    def one_to_many(self, source, targets):
+        """Fastest (distance_m, duration_s) from source to each target node (None if unreachable)"""
+        remaining = set(targets)
+        times = {source: 0.0}
+        meters = {source: 0.0}
+        settled = set()
+        heap = [(0.0, source)]
+
+        while heap and remaining:
+            time_s, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            remaining.discard(node)
+
+            start, end = int(self.indptr[node]), int(self.indptr[node + 1])
+            for neighbour, edge_m, edge_s in zip(
+                self.indices[start:end].tolist(),
+                self.distance[start:end].tolist(),
+                self.duration[start:end].tolist()
+            ):
+                candidate = time_s + edge_s
+                if candidate < times.get(neighbour, math.inf):
+                    times[neighbour] = candidate
+                    meters[neighbour] = meters[node] + edge_m
+                    heapq.heappush(heap, (candidate, neighbour))
+
+        return [
+            (meters[target], times[target]) if target in settled else None
+            for target in targets
+        ]
+
+    # Point queries
+
+    def point_to_point(self, origin, destination):
+        """(distance_m, duration_s) between two (lat, lng) points, or None if off the graph"""
+        source, source_gap = self.nearest_node(origin)
+        target, target_gap = self.nearest_node(destination)
+        if source is None or max(source_gap, target_gap) > MAX_SNAP_METERS:
+            return None
+
+        result = self.route(source, target)
+        if result is None:
+            return None
+        gap = source_gap + target_gap
+        return result[0] + gap, result[1] + gap / SNAP_SPEED_MPS
+
+    def matrix(self, origins, destinations):
+        """
+        Many-to-many (distance_m, duration_s) arrays of shape (len(origins), len(destinations)).
+        Pairs off the graph or unreachable are NaN.
+        """
+        distances = np.full((len(origins), len(destinations)), np.nan)
+        durations = np.full((len(origins), len(destinations)), np.nan)
+
+        snapped_origins = [self.nearest_node(point) for point in origins]
+        snapped = [self.nearest_node(point) for point in destinations]
+        sources = [i for i, (node, gap) in enumerate(snapped_origins) if gap <= MAX_SNAP_METERS]
+        targets = [j for j, (node, gap) in enumerate(snapped) if gap <= MAX_SNAP_METERS]
+
+        rows = self.many_to_many(
+            [snapped_origins[i][0] for i in sources],
+            [snapped[j][0] for j in targets]
+        )
+        for i, row in zip(sources, rows):
+            for j, result in zip(targets, row):
+                if result is None:
+                    continue
+                gap = snapped_origins[i][1] + snapped[j][1]
+                distances[i, j] = result[0] + gap
+                durations[i, j] = result[1] + gap / SNAP_SPEED_MPS
+
+        return distances, durations
+
+
+def _parse_speed(value, default):
+    try:
+        speed = float(str(value).split()[0])
+    except (TypeError, ValueError, IndexError):
+        return default
+    return speed * 1.609 if "mph" in str(value) else speed
+
+
+def build_from_osm(path):
+    """
+    Build a RoadGraph from an OSM XML extract (.osm), keeping drivable ways.
+    Speeds come from `maxspeed` tags where present, else HIGHWAY_SPEEDS.
+    """
+    import xml.etree.ElementTree as ET
+
+    coords = {}
+    ways = []
+    for _, element in ET.iterparse(path, events=("end",)):
+        if element.tag == "node":
+            coords[int(element.get("id"))] = (float(element.get("lat")), float(element.get("lon")))
+        elif element.tag == "way":
+            tags = {tag.get("k"): tag.get("v") for tag in element.findall("tag")}
+            highway = tags.get("highway")
+            if highway in HIGHWAY_SPEEDS and tags.get("access") not in ("no", "private"):
+                refs = [int(nd.get("ref")) for nd in element.findall("nd")]
+                speed = _parse_speed(tags.get("maxspeed"), HIGHWAY_SPEEDS[highway])
+                oneway = tags.get("oneway")
+                if oneway is None and (highway.startswith("motorway") or tags.get("junction") == "roundabout"):
+                    oneway = "yes"
+                ways.append((refs, speed, oneway))
+            element.clear()
+        elif element.tag == "relation":
+            element.clear()
+
+    index = {}
+    lat, lng, edges = [], [], []
+
+    def node_index(ref):
+        if ref not in index:
+            index[ref] = len(lat)
+            lat.append(coords[ref][0])
+            lng.append(coords[ref][1])
+        return index[ref]
+
+    for refs, speed, oneway in ways:
+        refs = [ref for ref in refs if ref in coords]
+        if oneway == "-1":
+            refs.reverse()
+        for a, b in zip(refs, refs[1:]):
+            u, v = node_index(a), node_index(b)
+            meters = haversine_km(coords[a], coords[b]) * 1000.0
+            seconds = meters / (speed / 3.6)
+            edges.append((u, v, meters, seconds))
+            if oneway not in ("yes", "true", "1", "-1"):
+                edges.append((v, u, meters, seconds))
+
+    return RoadGraph.from_edges(lat, lng, edges)
+
+
+_road_graph = None
+_road_graph_path = None
+_road_graph_lock = threading.Lock()
+
+
+def get_road_graph():
+    """The graph at ROAD_GRAPH_PATH, memory-mapped once per process (None if not configured)"""
+    global _road_graph, _road_graph_path
+    path = os.environ.get("ROAD_GRAPH_PATH")
+    if not path:
+        return None
+    if _road_graph_path != path:
+        with _road_graph_lock:
+            if _road_graph_path != path:
+                try:
+                    _road_graph = RoadGraph.load(path)
+                except Exception as e:
+                    print(f"Error loading road graph from {path}: {e}")
+                    _road_graph = None
+                # Don't retry a broken path on every request
+                _road_graph_path = path
+    return _road_graph
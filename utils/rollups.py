@@ -0,0 +1,92 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import Date, DateTime, delete, distinct, func, insert, literal, select
+
+from extensions import db
+from models import DailyOrderRollup, ParcelOrder
+
+# Re-check orders changed a little before the last run, for transactions that committed late
+REFRESH_OVERLAP = timedelta(minutes=5)
+# Days per transaction when backfilling
+BACKFILL_CHUNK_DAYS = 31
+
+
+def _day_of(column):
+    return func.date(column, type_=Date)
+
+
+def refresh_days(first_day, last_day, refreshed_at):
+    """Recompute the rollups for first_day..last_day with one grouped INSERT ... SELECT"""
+    start = datetime.combine(first_day, time.min)
+    end = datetime.combine(last_day + timedelta(days=1), time.min)
+    db.session.execute(
+        delete(DailyOrderRollup).where(DailyOrderRollup.day >= first_day, DailyOrderRollup.day <= last_day)
+    )
+    day = _day_of(ParcelOrder.created_at)
+    db.session.execute(
+        insert(DailyOrderRollup).from_select(
+            ["day", "status", "order_count", "revenue", "distance_km", "courier_count", "refreshed_at"],
+            select(
+                day,
+                ParcelOrder.status,
+                func.count(ParcelOrder.id),
+                func.coalesce(func.sum(ParcelOrder.price), 0),
+                func.coalesce(func.sum(ParcelOrder.distance), 0),
+                func.count(distinct(ParcelOrder.courier_id)),
+                literal(refreshed_at, DateTime)
+            )
+            .where(ParcelOrder.created_at >= start, ParcelOrder.created_at < end)
+            .group_by(day, ParcelOrder.status)
+        )
+    )
+
+
+def _runs(days):
+    """Sorted days grouped into runs of consecutive days, as (first, last)"""
+    runs = []
+    for day in sorted(days):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def refresh_rollups():
+    """
+    Recompute only the days that have orders created or changed since the
+    last refresh. Runs a full backfill the first time. Returns the refreshed days.
+    """
+    # Database time, the same clock that sets parcel_orders.updated_at
+    now = db.session.execute(select(func.now())).scalar()
+    watermark = db.session.execute(select(func.max(DailyOrderRollup.refreshed_at))).scalar()
+    if watermark is None:
+        return backfill_rollups()
+
+    day = _day_of(ParcelOrder.created_at)
+    days = db.session.execute(
+        select(distinct(day)).where(ParcelOrder.updated_at >= watermark - REFRESH_OVERLAP)
+    ).scalars().all()
+    for first_day, last_day in _runs(days):
+        refresh_days(first_day, last_day, now)
+    db.session.commit()
+    return sorted(days)
+
+
+def backfill_rollups(chunk_days=BACKFILL_CHUNK_DAYS):
+    """Rebuild every day's rollups, committing every `chunk_days` days"""
+    now = db.session.execute(select(func.now())).scalar()
+    first, last = db.session.execute(
+        select(func.min(ParcelOrder.created_at), func.max(ParcelOrder.created_at))
+    ).one()
+    if first is None:
+        return []
+
+    first_day, last_day = first.date(), last.date()
+    day = first_day
+    while day <= last_day:
+        chunk_end = min(day + timedelta(days=chunk_days - 1), last_day)
+        refresh_days(day, chunk_end, now)
+        db.session.commit()
+        day = chunk_end + timedelta(days=1)
+    return [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
@@ -0,0 +1,185 @@
+import os
+import time
+
+import numpy as np
+
+# Stops per route; orders past the cap are returned as unrouted. Keeps the
+# distance matrix to one Mapbox request (25 coordinates, with the start)
+MAX_ROUTE_STOPS = 24
+
+
+def route_cost(route, cost):
+    """Total cost of visiting `route` in order (open path, no return)"""
+    return float(cost[route[:-1], route[1:]].sum()) if len(route) > 1 else 0.0
+
+
+def nearest_neighbour(cost, start, pickup_of):
+    """
+    Greedy route from `start`: always go to the closest stop that may be
+    visited next, i.e. one whose pickup (if any) is already done.
+    `pickup_of` maps each drop-off node to its pickup node.
+    """
+    unvisited = set(range(cost.shape[0])) - {start}
+    route = [start]
+    while unvisited:
+        here = route[-1]
+        ready = [node for node in unvisited if pickup_of.get(node) not in unvisited]
+        step = min(ready, key=lambda node: cost[here, node])
+        route.append(step)
+        unvisited.discard(step)
+    return route
+
+
+def _two_opt(route, cost, pickup_of, drop_of):
+    """First improving segment reversal that keeps pickups before drop-offs, or None"""
+    n = len(route)
+    edges = cost[route[:-1], route[1:]]
+    reverse_edges = cost[route[1:], route[:-1]]
+    forward = np.concatenate(([0.0], np.cumsum(edges)))
+    backward = np.concatenate(([0.0], np.cumsum(reverse_edges)))
+    position = {node: index for index, node in enumerate(route)}
+
+    for i in range(1, n - 1):
+        for j in range(i + 1, n):
+            # The cost matrix can be asymmetric, so the reversed inside counts too
+            before = cost[route[i - 1], route[i]] + forward[j] - forward[i]
+            after = cost[route[i - 1], route[j]] + backward[j] - backward[i]
+            if j + 1 < n:
+                before += cost[route[j], route[j + 1]]
+                after += cost[route[i], route[j + 1]]
+            if after >= before - 1e-9:
+                continue
+            # A pickup and its drop-off both inside the segment would swap
+            if any(
+                i <= position.get(pickup_of.get(node, -1), -1) <= j
+                for node in route[i:j + 1]
+            ):
+                continue
+            return route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+    return None
+
+
+def _or_opt(route, cost, pickup_of, drop_of, max_length=3):
+    """First improving move of a run of 1-3 stops elsewhere in the route, or None"""
+    n = len(route)
+    position = {node: index for index, node in enumerate(route)}
+
+    for length in range(1, max_length + 1):
+        for i in range(1, n - length + 1):
+            end = i + length - 1
+            first, last = route[i], route[end]
+            prev = route[i - 1]
+            nxt = route[end + 1] if end + 1 < n else None
+            removed = cost[prev, first] - (cost[prev, nxt] if nxt is not None else 0.0)
+            if nxt is not None:
+                removed += cost[last, nxt]
+            segment = route[i:end + 1]
+
+            # Insert between route[k] and route[k + 1]
+            for k in range(0, n):
+                if i - 1 <= k <= end:
+                    continue
+                a = route[k]
+                b = route[k + 1] if k + 1 < n else None
+                added = cost[a, first] + (cost[last, b] - cost[a, b] if b is not None else 0.0)
+                if added >= removed - 1e-9:
+                    continue
+                if k > end:
+                    # Moving later: a pickup can't pass its own drop-off
+                    if any(end < position.get(drop_of.get(node, -1), n) <= k for node in segment):
+                        continue
+                    return route[:i] + route[end + 1:k + 1] + segment + route[k + 1:]
+                # Moving earlier: a drop-off can't pass its own pickup
+                if any(k < position.get(pickup_of.get(node, -1), -1) < i for node in segment):
+                    continue
+                return route[:k + 1] + segment + route[k + 1:i] + route[end + 1:]
+    return None
+
+
+def plan_route(cost, pairs, start=0, time_budget=0.05):
+    """
+    Order the nodes of `cost` into a short open route from `start`.
+    `pairs` are (pickup, drop_off) nodes; every pickup comes before its drop-off.
+    Nearest neighbour builds the route, then 2-opt and or-opt moves improve it
+    until none helps or `time_budget` seconds have passed.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    pickup_of = {drop: pickup for pickup, drop in pairs}
+    drop_of = {pickup: drop for pickup, drop in pairs}
+    deadline = time.perf_counter() + time_budget
+
+    route = nearest_neighbour(cost, start, pickup_of)
+    while time.perf_counter() < deadline:
+        improved = _two_opt(route, cost, pickup_of, drop_of) or _or_opt(route, cost, pickup_of, drop_of)
+        if improved is None:
+            break
+        route = improved
+    return route
+
+
+def plan_courier_route(orders, start=None, time_budget=0.05):
+    """
+    Visiting sequence for a courier's active orders.
+    Orders still `assigned` need a pickup and a drop-off; picked up ones only
+    the drop-off. `start` is the courier's (lat, lng), or None to start at
+    whichever stop suits the route best. Returns (stops, unrouted_order_ids);
+    each stop carries cumulative distance and ETA in seconds.
+    The distance matrix gets ROUTE_MATRIX_TIMEOUT seconds; after that the
+    route is planned on the road graph, or the offline estimate without one.
+    """
+    from utils import get_distance_matrix_batch
+    from utils.concurrency import Deadline, submit, wait_for
+    from utils.road_graph import get_road_graph
+
+    stops, pairs, unrouted = [], [], []
+    for order in orders:
+        needs_pickup = order.status == 'assigned'
+        if order.destination_lat is None or (needs_pickup and order.pickup_lat is None):
+            unrouted.append(order.id)
+            continue
+        if len(stops) + (2 if needs_pickup else 1) > MAX_ROUTE_STOPS:
+            unrouted.append(order.id)
+            continue
+        if needs_pickup:
+            stops.append((order, 'pickup', order.pickup_lat, order.pickup_lng, order.pickup_address))
+        stops.append((order, 'dropoff', order.destination_lat, order.destination_lng, order.destination_address))
+        if needs_pickup:
+            # Node 0 is the start, so stop k is node k + 1
+            pairs.append((len(stops) - 1, len(stops)))
+    if not stops:
+        return [], unrouted
+
+    points = [(lat, lng) for _, _, lat, lng, _ in stops]
+    if start is not None:
+        points = [tuple(start)] + points
+    deadline = Deadline(float(os.environ.get('ROUTE_MATRIX_TIMEOUT', 3)))
+    matrix = wait_for(submit(get_distance_matrix_batch, points, points), deadline, None, "Route matrix")
+    if matrix is None:
+        provider = 'local' if get_road_graph() is not None else 'offline'
+        matrix = get_distance_matrix_batch(points, points, provider=provider)
+    distances, durations = matrix
+    if start is None:
+        # A start that is free to leave from anywhere makes the first stop a free choice
+        distances = np.pad(distances, ((1, 0), (1, 0)))
+        durations = np.pad(durations, ((1, 0), (1, 0)))
+    # Pairs no provider could route are still visited, just last resort
+    durations = np.where(np.isnan(durations), np.nanmax(durations, initial=0) * 10 + 3600, durations)
+    distances = np.nan_to_num(distances)
+
+    route = plan_route(durations, pairs, start=0, time_budget=time_budget)
+    result = []
+    eta = distance = 0.0
+    for previous, node in zip(route, route[1:]):
+        eta += durations[previous, node]
+        distance += distances[previous, node]
+        order, kind, lat, lng, address = stops[node - 1]
+        result.append({
+            "order_id": order.id,
+            "type": kind,
+            "address": address,
+            "lat": lat,
+            "lng": lng,
+            "distance_km": round(float(distance), 2),
+            "eta_seconds": int(round(eta))
+        })
+    return result, unrouted
@@ -0,0 +1,101 @@
+import math
+import threading
+
+from utils.geo import EARTH_RADIUS_KM, haversine_km
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+class GridIndex:
+    """
+    Points bucketed into `cell_size` degree cells for nearest-neighbour lookups.
+    Each key has one position; updating it moves it between buckets.
+    A lookup scans rings of cells outward from the query point and stops once
+    no unscanned cell can hold anything closer than the k-th result.
+    """
+
+    def __init__(self, cell_size=0.01):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size)))
+
+    def update(self, key, lat, lng, data=None):
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None and previous[2] != cell:
+                bucket = self._cells[previous[2]]
+                bucket.discard(key)
+                if not bucket:
+                    del self._cells[previous[2]]
+            self._cells.setdefault(cell, set()).add(key)
+            self._points[key] = (lat, lng, cell, data)
+
+    def remove(self, key):
+        with self._lock:
+            previous = self._points.pop(key, None)
+            if previous is not None:
+                bucket = self._cells[previous[2]]
+                bucket.discard(key)
+                if not bucket:
+                    del self._cells[previous[2]]
+
+    def get(self, key):
+        point = self._points.get(key)
+        return None if point is None else (point[0], point[1], point[3])
+
+    def items(self):
+        """Snapshot of (key, lat, lng, data) for every point"""
+        with self._lock:
+            return [(key, point[0], point[1], point[3]) for key, point in self._points.items()]
+
+    def __len__(self):
+        return len(self._points)
+
+    def nearest(self, lat, lng, k=5, max_km=50.0, where=None):
+        """
+        Up to `k` (distance_km, key, data) tuples within `max_km`, closest first.
+        `where(key, data)` filters out points that shouldn't count.
+        """
+        # Cells get narrower away from the equator; use the narrow side as the ring width
+        ring_km = self.cell_size * KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01)
+        max_rings = int(math.ceil(max_km / ring_km))
+        row, col = self._cell(lat, lng)
+        found = []
+
+        with self._lock:
+            # Walking rings is slower than a scan once they cover more cells than there are points
+            if (2 * max_rings + 1) ** 2 > 4 * len(self._points):
+                candidates = [self._points.items()]
+                max_rings = 0
+            else:
+                candidates = None
+
+            for ring in range(max_rings + 1):
+                if candidates is None:
+                    keys = []
+                    for r in range(row - ring, row + ring + 1):
+                        step = 1 if abs(r - row) == ring else 2 * ring
+                        for c in range(col - ring, col + ring + 1, max(step, 1)):
+                            keys.extend(self._cells.get((r, c), ()))
+                    items = ((key, self._points[key]) for key in keys)
+                else:
+                    items = candidates[0]
+
+                for key, (p_lat, p_lng, _, data) in items:
+                    if where is not None and not where(key, data):
+                        continue
+                    distance = haversine_km((lat, lng), (p_lat, p_lng))
+                    if distance <= max_km:
+                        found.append((distance, key, data))
+
+                found.sort(key=lambda item: item[0])
+                # Anything in the next ring is at least `ring` cells away
+                if len(found) >= k and found[k - 1][0] <= ring * ring_km:
+                    break
+
+        return found[:k]
@@ -0,0 +1,151 @@
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import ParcelOrder, StatsCounter, User
+
+ORDER_STATUSES = ParcelOrder.__table__.c.status.type.enums
+USER_ROLES = User.__table__.c.role.type.enums
+# Orders whose price counts as revenue on the dashboard
+REVENUE_STATUSES = ("delivered", "in_transit")
+
+PENDING_STAT_DELTAS = "pending_stat_deltas"
+
+
+def counter_names():
+    return (
+        ["orders", "users", "revenue"]
+        + [f"orders.{status}" for status in ORDER_STATUSES]
+        + [f"users.{role}" for role in USER_ROLES]
+    )
+
+
+def _order_counters(status, price):
+    return {
+        "orders": 1,
+        f"orders.{status}": 1,
+        "revenue": (price or 0.0) if status in REVENUE_STATUSES else 0.0
+    }
+
+
+def _user_counters(role):
+    return {"users": 1, f"users.{role}": 1}
+
+
+def _counters(obj, values=None):
+    """Counters `obj` contributes to, from its current values or the given old ones"""
+    values = values or {}
+    if isinstance(obj, ParcelOrder):
+        return _order_counters(values.get("status", obj.status or "pending"), values.get("price", obj.price))
+    return _user_counters(values.get("role", obj.role or "customer"))
+
+
+def _old_values(obj, keys):
+    state = inspect(obj)
+    values = {}
+    for key in keys:
+        history = state.attrs[key].history
+        if history.deleted:
+            values[key] = history.deleted[0]
+    return values
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_stat_deltas(session, flush_context, instances):
+    deltas = {}
+
+    def add(counters, sign):
+        for name, amount in counters.items():
+            deltas[name] = deltas.get(name, 0) + sign * amount
+
+    for obj in session.new:
+        if isinstance(obj, (ParcelOrder, User)):
+            add(_counters(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, (ParcelOrder, User)):
+            add(_counters(obj, _old_values(obj, ("status", "price") if isinstance(obj, ParcelOrder) else ("role",))), -1)
+    for obj in session.dirty:
+        if isinstance(obj, (ParcelOrder, User)):
+            keys = ("status", "price") if isinstance(obj, ParcelOrder) else ("role",)
+            old = _old_values(obj, keys)
+            if old:
+                add(_counters(obj, old), -1)
+                add(_counters(obj), 1)
+
+    deltas = {name: amount for name, amount in deltas.items() if amount}
+    if deltas:
+        pending = session.info.setdefault(PENDING_STAT_DELTAS, {})
+        for name, amount in deltas.items():
+            pending[name] = pending.get(name, 0) + amount
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_stat_deltas(session, flush_context):
+    """
+    Add the flush's deltas to the counters, creating missing counter rows.
+
+    Only ORM flushes reach here: bulk `query.update()`/`delete()` and raw SQL
+    on orders or users leave the counters stale until `rebuild_stats()` (or
+    `flask admin rebuild-stats`) runs, so bulk status writes must call it.
+    """
+    deltas = session.info.pop(PENDING_STAT_DELTAS, None)
+    if deltas:
+        connection = session.connection()
+        dialect_insert = postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+        table = StatsCounter.__table__
+        now = datetime.utcnow()
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"value": table.c.value + statement.excluded.value, "updated_at": statement.excluded.updated_at}
+        )
+        # One executemany in the flush's transaction, so counters commit or roll back with the change
+        connection.execute(
+            statement,
+            [{"name": name, "value": amount, "updated_at": now} for name, amount in sorted(deltas.items())]
+        )
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_stat_deltas(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(PENDING_STAT_DELTAS, None)
+
+
+def compute_stats():
+    """Every counter recomputed from orders and users, in two grouped queries"""
+    values = dict.fromkeys(counter_names(), 0.0)
+    for status, count, price in db.session.query(
+        ParcelOrder.status, func.count(ParcelOrder.id), func.coalesce(func.sum(ParcelOrder.price), 0)
+    ).group_by(ParcelOrder.status):
+        values["orders"] += count
+        values[f"orders.{status}"] = count
+        if status in REVENUE_STATUSES:
+            values["revenue"] += price
+    for role, count in db.session.query(User.role, func.count(User.id)).group_by(User.role):
+        values["users"] += count
+        values[f"users.{role}"] = count
+    return values
+
+
+def rebuild_stats():
+    """Replace the counters with freshly computed values; commits"""
+    values = compute_stats()
+    db.session.query(StatsCounter).delete()
+    db.session.execute(
+        StatsCounter.__table__.insert(),
+        [{"name": name, "value": value, "updated_at": datetime.utcnow()} for name, value in values.items()]
+    )
+    db.session.commit()
+    return values
+
+
+def read_stats():
+    """Current counters; built on first use, when some are still missing"""
+    values = dict(db.session.query(StatsCounter.name, StatsCounter.value).all())
+    if not set(counter_names()) <= set(values):
+        values = rebuild_stats()
+    return values
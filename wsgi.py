@@ -1,3 +1,8 @@
 from app import create_app
+from utils.geo import circuity_estimator
 
 app = create_app()
+
+# Fit the offline distance estimator now rather than when a request first needs it
+with app.app_context():
+    circuity_estimator.ensure_fitted()